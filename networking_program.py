@@ -9,18 +9,34 @@ Usage: python networking_program.py
 """
 
 import socket
+import selectors
+import struct
 import threading
 import sys
 import time
 import os
 import platform
 import json
+import codecs
 import http.server
 import socketserver
+import queue
 import webbrowser
+import signal
+import shutil
+import tempfile
 from urllib.parse import urlparse, parse_qs
 import base64
 import hashlib
+import itertools
+import zlib
+import gzip
+import mmap
+import errno
+import bisect
+import re
+from array import array
+from collections import OrderedDict, deque
 
 class Colors:
     """ANSI color codes for better terminal output"""
@@ -118,6 +134,165 @@ def get_server_ip():
 
 # ==================== HTML TEMPLATES ====================
 
+# The stylesheets and scripts below are static; ASSETS serves them under
+# content-hashed URLs, and pages carry only a small inline config blob.
+
+def _page_config(**values):
+    """Per-host settings as a JS object literal that is safe inside <script>"""
+    return json.dumps(values).replace('<', '\\u003c')
+
+TASK1_CSS = """
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    min-height: 100vh;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    color: white;
+}
+.container {
+    background: rgba(255, 255, 255, 0.1);
+    backdrop-filter: blur(10px);
+    border-radius: 20px;
+    padding: 40px;
+    max-width: 600px;
+    width: 100%;
+    box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+}
+h1 {
+    text-align: center;
+    margin-bottom: 30px;
+    font-size: 2.5em;
+    text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
+}
+.info {
+    background: rgba(255, 255, 255, 0.1);
+    padding: 20px;
+    border-radius: 10px;
+    margin-bottom: 30px;
+    border-left: 5px solid #00ff88;
+}
+.form-group {
+    margin-bottom: 20px;
+}
+label {
+    display: block;
+    margin-bottom: 8px;
+    font-weight: bold;
+}
+input, textarea, button {
+    width: 100%;
+    padding: 12px;
+    border: none;
+    border-radius: 8px;
+    font-size: 16px;
+}
+input, textarea {
+    background: rgba(255, 255, 255, 0.9);
+    color: #333;
+}
+button {
+    background: linear-gradient(45deg, #00ff88, #00d4aa);
+    color: white;
+    font-weight: bold;
+    cursor: pointer;
+    transition: transform 0.2s;
+}
+button:hover {
+    transform: translateY(-2px);
+}
+.messages {
+    background: rgba(0, 0, 0, 0.3);
+    padding: 20px;
+    border-radius: 10px;
+    height: 200px;
+    overflow-y: auto;
+    font-family: monospace;
+    border: 1px solid rgba(255, 255, 255, 0.2);
+}
+.message {
+    margin-bottom: 10px;
+    padding: 8px;
+    background: rgba(255, 255, 255, 0.1);
+    border-radius: 5px;
+}
+.status {
+    text-align: center;
+    margin-top: 20px;
+    font-weight: bold;
+}
+.success { color: #00ff88; }
+.error { color: #ff6b6b; }
+"""
+
+TASK1_JS = """
+let messageCount = 0;
+
+function addToLog(message, isError = false) {
+    const messagesDiv = document.getElementById('messages');
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message';
+    const timestamp = new Date().toLocaleTimeString();
+    messageDiv.innerHTML = `<strong>[${timestamp}]</strong> ${message}`;
+    messagesDiv.appendChild(messageDiv);
+    messagesDiv.scrollTop = messagesDiv.scrollHeight;
+}
+
+function showStatus(message, isError = false) {
+    const statusDiv = document.getElementById('status');
+    statusDiv.textContent = message;
+    statusDiv.className = `status ${isError ? 'error' : 'success'}`;
+    setTimeout(() => statusDiv.textContent = '', 3000);
+}
+
+async function sendMessage() {
+    const messageInput = document.getElementById('message');
+    const message = messageInput.value.trim();
+    
+    if (!message) {
+        showStatus('❌ Please enter a message', true);
+        return;
+    }
+
+    try {
+        const response = await fetch('/send_udp', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ message: message })
+        });
+
+        const result = await response.json();
+        
+        if (result.success) {
+            messageCount++;
+            addToLog(`📤 Message #${messageCount}: "${message}"`);
+            showStatus('✅ Message sent successfully!');
+            messageInput.value = '';
+        } else {
+            addToLog(`❌ Failed to send: ${result.error}`, true);
+            showStatus('❌ Failed to send message', true);
+        }
+    } catch (error) {
+        addToLog(`❌ Network error: ${error.message}`, true);
+        showStatus('❌ Network error', true);
+    }
+}
+
+// Send message on Enter key
+document.getElementById('message').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter' && !e.shiftKey) {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+// Initial status
+addToLog('🌐 Connected to Ubuntu PC server');
+showStatus('Ready to send messages');
+"""
+
 def generate_task1_html(server_ip, port=8001):
     """Generate HTML for Task 1: UDP Messaging"""
     return f"""
@@ -127,91 +302,7 @@ def generate_task1_html(server_ip, port=8001):
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Task 1: UDP Messaging</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-        }}
-        .container {{
-            background: rgba(255, 255, 255, 0.1);
-            backdrop-filter: blur(10px);
-            border-radius: 20px;
-            padding: 40px;
-            max-width: 600px;
-            width: 100%;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-        }}
-        h1 {{
-            text-align: center;
-            margin-bottom: 30px;
-            font-size: 2.5em;
-            text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
-        }}
-        .info {{
-            background: rgba(255, 255, 255, 0.1);
-            padding: 20px;
-            border-radius: 10px;
-            margin-bottom: 30px;
-            border-left: 5px solid #00ff88;
-        }}
-        .form-group {{
-            margin-bottom: 20px;
-        }}
-        label {{
-            display: block;
-            margin-bottom: 8px;
-            font-weight: bold;
-        }}
-        input, textarea, button {{
-            width: 100%;
-            padding: 12px;
-            border: none;
-            border-radius: 8px;
-            font-size: 16px;
-        }}
-        input, textarea {{
-            background: rgba(255, 255, 255, 0.9);
-            color: #333;
-        }}
-        button {{
-            background: linear-gradient(45deg, #00ff88, #00d4aa);
-            color: white;
-            font-weight: bold;
-            cursor: pointer;
-            transition: transform 0.2s;
-        }}
-        button:hover {{
-            transform: translateY(-2px);
-        }}
-        .messages {{
-            background: rgba(0, 0, 0, 0.3);
-            padding: 20px;
-            border-radius: 10px;
-            height: 200px;
-            overflow-y: auto;
-            font-family: monospace;
-            border: 1px solid rgba(255, 255, 255, 0.2);
-        }}
-        .message {{
-            margin-bottom: 10px;
-            padding: 8px;
-            background: rgba(255, 255, 255, 0.1);
-            border-radius: 5px;
-        }}
-        .status {{
-            text-align: center;
-            margin-top: 20px;
-            font-weight: bold;
-        }}
-        .success {{ color: #00ff88; }}
-        .error {{ color: #ff6b6b; }}
-    </style>
+    <link rel="stylesheet" href="{ASSETS.url('task1.css')}">
 </head>
 <body>
     <div class="container">
@@ -238,75 +329,239 @@ def generate_task1_html(server_ip, port=8001):
         <div id="status" class="status"></div>
     </div>
 
-    <script>
-        let messageCount = 0;
-
-        function addToLog(message, isError = false) {{
-            const messagesDiv = document.getElementById('messages');
-            const messageDiv = document.createElement('div');
-            messageDiv.className = 'message';
-            const timestamp = new Date().toLocaleTimeString();
-            messageDiv.innerHTML = `<strong>[${{timestamp}}]</strong> ${{message}}`;
-            messagesDiv.appendChild(messageDiv);
-            messagesDiv.scrollTop = messagesDiv.scrollHeight;
-        }}
-
-        function showStatus(message, isError = false) {{
-            const statusDiv = document.getElementById('status');
-            statusDiv.textContent = message;
-            statusDiv.className = `status ${{isError ? 'error' : 'success'}}`;
-            setTimeout(() => statusDiv.textContent = '', 3000);
-        }}
-
-        async function sendMessage() {{
-            const messageInput = document.getElementById('message');
-            const message = messageInput.value.trim();
-            
-            if (!message) {{
-                showStatus('❌ Please enter a message', true);
-                return;
-            }}
-
-            try {{
-                const response = await fetch('/send_udp', {{
-                    method: 'POST',
-                    headers: {{ 'Content-Type': 'application/json' }},
-                    body: JSON.stringify({{ message: message }})
-                }});
-
-                const result = await response.json();
-                
-                if (result.success) {{
-                    messageCount++;
-                    addToLog(`📤 Message #${{messageCount}}: "${{message}}"`);
-                    showStatus('✅ Message sent successfully!');
-                    messageInput.value = '';
-                }} else {{
-                    addToLog(`❌ Failed to send: ${{result.error}}`, true);
-                    showStatus('❌ Failed to send message', true);
-                }}
-            }} catch (error) {{
-                addToLog(`❌ Network error: ${{error.message}}`, true);
-                showStatus('❌ Network error', true);
-            }}
-        }}
-
-        // Send message on Enter key
-        document.getElementById('message').addEventListener('keypress', function(e) {{
-            if (e.key === 'Enter' && !e.shiftKey) {{
-                e.preventDefault();
-                sendMessage();
-            }}
-        }});
-
-        // Initial status
-        addToLog('🌐 Connected to Ubuntu PC server');
-        showStatus('Ready to send messages');
-    </script>
+    <script src="{ASSETS.url('task1.js')}"></script>
 </body>
 </html>
 """
 
+TASK2_CSS = """
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    background: linear-gradient(135deg, #ff9a9e 0%, #fecfef 50%, #fecfef 100%);
+    height: 100vh;
+    display: flex;
+    flex-direction: column;
+}
+.header {
+    background: rgba(255, 255, 255, 0.2);
+    backdrop-filter: blur(10px);
+    padding: 20px;
+    text-align: center;
+    color: white;
+    box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
+}
+.header h1 {
+    margin-bottom: 10px;
+    text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
+}
+.chat-container {
+    flex: 1;
+    display: flex;
+    flex-direction: column;
+    max-width: 800px;
+    margin: 20px auto;
+    background: rgba(255, 255, 255, 0.1);
+    backdrop-filter: blur(10px);
+    border-radius: 15px;
+    overflow: hidden;
+    box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+}
+.connection-status {
+    padding: 15px;
+    text-align: center;
+    font-weight: bold;
+    border-bottom: 1px solid rgba(255, 255, 255, 0.2);
+}
+.connected { background: rgba(0, 255, 136, 0.3); color: white; }
+.disconnected { background: rgba(255, 107, 107, 0.3); color: white; }
+.messages {
+    flex: 1;
+    padding: 20px;
+    overflow-y: auto;
+    min-height: 400px;
+    max-height: 400px;
+}
+.message {
+    margin-bottom: 15px;
+    padding: 12px 16px;
+    border-radius: 18px;
+    max-width: 70%;
+    word-wrap: break-word;
+}
+.message.sent {
+    background: linear-gradient(135deg, #667eea, #764ba2);
+    color: white;
+    margin-left: auto;
+    text-align: right;
+}
+.message.received {
+    background: rgba(255, 255, 255, 0.9);
+    color: #333;
+}
+.message-time {
+    font-size: 0.8em;
+    opacity: 0.7;
+    margin-top: 5px;
+}
+.input-area {
+    padding: 20px;
+    background: rgba(255, 255, 255, 0.1);
+    border-top: 1px solid rgba(255, 255, 255, 0.2);
+}
+.input-group {
+    display: flex;
+    gap: 10px;
+}
+#messageInput {
+    flex: 1;
+    padding: 12px 16px;
+    border: none;
+    border-radius: 25px;
+    background: rgba(255, 255, 255, 0.9);
+    font-size: 16px;
+    outline: none;
+}
+#sendButton {
+    padding: 12px 24px;
+    border: none;
+    border-radius: 25px;
+    background: linear-gradient(45deg, #667eea, #764ba2);
+    color: white;
+    font-weight: bold;
+    cursor: pointer;
+    transition: transform 0.2s;
+}
+#sendButton:hover {
+    transform: translateY(-2px);
+}
+#sendButton:disabled {
+    opacity: 0.5;
+    cursor: not-allowed;
+}
+"""
+
+TASK2_JS = """
+let ws = null;
+let connected = false;
+let everConnected = false;
+let reconnectAttempts = 0;
+
+// Jittered exponential backoff, so a restarted server isn't hit by every page at once.
+// A 1013 close means the server turned us away and its reason says "retry=<seconds>".
+function reconnectDelay(event) {
+    const hint = event && event.code === 1013 ? /retry=([0-9.]+)/.exec(event.reason || '') : null;
+    const base = hint ? parseFloat(hint[1]) * 1000 : 1000;
+    const ceiling = Math.max(base, Math.min(60000, base * Math.pow(2, reconnectAttempts + 1)));
+    reconnectAttempts++;
+    return base + Math.random() * (ceiling - base);
+}
+
+function addMessage(content, isSent = false) {
+    const messagesDiv = document.getElementById('messages');
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${isSent ? 'sent' : 'received'}`;
+    
+    const timestamp = new Date().toLocaleTimeString();
+    const icon = isSent ? '🪟' : '🐧';
+    const sender = isSent ? 'You' : 'Ubuntu PC';
+    
+    messageDiv.innerHTML = `
+        <div>${content}</div>
+        <div class="message-time">${icon} ${sender} • ${timestamp}</div>
+    `;
+    
+    messagesDiv.appendChild(messageDiv);
+    messagesDiv.scrollTop = messagesDiv.scrollHeight;
+}
+
+function updateConnectionStatus(isConnected) {
+    const statusDiv = document.getElementById('connectionStatus');
+    const messageInput = document.getElementById('messageInput');
+    const sendButton = document.getElementById('sendButton');
+    
+    connected = isConnected;
+    
+    if (isConnected) {
+        statusDiv.textContent = '✅ Connected to Ubuntu PC';
+        statusDiv.className = 'connection-status connected';
+        messageInput.disabled = false;
+        sendButton.disabled = false;
+        messageInput.focus();
+    } else {
+        statusDiv.textContent = '❌ Disconnected from Ubuntu PC';
+        statusDiv.className = 'connection-status disconnected';
+        messageInput.disabled = true;
+        sendButton.disabled = true;
+    }
+}
+
+function connectWebSocket() {
+    try {
+        // The server replays recent messages to new clients; skip that when reconnecting
+        const hadConnected = everConnected;
+        let opened = false;
+        ws = new WebSocket(`ws://${LANCHAT.host}:8082/${everConnected ? '?replay=0' : ''}`);
+        
+        ws.onopen = function() {
+            opened = true;
+            everConnected = true;
+            updateConnectionStatus(true);
+            addMessage('Connected to Ubuntu PC chat server! 🎉');
+        };
+        
+        ws.onmessage = function(event) {
+            addMessage(event.data, false);
+        };
+        
+        ws.onclose = function(event) {
+            updateConnectionStatus(false);
+            if (opened && event.code !== 1013) reconnectAttempts = 0;  // a real session ended
+            const delay = reconnectDelay(event);
+            if (event.code === 1013) {
+                // Refused right after the handshake: no replay was sent, so still ask for one
+                everConnected = hadConnected;
+                addMessage(`Ubuntu PC is busy, retrying in ${Math.round(delay / 1000)}s ⏳`);
+            } else {
+                addMessage('Connection to Ubuntu PC lost 📡');
+            }
+            setTimeout(connectWebSocket, delay);
+        };
+        
+        ws.onerror = function(error) {
+            console.error('WebSocket error:', error);
+            addMessage('Connection error occurred ❌');
+        };
+    } catch (error) {
+        console.error('Failed to connect:', error);
+        addMessage('Failed to connect to Ubuntu PC ❌');
+        setTimeout(connectWebSocket, reconnectDelay(null));
+    }
+}
+
+function sendMessage() {
+    const messageInput = document.getElementById('messageInput');
+    const message = messageInput.value.trim();
+    
+    if (!message || !connected) return;
+    
+    ws.send(message);
+    addMessage(message, true);
+    messageInput.value = '';
+}
+
+// Send message on Enter key
+document.getElementById('messageInput').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+// Connect when page loads
+connectWebSocket();
+"""
+
 def generate_task2_html(server_ip, port=8002):
     """Generate HTML for Task 2: TCP Chat"""
     return f"""
@@ -316,112 +571,7 @@ def generate_task2_html(server_ip, port=8002):
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Task 2: TCP Chat</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #ff9a9e 0%, #fecfef 50%, #fecfef 100%);
-            height: 100vh;
-            display: flex;
-            flex-direction: column;
-        }}
-        .header {{
-            background: rgba(255, 255, 255, 0.2);
-            backdrop-filter: blur(10px);
-            padding: 20px;
-            text-align: center;
-            color: white;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
-        }}
-        .header h1 {{
-            margin-bottom: 10px;
-            text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
-        }}
-        .chat-container {{
-            flex: 1;
-            display: flex;
-            flex-direction: column;
-            max-width: 800px;
-            margin: 20px auto;
-            background: rgba(255, 255, 255, 0.1);
-            backdrop-filter: blur(10px);
-            border-radius: 15px;
-            overflow: hidden;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-        }}
-        .connection-status {{
-            padding: 15px;
-            text-align: center;
-            font-weight: bold;
-            border-bottom: 1px solid rgba(255, 255, 255, 0.2);
-        }}
-        .connected {{ background: rgba(0, 255, 136, 0.3); color: white; }}
-        .disconnected {{ background: rgba(255, 107, 107, 0.3); color: white; }}
-        .messages {{
-            flex: 1;
-            padding: 20px;
-            overflow-y: auto;
-            min-height: 400px;
-            max-height: 400px;
-        }}
-        .message {{
-            margin-bottom: 15px;
-            padding: 12px 16px;
-            border-radius: 18px;
-            max-width: 70%;
-            word-wrap: break-word;
-        }}
-        .message.sent {{
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            color: white;
-            margin-left: auto;
-            text-align: right;
-        }}
-        .message.received {{
-            background: rgba(255, 255, 255, 0.9);
-            color: #333;
-        }}
-        .message-time {{
-            font-size: 0.8em;
-            opacity: 0.7;
-            margin-top: 5px;
-        }}
-        .input-area {{
-            padding: 20px;
-            background: rgba(255, 255, 255, 0.1);
-            border-top: 1px solid rgba(255, 255, 255, 0.2);
-        }}
-        .input-group {{
-            display: flex;
-            gap: 10px;
-        }}
-        #messageInput {{
-            flex: 1;
-            padding: 12px 16px;
-            border: none;
-            border-radius: 25px;
-            background: rgba(255, 255, 255, 0.9);
-            font-size: 16px;
-            outline: none;
-        }}
-        #sendButton {{
-            padding: 12px 24px;
-            border: none;
-            border-radius: 25px;
-            background: linear-gradient(45deg, #667eea, #764ba2);
-            color: white;
-            font-weight: bold;
-            cursor: pointer;
-            transition: transform 0.2s;
-        }}
-        #sendButton:hover {{
-            transform: translateY(-2px);
-        }}
-        #sendButton:disabled {{
-            opacity: 0.5;
-            cursor: not-allowed;
-        }}
-    </style>
+    <link rel="stylesheet" href="{ASSETS.url('task2.css')}">
 </head>
 <body>
     <div class="header">
@@ -445,106 +595,591 @@ def generate_task2_html(server_ip, port=8002):
         </div>
     </div>
 
-    <script>
-        let ws = null;
-        let connected = false;
-
-        function addMessage(content, isSent = false) {{
-            const messagesDiv = document.getElementById('messages');
-            const messageDiv = document.createElement('div');
-            messageDiv.className = `message ${{isSent ? 'sent' : 'received'}}`;
-            
-            const timestamp = new Date().toLocaleTimeString();
-            const icon = isSent ? '🪟' : '🐧';
-            const sender = isSent ? 'You' : 'Ubuntu PC';
-            
-            messageDiv.innerHTML = `
-                <div>${{content}}</div>
-                <div class="message-time">${{icon}} ${{sender}} • ${{timestamp}}</div>
-            `;
-            
-            messagesDiv.appendChild(messageDiv);
-            messagesDiv.scrollTop = messagesDiv.scrollHeight;
-        }}
-
-        function updateConnectionStatus(isConnected) {{
-            const statusDiv = document.getElementById('connectionStatus');
-            const messageInput = document.getElementById('messageInput');
-            const sendButton = document.getElementById('sendButton');
-            
-            connected = isConnected;
-            
-            if (isConnected) {{
-                statusDiv.textContent = '✅ Connected to Ubuntu PC';
-                statusDiv.className = 'connection-status connected';
-                messageInput.disabled = false;
-                sendButton.disabled = false;
-                messageInput.focus();
-            }} else {{
-                statusDiv.textContent = '❌ Disconnected from Ubuntu PC';
-                statusDiv.className = 'connection-status disconnected';
-                messageInput.disabled = true;
-                sendButton.disabled = true;
-            }}
-        }}
-
-        function connectWebSocket() {{
-            try {{
-                ws = new WebSocket(`ws://{server_ip}:8082`);
-                
-                ws.onopen = function() {{
-                    updateConnectionStatus(true);
-                    addMessage('Connected to Ubuntu PC chat server! 🎉');
-                }};
-                
-                ws.onmessage = function(event) {{
-                    addMessage(event.data, false);
-                }};
-                
-                ws.onclose = function() {{
-                    updateConnectionStatus(false);
-                    addMessage('Connection to Ubuntu PC lost 📡');
-                    // Try to reconnect after 3 seconds
-                    setTimeout(connectWebSocket, 3000);
-                }};
-                
-                ws.onerror = function(error) {{
-                    console.error('WebSocket error:', error);
-                    addMessage('Connection error occurred ❌');
-                }};
-            }} catch (error) {{
-                console.error('Failed to connect:', error);
-                addMessage('Failed to connect to Ubuntu PC ❌');
-                setTimeout(connectWebSocket, 3000);
-            }}
-        }}
-
-        function sendMessage() {{
-            const messageInput = document.getElementById('messageInput');
-            const message = messageInput.value.trim();
-            
-            if (!message || !connected) return;
-            
-            ws.send(message);
-            addMessage(message, true);
-            messageInput.value = '';
-        }}
-
-        // Send message on Enter key
-        document.getElementById('messageInput').addEventListener('keypress', function(e) {{
-            if (e.key === 'Enter') {{
-                e.preventDefault();
-                sendMessage();
-            }}
-        }});
-
-        // Connect when page loads
-        connectWebSocket();
-    </script>
+    <script>const LANCHAT = {_page_config(host=server_ip)};</script>
+    <script src="{ASSETS.url('task2.js')}"></script>
 </body>
 </html>
 """
 
+TASK3_CSS = """
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    height: 100vh;
+    display: flex;
+    flex-direction: column;
+}
+.header {
+    background: rgba(255, 255, 255, 0.2);
+    backdrop-filter: blur(10px);
+    padding: 20px;
+    text-align: center;
+    color: white;
+    box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
+}
+.main-container {
+    flex: 1;
+    display: flex;
+    max-width: 1200px;
+    margin: 20px auto;
+    gap: 20px;
+    padding: 0 20px;
+}
+.chat-container {
+    flex: 2;
+    background: rgba(255, 255, 255, 0.1);
+    backdrop-filter: blur(10px);
+    border-radius: 15px;
+    display: flex;
+    flex-direction: column;
+    overflow: hidden;
+    box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+}
+.users-panel {
+    flex: 1;
+    background: rgba(255, 255, 255, 0.1);
+    backdrop-filter: blur(10px);
+    border-radius: 15px;
+    padding: 20px;
+    max-width: 300px;
+    box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+}
+.login-screen {
+    position: fixed;
+    top: 0;
+    left: 0;
+    width: 100%;
+    height: 100%;
+    background: rgba(0, 0, 0, 0.8);
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    z-index: 1000;
+}
+.login-form {
+    background: rgba(255, 255, 255, 0.1);
+    backdrop-filter: blur(10px);
+    padding: 40px;
+    border-radius: 20px;
+    text-align: center;
+    color: white;
+    max-width: 400px;
+    width: 100%;
+}
+.login-form input {
+    width: 100%;
+    padding: 12px;
+    margin: 10px 0;
+    border: none;
+    border-radius: 8px;
+    font-size: 16px;
+    background: rgba(255, 255, 255, 0.9);
+    color: #333;
+}
+.login-form button {
+    width: 100%;
+    padding: 12px;
+    border: none;
+    border-radius: 8px;
+    background: linear-gradient(45deg, #00ff88, #00d4aa);
+    color: white;
+    font-weight: bold;
+    font-size: 16px;
+    cursor: pointer;
+    margin-top: 10px;
+}
+.connection-status {
+    padding: 15px;
+    text-align: center;
+    font-weight: bold;
+    border-bottom: 1px solid rgba(255, 255, 255, 0.2);
+    color: white;
+}
+.connected { background: rgba(0, 255, 136, 0.3); }
+.disconnected { background: rgba(255, 107, 107, 0.3); }
+.messages {
+    flex: 1;
+    padding: 20px;
+    overflow-y: auto;
+    min-height: 400px;
+}
+.message {
+    margin-bottom: 15px;
+    padding: 12px 16px;
+    border-radius: 18px;
+    background: rgba(255, 255, 255, 0.1);
+    color: white;
+    word-wrap: break-word;
+}
+.message.own {
+    background: linear-gradient(135deg, #667eea, #764ba2);
+    margin-left: auto;
+    max-width: 70%;
+    text-align: right;
+}
+.message.system {
+    background: rgba(255, 193, 7, 0.3);
+    text-align: center;
+    font-style: italic;
+}
+.message-header {
+    font-size: 0.9em;
+    font-weight: bold;
+    margin-bottom: 5px;
+}
+.message-time {
+    font-size: 0.8em;
+    opacity: 0.7;
+    margin-top: 5px;
+}
+.input-area {
+    padding: 20px;
+    background: rgba(255, 255, 255, 0.1);
+    border-top: 1px solid rgba(255, 255, 255, 0.2);
+}
+.input-group {
+    display: flex;
+    gap: 10px;
+}
+#messageInput {
+    flex: 1;
+    padding: 12px 16px;
+    border: none;
+    border-radius: 25px;
+    background: rgba(255, 255, 255, 0.9);
+    font-size: 16px;
+    outline: none;
+    color: #333;
+}
+#sendButton {
+    padding: 12px 24px;
+    border: none;
+    border-radius: 25px;
+    background: linear-gradient(45deg, #667eea, #764ba2);
+    color: white;
+    font-weight: bold;
+    cursor: pointer;
+    transition: transform 0.2s;
+}
+#sendButton:hover {
+    transform: translateY(-2px);
+}
+.users-header {
+    color: white;
+    margin-bottom: 20px;
+    text-align: center;
+    font-weight: bold;
+    font-size: 1.2em;
+}
+.user-list {
+    color: white;
+}
+.user-item {
+    padding: 10px;
+    margin-bottom: 8px;
+    background: rgba(255, 255, 255, 0.1);
+    border-radius: 8px;
+    display: flex;
+    align-items: center;
+    gap: 10px;
+}
+.user-item.own {
+    background: rgba(0, 255, 136, 0.2);
+}
+.commands {
+    margin-top: 20px;
+    padding-top: 20px;
+    border-top: 1px solid rgba(255, 255, 255, 0.2);
+    color: rgba(255, 255, 255, 0.8);
+    font-size: 0.9em;
+}
+.hidden { display: none; }
+"""
+
+TASK3_JS = """
+let ws = null;
+let connected = false;
+let username = '';
+let userOS = '';
+let room = 'lobby';
+let users = [];
+let presenceVersion = 0;
+let resyncing = false;  // a snapshot has been requested and not yet received
+let reconnectAttempts = 0;
+const userItems = new Map();  // username -> { user, element } in the users panel
+
+const BINARY_PROTOCOL = 'lanchat.bin.v1';
+const EVENT_TYPES = ['join', 'joined', 'user_joined', 'user_left', 'message', 'list_users', 'users', 'error',
+                     'user_updated'];
+const useBinary = !/[?&]proto=json/.test(location.search);
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+const knownUsers = {};  // interned user id -> { username, os }
+
+function shortString(text) {
+    const bytes = textEncoder.encode(text || '').slice(0, 255);
+    const out = new Uint8Array(bytes.length + 1);
+    out[0] = bytes.length;
+    out.set(bytes, 1);
+    return out;
+}
+
+// lanchat.bin.v1: 8-byte header (type, flags, user id, unix time) + body
+function encodeEvent(data) {
+    let body = new Uint8Array(0);
+    if (data.type === 'join') {
+        const os = shortString(data.os);
+        const roomName = shortString(data.room);
+        const name = textEncoder.encode(data.username);
+        body = new Uint8Array(os.length + roomName.length + name.length);
+        body.set(os);
+        body.set(roomName, os.length);
+        body.set(name, os.length + roomName.length);
+    } else if (data.type === 'message') {
+        body = textEncoder.encode(data.message);
+    } else if (data.type === 'list_users' && data.version !== undefined) {
+        body = new Uint8Array(4);
+        new DataView(body.buffer).setUint32(0, data.version);
+    }
+    const frame = new Uint8Array(8 + body.length);
+    const view = new DataView(frame.buffer);
+    view.setUint8(0, EVENT_TYPES.indexOf(data.type) + 1);
+    view.setUint32(4, Math.floor(Date.now() / 1000));
+    frame.set(body, 8);
+    return frame.buffer;
+}
+
+function userById(id) {
+    return knownUsers[id] || { username: 'user' + id, os: '' };
+}
+
+function decodeEvent(buffer) {
+    const view = new DataView(buffer);
+    let body = new Uint8Array(buffer, 8);
+    const userId = view.getUint16(2);
+    const data = {
+        type: EVENT_TYPES[view.getUint8(0) - 1],
+        timestamp: new Date(view.getUint32(4) * 1000).toLocaleTimeString()
+    };
+    if (['user_joined', 'user_updated', 'user_left', 'users'].includes(data.type)) {
+        // Presence events lead with the room's presence version
+        data.version = view.getUint32(8);
+        body = new Uint8Array(buffer, 12);
+    }
+    if (data.type === 'joined') {
+        let offset = 1 + body[0];
+        data.os = textDecoder.decode(body.subarray(1, offset));
+        data.room = textDecoder.decode(body.subarray(offset + 1, offset + 1 + body[offset]));
+        data.username = textDecoder.decode(body.subarray(offset + 1 + body[offset]));
+        knownUsers[userId] = { username: data.username, os: data.os };
+    } else if (data.type === 'user_joined' || data.type === 'user_updated') {
+        data.os = textDecoder.decode(body.subarray(1, 1 + body[0]));
+        data.username = textDecoder.decode(body.subarray(1 + body[0]));
+        knownUsers[userId] = { username: data.username, os: data.os };
+    } else if (data.type === 'user_left') {
+        data.username = userById(userId).username;
+    } else if (data.type === 'message') {
+        if (view.getUint8(1) & 1) {
+            // Sender named inline (history replay or a user without an id)
+            data.sender = textDecoder.decode(body.subarray(1, 1 + body[0]));
+            data.message = textDecoder.decode(body.subarray(1 + body[0]));
+        } else {
+            data.sender = userById(userId).username;
+            data.message = textDecoder.decode(body);
+        }
+    } else if (data.type === 'users') {
+        data.users = [];
+        let offset = 2;
+        const count = view.getUint16(12);
+        for (let i = 0; i < count; i++) {
+            const id = view.getUint16(12 + offset);
+            offset += 2;
+            const os = textDecoder.decode(body.subarray(offset + 1, offset + 1 + body[offset]));
+            offset += 1 + body[offset];
+            const name = textDecoder.decode(body.subarray(offset + 1, offset + 1 + body[offset]));
+            offset += 1 + body[offset];
+            knownUsers[id] = { username: name, os: os };
+            data.users.push(knownUsers[id]);
+        }
+    } else if (data.type === 'error') {
+        data.message = textDecoder.decode(body);
+    }
+    return data;
+}
+
+// Jittered exponential backoff on top of the server's "retry=<seconds>" hint (close code 1013)
+function reconnectDelay(event) {
+    const hint = /retry=([0-9.]+)/.exec(event.reason || '');
+    const base = hint ? parseFloat(hint[1]) * 1000 : 1000;
+    const ceiling = Math.max(base, Math.min(60000, base * Math.pow(2, reconnectAttempts + 1)));
+    reconnectAttempts++;
+    return base + Math.random() * (ceiling - base);
+}
+
+function sendEvent(data) {
+    ws.send(ws.protocol === BINARY_PROTOCOL ? encodeEvent(data) : JSON.stringify(data));
+}
+
+function addMessage(content, type = 'normal', sender = '', timestamp = null) {
+    const messagesDiv = document.getElementById('messages');
+    const messageDiv = document.createElement('div');
+    
+    if (!timestamp) {
+        timestamp = new Date().toLocaleTimeString();
+    }
+    
+    if (type === 'system') {
+        messageDiv.className = 'message system';
+        messageDiv.innerHTML = `${content}<div class="message-time">${timestamp}</div>`;
+    } else if (type === 'own') {
+        messageDiv.className = 'message own';
+        messageDiv.innerHTML = `
+            <div class="message-header">🪟 You</div>
+            <div>${content}</div>
+            <div class="message-time">${timestamp}</div>
+        `;
+    } else {
+        messageDiv.className = 'message';
+        const icon = getOSIcon(sender);
+        messageDiv.innerHTML = `
+            <div class="message-header">${icon} ${sender}</div>
+            <div>${content}</div>
+            <div class="message-time">${timestamp}</div>
+        `;
+    }
+    
+    messagesDiv.appendChild(messageDiv);
+    messagesDiv.scrollTop = messagesDiv.scrollHeight;
+}
+
+function getOSIcon(userInfo) {
+    if (typeof userInfo === 'string') return '💻';
+    const os = userInfo.os || '';
+    if (os.toLowerCase().includes('windows')) return '🪟';
+    if (os.toLowerCase().includes('linux')) return '🐧';
+    if (os.toLowerCase().includes('mac')) return '🍎';
+    return '💻';
+}
+
+function renderUser(user, userDiv) {
+    userDiv.className = `user-item ${user.username === username ? 'own' : ''}`;
+    const icon = getOSIcon(user);
+    const label = user.username === username ? 'You' : user.username;
+    userDiv.innerHTML = `${icon} <span>${label}</span>`;
+    return userDiv;
+}
+
+// Full snapshot: only sent when we join or ask after a version gap
+function updateUserList(userList, version) {
+    const userListDiv = document.getElementById('userList');
+    userListDiv.innerHTML = '';
+    userItems.clear();
+    userList.forEach(user => {
+        const userDiv = renderUser(user, document.createElement('div'));
+        userItems.set(user.username, { user: user, element: userDiv });
+        userListDiv.appendChild(userDiv);
+    });
+    users = userList;
+    presenceVersion = version || 0;
+    resyncing = false;
+}
+
+// Delta: touch only the one row it names, or resync if a version was missed
+function applyPresence(data) {
+    if (data.version === undefined) return true;
+    if (data.version <= presenceVersion) return false;
+    if (resyncing) return true;
+    if (data.version !== presenceVersion + 1) {
+        resyncing = true;
+        sendEvent({ type: 'list_users', version: presenceVersion });
+        return true;
+    }
+    presenceVersion = data.version;
+    const item = userItems.get(data.username);
+    if (data.type === 'user_left') {
+        if (item) {
+            item.element.remove();
+            userItems.delete(data.username);
+        }
+    } else if (item) {
+        item.user = { username: data.username, os: data.os };
+        renderUser(item.user, item.element);
+    } else {
+        const user = { username: data.username, os: data.os };
+        const userDiv = renderUser(user, document.createElement('div'));
+        userItems.set(user.username, { user: user, element: userDiv });
+        document.getElementById('userList').appendChild(userDiv);
+    }
+    users = Array.from(userItems.values(), entry => entry.user);
+    return true;
+}
+
+function updateConnectionStatus(isConnected) {
+    const statusDiv = document.getElementById('connectionStatus');
+    const messageInput = document.getElementById('messageInput');
+    const sendButton = document.getElementById('sendButton');
+    
+    connected = isConnected;
+    
+    if (isConnected) {
+        statusDiv.textContent = `✅ Connected as ${username} in #${room}`;
+        statusDiv.className = 'connection-status connected';
+        messageInput.disabled = false;
+        sendButton.disabled = false;
+        messageInput.focus();
+    } else {
+        statusDiv.textContent = '❌ Disconnected from Ubuntu PC';
+        statusDiv.className = 'connection-status disconnected';
+        messageInput.disabled = true;
+        sendButton.disabled = true;
+    }
+}
+
+function joinChat() {
+    const usernameInput = document.getElementById('usernameInput');
+    const osInput = document.getElementById('osInput');
+    
+    username = usernameInput.value.trim();
+    userOS = osInput.value.trim();
+    room = document.getElementById('roomInput').value.trim() || 'lobby';
+    
+    if (!username) {
+        alert('Please enter a username');
+        return;
+    }
+    
+    document.getElementById('loginScreen').classList.add('hidden');
+    connectWebSocket();
+}
+
+function connectWebSocket() {
+    try {
+        // Offer the binary protocol; servers that don't speak it simply leave ws.protocol empty
+        ws = new WebSocket(`ws://${LANCHAT.host}:8083`, useBinary ? [BINARY_PROTOCOL] : []);
+        ws.binaryType = 'arraybuffer';
+        
+        ws.onopen = function() {
+            // Send join message
+            sendEvent({
+                type: 'join',
+                username: username,
+                os: userOS,
+                room: room
+            });
+        };
+        
+        ws.onmessage = function(event) {
+            try {
+                const data = event.data instanceof ArrayBuffer
+                    ? decodeEvent(event.data)
+                    : JSON.parse(event.data);
+                
+                switch(data.type) {
+                    case 'joined':
+                        reconnectAttempts = 0;
+                        room = data.room || room;
+                        // The room's recent history is replayed right after this
+                        document.getElementById('messages').innerHTML = '';
+                        updateConnectionStatus(true);
+                        addMessage(`Welcome to #${room}! 🎉`, 'system');
+                        break;
+                    case 'user_joined':
+                        if (applyPresence(data)) addMessage(`${data.username} joined the chat`, 'system');
+                        break;
+                    case 'user_left':
+                        if (applyPresence(data)) addMessage(`${data.username} left the chat`, 'system');
+                        break;
+                    case 'user_updated':
+                        applyPresence(data);
+                        break;
+                    case 'message':
+                        addMessage(data.message, data.sender === username ? 'own' : 'normal',
+                                   data.sender, data.timestamp);
+                        break;
+                    case 'users':
+                        updateUserList(data.users, data.version);
+                        break;
+                    case 'error':
+                        addMessage(`Error: ${data.message}`, 'system');
+                        break;
+                }
+            } catch (e) {
+                console.error('Error parsing message:', e);
+            }
+        };
+        
+        ws.onclose = function(event) {
+            updateConnectionStatus(false);
+            if (event.code === 1013) {
+                // Turned away by admission control: come back when the server suggests
+                const delay = reconnectDelay(event);
+                addMessage(`Ubuntu PC is busy, retrying in ${Math.round(delay / 1000)}s ⏳`, 'system');
+                setTimeout(connectWebSocket, delay);
+                return;
+            }
+            addMessage('Connection to Ubuntu PC lost 📡', 'system');
+            setTimeout(() => {
+                document.getElementById('loginScreen').classList.remove('hidden');
+            }, 2000);
+        };
+        
+        ws.onerror = function(error) {
+            console.error('WebSocket error:', error);
+            addMessage('Connection error occurred ❌', 'system');
+        };
+    } catch (error) {
+        console.error('Failed to connect:', error);
+        addMessage('Failed to connect to Ubuntu PC ❌', 'system');
+    }
+}
+
+function sendMessage() {
+    const messageInput = document.getElementById('messageInput');
+    const message = messageInput.value.trim();
+    
+    if (!message || !connected) return;
+    
+    if (message.startsWith('/')) {
+        // Handle commands
+        if (message === '/list') {
+            // The panel is kept current by deltas; the server only answers if we are behind
+            sendEvent({ type: 'list_users', version: presenceVersion });
+            addMessage(`Online in #${room}: ${users.map(user => user.username).join(', ')}`, 'system');
+        } else if (message === '/quit') {
+            ws.close();
+        } else {
+            addMessage('Unknown command. Use /list or /quit', 'system');
+        }
+    } else {
+        // Send regular message
+        sendEvent({
+            type: 'message',
+            message: message
+        });
+        addMessage(message, 'own');
+    }
+    
+    messageInput.value = '';
+}
+
+// Send message on Enter key
+document.getElementById('messageInput').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        e.preventDefault();
+        sendMessage();
+    }
+});
+
+// Join chat on Enter key in username input
+document.getElementById('usernameInput').addEventListener('keypress', function(e) {
+    if (e.key === 'Enter') {
+        e.preventDefault();
+        joinChat();
+    }
+});
+"""
+
 def generate_task3_html(server_ip, port=8003):
     """Generate HTML for Task 3: Multi-user Chat"""
     return f"""
@@ -554,201 +1189,7 @@ def generate_task3_html(server_ip, port=8003):
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Task 3: Multi-User Chat</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            height: 100vh;
-            display: flex;
-            flex-direction: column;
-        }}
-        .header {{
-            background: rgba(255, 255, 255, 0.2);
-            backdrop-filter: blur(10px);
-            padding: 20px;
-            text-align: center;
-            color: white;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
-        }}
-        .main-container {{
-            flex: 1;
-            display: flex;
-            max-width: 1200px;
-            margin: 20px auto;
-            gap: 20px;
-            padding: 0 20px;
-        }}
-        .chat-container {{
-            flex: 2;
-            background: rgba(255, 255, 255, 0.1);
-            backdrop-filter: blur(10px);
-            border-radius: 15px;
-            display: flex;
-            flex-direction: column;
-            overflow: hidden;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-        }}
-        .users-panel {{
-            flex: 1;
-            background: rgba(255, 255, 255, 0.1);
-            backdrop-filter: blur(10px);
-            border-radius: 15px;
-            padding: 20px;
-            max-width: 300px;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-        }}
-        .login-screen {{
-            position: fixed;
-            top: 0;
-            left: 0;
-            width: 100%;
-            height: 100%;
-            background: rgba(0, 0, 0, 0.8);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            z-index: 1000;
-        }}
-        .login-form {{
-            background: rgba(255, 255, 255, 0.1);
-            backdrop-filter: blur(10px);
-            padding: 40px;
-            border-radius: 20px;
-            text-align: center;
-            color: white;
-            max-width: 400px;
-            width: 100%;
-        }}
-        .login-form input {{
-            width: 100%;
-            padding: 12px;
-            margin: 10px 0;
-            border: none;
-            border-radius: 8px;
-            font-size: 16px;
-            background: rgba(255, 255, 255, 0.9);
-            color: #333;
-        }}
-        .login-form button {{
-            width: 100%;
-            padding: 12px;
-            border: none;
-            border-radius: 8px;
-            background: linear-gradient(45deg, #00ff88, #00d4aa);
-            color: white;
-            font-weight: bold;
-            font-size: 16px;
-            cursor: pointer;
-            margin-top: 10px;
-        }}
-        .connection-status {{
-            padding: 15px;
-            text-align: center;
-            font-weight: bold;
-            border-bottom: 1px solid rgba(255, 255, 255, 0.2);
-            color: white;
-        }}
-        .connected {{ background: rgba(0, 255, 136, 0.3); }}
-        .disconnected {{ background: rgba(255, 107, 107, 0.3); }}
-        .messages {{
-            flex: 1;
-            padding: 20px;
-            overflow-y: auto;
-            min-height: 400px;
-        }}
-        .message {{
-            margin-bottom: 15px;
-            padding: 12px 16px;
-            border-radius: 18px;
-            background: rgba(255, 255, 255, 0.1);
-            color: white;
-            word-wrap: break-word;
-        }}
-        .message.own {{
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            margin-left: auto;
-            max-width: 70%;
-            text-align: right;
-        }}
-        .message.system {{
-            background: rgba(255, 193, 7, 0.3);
-            text-align: center;
-            font-style: italic;
-        }}
-        .message-header {{
-            font-size: 0.9em;
-            font-weight: bold;
-            margin-bottom: 5px;
-        }}
-        .message-time {{
-            font-size: 0.8em;
-            opacity: 0.7;
-            margin-top: 5px;
-        }}
-        .input-area {{
-            padding: 20px;
-            background: rgba(255, 255, 255, 0.1);
-            border-top: 1px solid rgba(255, 255, 255, 0.2);
-        }}
-        .input-group {{
-            display: flex;
-            gap: 10px;
-        }}
-        #messageInput {{
-            flex: 1;
-            padding: 12px 16px;
-            border: none;
-            border-radius: 25px;
-            background: rgba(255, 255, 255, 0.9);
-            font-size: 16px;
-            outline: none;
-            color: #333;
-        }}
-        #sendButton {{
-            padding: 12px 24px;
-            border: none;
-            border-radius: 25px;
-            background: linear-gradient(45deg, #667eea, #764ba2);
-            color: white;
-            font-weight: bold;
-            cursor: pointer;
-            transition: transform 0.2s;
-        }}
-        #sendButton:hover {{
-            transform: translateY(-2px);
-        }}
-        .users-header {{
-            color: white;
-            margin-bottom: 20px;
-            text-align: center;
-            font-weight: bold;
-            font-size: 1.2em;
-        }}
-        .user-list {{
-            color: white;
-        }}
-        .user-item {{
-            padding: 10px;
-            margin-bottom: 8px;
-            background: rgba(255, 255, 255, 0.1);
-            border-radius: 8px;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }}
-        .user-item.own {{
-            background: rgba(0, 255, 136, 0.2);
-        }}
-        .commands {{
-            margin-top: 20px;
-            padding-top: 20px;
-            border-top: 1px solid rgba(255, 255, 255, 0.2);
-            color: rgba(255, 255, 255, 0.8);
-            font-size: 0.9em;
-        }}
-        .hidden {{ display: none; }}
-    </style>
+    <link rel="stylesheet" href="{ASSETS.url('task3.css')}">
 </head>
 <body>
     <div id="loginScreen" class="login-screen">
@@ -757,6 +1198,7 @@ def generate_task3_html(server_ip, port=8003):
             <p>Enter your details to connect to Ubuntu PC</p>
             <input type="text" id="usernameInput" placeholder="Your username" maxlength="20">
             <input type="text" id="osInput" placeholder="Your OS (Windows/Linux/Mac)" value="Windows">
+            <input type="text" id="roomInput" placeholder="Room" value="lobby" maxlength="32">
             <button onclick="joinChat()">🚀 Join Chat</button>
         </div>
     </div>
@@ -795,214 +1237,108 @@ def generate_task3_html(server_ip, port=8003):
         </div>
     </div>
 
-    <script>
-        let ws = null;
-        let connected = false;
-        let username = '';
-        let userOS = '';
-        let users = [];
-
-        function addMessage(content, type = 'normal', sender = '', timestamp = null) {{
-            const messagesDiv = document.getElementById('messages');
-            const messageDiv = document.createElement('div');
-            
-            if (!timestamp) {{
-                timestamp = new Date().toLocaleTimeString();
-            }}
-            
-            if (type === 'system') {{
-                messageDiv.className = 'message system';
-                messageDiv.innerHTML = `${{content}}<div class="message-time">${{timestamp}}</div>`;
-            }} else if (type === 'own') {{
-                messageDiv.className = 'message own';
-                messageDiv.innerHTML = `
-                    <div class="message-header">🪟 You</div>
-                    <div>${{content}}</div>
-                    <div class="message-time">${{timestamp}}</div>
-                `;
-            }} else {{
-                messageDiv.className = 'message';
-                const icon = getOSIcon(sender);
-                messageDiv.innerHTML = `
-                    <div class="message-header">${{icon}} ${{sender}}</div>
-                    <div>${{content}}</div>
-                    <div class="message-time">${{timestamp}}</div>
-                `;
-            }}
-            
-            messagesDiv.appendChild(messageDiv);
-            messagesDiv.scrollTop = messagesDiv.scrollHeight;
-        }}
-
-        function getOSIcon(userInfo) {{
-            if (typeof userInfo === 'string') return '💻';
-            const os = userInfo.os || '';
-            if (os.toLowerCase().includes('windows')) return '🪟';
-            if (os.toLowerCase().includes('linux')) return '🐧';
-            if (os.toLowerCase().includes('mac')) return '🍎';
-            return '💻';
-        }}
-
-        function updateUserList(userList) {{
-            users = userList;
-            const userListDiv = document.getElementById('userList');
-            userListDiv.innerHTML = '';
-            
-            userList.forEach(user => {{
-                const userDiv = document.createElement('div');
-                userDiv.className = `user-item ${{user.username === username ? 'own' : ''}}`;
-                const icon = getOSIcon(user);
-                const label = user.username === username ? 'You' : user.username;
-                userDiv.innerHTML = `${{icon}} <span>${{label}}</span>`;
-                userListDiv.appendChild(userDiv);
-            }});
-        }}
-
-        function updateConnectionStatus(isConnected) {{
-            const statusDiv = document.getElementById('connectionStatus');
-            const messageInput = document.getElementById('messageInput');
-            const sendButton = document.getElementById('sendButton');
-            
-            connected = isConnected;
-            
-            if (isConnected) {{
-                statusDiv.textContent = `✅ Connected as ${{username}}`;
-                statusDiv.className = 'connection-status connected';
-                messageInput.disabled = false;
-                sendButton.disabled = false;
-                messageInput.focus();
-            }} else {{
-                statusDiv.textContent = '❌ Disconnected from Ubuntu PC';
-                statusDiv.className = 'connection-status disconnected';
-                messageInput.disabled = true;
-                sendButton.disabled = true;
-            }}
-        }}
-
-        function joinChat() {{
-            const usernameInput = document.getElementById('usernameInput');
-            const osInput = document.getElementById('osInput');
-            
-            username = usernameInput.value.trim();
-            userOS = osInput.value.trim();
-            
-            if (!username) {{
-                alert('Please enter a username');
-                return;
-            }}
-            
-            document.getElementById('loginScreen').classList.add('hidden');
-            connectWebSocket();
-        }}
-
-        function connectWebSocket() {{
-            try {{
-                ws = new WebSocket(`ws://{server_ip}:8083`);
-                
-                ws.onopen = function() {{
-                    // Send join message
-                    ws.send(JSON.stringify({{
-                        type: 'join',
-                        username: username,
-                        os: userOS
-                    }}));
-                }};
-                
-                ws.onmessage = function(event) {{
-                    try {{
-                        const data = JSON.parse(event.data);
-                        
-                        switch(data.type) {{
-                            case 'joined':
-                                updateConnectionStatus(true);
-                                addMessage(`Welcome to the chat room! 🎉`, 'system');
-                                break;
-                            case 'user_joined':
-                                addMessage(`${{data.username}} joined the chat`, 'system');
-                                break;
-                            case 'user_left':
-                                addMessage(`${{data.username}} left the chat`, 'system');
-                                break;
-                            case 'message':
-                                addMessage(data.message, 'normal', data.sender, data.timestamp);
-                                break;
-                            case 'users':
-                                updateUserList(data.users);
-                                break;
-                            case 'error':
-                                addMessage(`Error: ${{data.message}}`, 'system');
-                                break;
-                        }}
-                    }} catch (e) {{
-                        console.error('Error parsing message:', e);
-                    }}
-                }};
-                
-                ws.onclose = function() {{
-                    updateConnectionStatus(false);
-                    addMessage('Connection to Ubuntu PC lost 📡', 'system');
-                    setTimeout(() => {{
-                        document.getElementById('loginScreen').classList.remove('hidden');
-                    }}, 2000);
-                }};
-                
-                ws.onerror = function(error) {{
-                    console.error('WebSocket error:', error);
-                    addMessage('Connection error occurred ❌', 'system');
-                }};
-            }} catch (error) {{
-                console.error('Failed to connect:', error);
-                addMessage('Failed to connect to Ubuntu PC ❌', 'system');
-            }}
-        }}
-
-        function sendMessage() {{
-            const messageInput = document.getElementById('messageInput');
-            const message = messageInput.value.trim();
-            
-            if (!message || !connected) return;
-            
-            if (message.startsWith('/')) {{
-                // Handle commands
-                if (message === '/list') {{
-                    ws.send(JSON.stringify({{ type: 'list_users' }}));
-                }} else if (message === '/quit') {{
-                    ws.close();
-                }} else {{
-                    addMessage('Unknown command. Use /list or /quit', 'system');
-                }}
-            }} else {{
-                // Send regular message
-                ws.send(JSON.stringify({{
-                    type: 'message',
-                    message: message
-                }}));
-                addMessage(message, 'own');
-            }}
-            
-            messageInput.value = '';
-        }}
-
-        // Send message on Enter key
-        document.getElementById('messageInput').addEventListener('keypress', function(e) {{
-            if (e.key === 'Enter') {{
-                e.preventDefault();
-                sendMessage();
-            }}
-        }});
-
-        // Join chat on Enter key in username input
-        document.getElementById('usernameInput').addEventListener('keypress', function(e) {{
-            if (e.key === 'Enter') {{
-                e.preventDefault();
-                joinChat();
-            }}
-        }});
-    </script>
+    <script>const LANCHAT = {_page_config(host=server_ip)};</script>
+    <script src="{ASSETS.url('task3.js')}"></script>
 </body>
 </html>
 """
 
+INDEX_CSS = """
+* { margin: 0; padding: 0; box-sizing: border-box; }
+body {
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    min-height: 100vh;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    color: white;
+}
+.container {
+    background: rgba(255, 255, 255, 0.1);
+    backdrop-filter: blur(10px);
+    border-radius: 20px;
+    padding: 40px;
+    max-width: 800px;
+    width: 100%;
+    box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+}
+h1 {
+    text-align: center;
+    margin-bottom: 30px;
+    font-size: 3em;
+    text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
+}
+.subtitle {
+    text-align: center;
+    margin-bottom: 40px;
+    font-size: 1.2em;
+    opacity: 0.9;
+}
+.tasks {
+    display: grid;
+    grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+    gap: 20px;
+    margin-bottom: 30px;
+}
+.task-card {
+    background: rgba(255, 255, 255, 0.1);
+    border-radius: 15px;
+    padding: 30px;
+    text-align: center;
+    transition: transform 0.3s ease;
+    cursor: pointer;
+    border: 2px solid transparent;
+}
+.task-card:hover {
+    transform: translateY(-5px);
+    border-color: rgba(255, 255, 255, 0.3);
+}
+.task-icon {
+    font-size: 3em;
+    margin-bottom: 15px;
+}
+.task-title {
+    font-size: 1.4em;
+    font-weight: bold;
+    margin-bottom: 10px;
+}
+.task-description {
+    opacity: 0.8;
+    line-height: 1.5;
+}
+.info-section {
+    background: rgba(255, 255, 255, 0.05);
+    border-radius: 10px;
+    padding: 20px;
+    margin-top: 30px;
+}
+.info-title {
+    font-weight: bold;
+    margin-bottom: 10px;
+    color: #00ff88;
+}
+.server-info {
+    font-family: monospace;
+    background: rgba(0, 0, 0, 0.3);
+    padding: 10px;
+    border-radius: 5px;
+    margin: 10px 0;
+}
+"""
+
+INDEX_JS = """
+function openTask(taskNumber) {
+    const urls = {
+        1: '/task1',
+        2: '/task2', 
+        3: '/task3'
+    };
+    
+    window.open(urls[taskNumber], '_blank');
+}
+"""
+
 def generate_index_html(server_ip):
     """Generate main index HTML"""
     return f"""
@@ -1012,89 +1348,7 @@ def generate_index_html(server_ip):
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Network Programming Web Interface</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-        }}
-        .container {{
-            background: rgba(255, 255, 255, 0.1);
-            backdrop-filter: blur(10px);
-            border-radius: 20px;
-            padding: 40px;
-            max-width: 800px;
-            width: 100%;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-        }}
-        h1 {{
-            text-align: center;
-            margin-bottom: 30px;
-            font-size: 3em;
-            text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.3);
-        }}
-        .subtitle {{
-            text-align: center;
-            margin-bottom: 40px;
-            font-size: 1.2em;
-            opacity: 0.9;
-        }}
-        .tasks {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-            margin-bottom: 30px;
-        }}
-        .task-card {{
-            background: rgba(255, 255, 255, 0.1);
-            border-radius: 15px;
-            padding: 30px;
-            text-align: center;
-            transition: transform 0.3s ease;
-            cursor: pointer;
-            border: 2px solid transparent;
-        }}
-        .task-card:hover {{
-            transform: translateY(-5px);
-            border-color: rgba(255, 255, 255, 0.3);
-        }}
-        .task-icon {{
-            font-size: 3em;
-            margin-bottom: 15px;
-        }}
-        .task-title {{
-            font-size: 1.4em;
-            font-weight: bold;
-            margin-bottom: 10px;
-        }}
-        .task-description {{
-            opacity: 0.8;
-            line-height: 1.5;
-        }}
-        .info-section {{
-            background: rgba(255, 255, 255, 0.05);
-            border-radius: 10px;
-            padding: 20px;
-            margin-top: 30px;
-        }}
-        .info-title {{
-            font-weight: bold;
-            margin-bottom: 10px;
-            color: #00ff88;
-        }}
-        .server-info {{
-            font-family: monospace;
-            background: rgba(0, 0, 0, 0.3);
-            padding: 10px;
-            border-radius: 5px;
-            margin: 10px 0;
-        }}
-    </style>
+    <link rel="stylesheet" href="{ASSETS.url('index.css')}">
 </head>
 <body>
     <div class="container">
@@ -1141,259 +1395,3566 @@ def generate_index_html(server_ip):
         </div>
     </div>
 
-    <script>
-        function openTask(taskNumber) {{
-            const urls = {{
-                1: '/task1',
-                2: '/task2', 
-                3: '/task3'
-            }};
-            
-            window.open(urls[taskNumber], '_blank');
-        }}
-    </script>
+    <script src="{ASSETS.url('index.js')}"></script>
 </body>
 </html>
 """
 
-# ==================== SIMPLE WEBSOCKET SERVER ====================
+# ==================== MESSAGE LOG ====================
 
-class SimpleWebSocketServer:
-    def __init__(self, host='localhost', port=8082):
-        self.host = host
-        self.port = port
-        self.clients = []
-        self.server_socket = None
+MESSAGE_LOG_DIR = os.path.join(os.path.expanduser('~'), '.lan-chat', 'logs')
 
-    def start(self):
-        import threading
-        thread = threading.Thread(target=self._run_server)
-        thread.daemon = True
-        thread.start()
+class MessageLog:
+    """Durable append-only message log split into rotating segment files
 
-    def _run_server(self):
-        try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            bind_host = '0.0.0.0' if self.host != 'localhost' else self.host
-            self.server_socket.bind((bind_host, self.port))
-            self.server_socket.listen(5)
-            
-            print_colored(f"🔌 WebSocket server listening on {self.host}:{self.port}", Colors.GREEN)
-            
-            while True:
-                client_socket, addr = self.server_socket.accept()
-                client_thread = threading.Thread(target=self._handle_client, args=(client_socket, addr))
-                client_thread.daemon = True
-                client_thread.start()
-        except Exception as e:
-            print_colored(f"❌ WebSocket server error: {e}", Colors.FAIL)
+    Each record is [length u32][crc32 u32][sequence u64][unix time f64]
+    followed by the payload. Sequence numbers count up from 0, one per
+    message. A segment file is named after the first sequence it holds
+    and is sealed once it grows past segment_bytes; only the newest
+    max_segments are kept on disk.
 
-    def _handle_client(self, client_socket, addr):
-        try:
-            # Simple WebSocket handshake
-            request = client_socket.recv(1024).decode()
-            if 'Upgrade: websocket' in request:
-                self._websocket_handshake(client_socket, request)
-                self.clients.append(client_socket)
-                print_colored(f"🔌 WebSocket client connected from {addr}", Colors.GREEN)
-                
-                while True:
-                    try:
-                        data = self._receive_websocket_frame(client_socket)
-                        if data:
-                            self._broadcast_message(data, client_socket)
-                        else:
-                            break
-                    except:
-                        break
-        except Exception as e:
-            print_colored(f"❌ WebSocket client error: {e}", Colors.FAIL)
-        finally:
-            if client_socket in self.clients:
-                self.clients.remove(client_socket)
-            client_socket.close()
-            print_colored(f"🔌 WebSocket client disconnected from {addr}", Colors.WARNING)
+    Appends are written immediately but fsync'd in groups: as soon as
+    fsync_messages records are pending, or about fsync_interval seconds
+    after the oldest unsynced one (a background thread covers quiet
+    periods). fsync_interval=0 syncs every append. After a crash the
+    torn tail of the newest segment is detected by its checksum and
+    truncated.
 
-    def _websocket_handshake(self, client_socket, request):
-        import hashlib
-        import base64
-        
-        key = None
-        for line in request.split('\n'):
-            if 'Sec-WebSocket-Key:' in line:
-                key = line.split(':', 1)[1].strip()
+    Every index_interval bytes a (sequence, position) pair is appended
+    to the segment's sparse .idx file. read_since() bisects that index
+    and walks the mmap'd segment from the nearest entry, so a range
+    read only unpacks the records it returns.
+
+    read_only=True opens a log that another process is writing: nothing
+    is truncated or written, and refresh() picks up new segments and
+    index entries.
+    """
+    RECORD = struct.Struct('!IIQd')
+    INDEX_ENTRY = struct.Struct('!QQ')
+
+    def __init__(self, directory, segment_bytes=16 << 20, max_segments=64,
+                 fsync_interval=0.05, fsync_messages=256, index_interval=4096, read_only=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.fsync_interval = fsync_interval
+        self.fsync_messages = fsync_messages if fsync_interval else 1
+        self.index_interval = index_interval
+        self.read_only = read_only
+        self.next_seq = 0
+        self.stats = {'appended': 0, 'fsyncs': 0, 'segments_rotated': 0, 'truncated_bytes': 0}
+        self._lock = threading.Lock()
+        self._segments = []  # base sequence of every segment on disk, oldest first
+        self._indexes = {}  # {base: ([sequences], [positions])}
+        self._maps = OrderedDict()  # {base: mmap} for recently read sealed segments
+        self._file = None
+        self._index_file = None
+        self._size = 0
+        self._last_indexed = 0
+        self._pending = 0
+        self._pending_since = None
+        self._closed = threading.Event()
+        if read_only:
+            self.refresh()
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        if self.fsync_interval:
+            syncer = threading.Thread(target=self._sync_loop)
+            syncer.daemon = True
+            syncer.start()
+
+    def _path(self, base, suffix):
+        return os.path.join(self.directory, f"{base:020d}{suffix}")
+
+    # ---------- recovery ----------
+
+    def _recover(self):
+        bases = sorted(int(name[:-4]) for name in os.listdir(self.directory)
+                       if name.endswith('.log') and name[:-4].isdigit())
+        if not bases:
+            self._open_segment(0)
+            return
+        for base in bases:
+            self._segments.append(base)
+            self._indexes[base] = self._load_index(base)
+
+        # Find the last intact record of the newest segment and cut off anything after it
+        base = bases[-1]
+        path = self._path(base, '.log')
+        size = os.path.getsize(path)
+        sequences, positions = self._indexes[base]
+        keep = max(1, bisect.bisect_right(positions, size))  # index entries may outlive unsynced data
+        del sequences[keep:], positions[keep:]
+        start = positions[-1]
+        with open(path, 'rb') as f:
+            f.seek(start)
+            tail = f.read()
+        next_seq, offset = sequences[-1], 0
+        while True:
+            record = self._parse(tail, offset)
+            if record is None:
                 break
-        
-        if key:
-            magic_string = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
-            accept = base64.b64encode(hashlib.sha1((key + magic_string).encode()).digest()).decode()
-            
-            response = (
-                "HTTP/1.1 101 Switching Protocols\r\n"
-                "Upgrade: websocket\r\n"
-                "Connection: Upgrade\r\n"
-                f"Sec-WebSocket-Accept: {accept}\r\n"
-                "\r\n"
-            )
-            client_socket.send(response.encode())
+            next_seq, offset = record[0] + 1, record[3]
+        end = start + offset
+        if end < size:
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+            self.stats['truncated_bytes'] += size - end
+        self._write_index(base)
 
-    def _receive_websocket_frame(self, client_socket):
+        self.next_seq = next_seq
+        self._file = open(path, 'ab')
+        self._index_file = open(self._path(base, '.idx'), 'ab')
+        self._size = end
+        self._last_indexed = start
+
+    def refresh(self):
+        """Read-only mode: pick up segments and index entries written since the last call"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        bases = sorted(int(name[:-4]) for name in names if name.endswith('.log') and name[:-4].isdigit())
+        with self._lock:
+            known = set(self._segments)
+            for base in self._segments:
+                if base not in bases:
+                    self._indexes.pop(base, None)
+                    self._maps.pop(base, None)
+            self._segments = bases
+            for base in bases:
+                if base not in known or base == bases[-1]:
+                    self._indexes[base] = self._load_index(base)
+
+    def _load_index(self, base):
+        sequences, positions = [], []
         try:
-            frame = client_socket.recv(2)
-            if len(frame) < 2:
+            with open(self._path(base, '.idx'), 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        for offset in range(0, len(data) - len(data) % self.INDEX_ENTRY.size, self.INDEX_ENTRY.size):
+            sequence, position = self.INDEX_ENTRY.unpack_from(data, offset)
+            if sequences and (sequence <= sequences[-1] or position <= positions[-1]):
+                break
+            sequences.append(sequence)
+            positions.append(position)
+        if not sequences:
+            sequences, positions = [base], [0]
+        return sequences, positions
+
+    def _write_index(self, base):
+        sequences, positions = self._indexes[base]
+        with open(self._path(base, '.idx'), 'wb') as f:
+            f.write(b''.join(self.INDEX_ENTRY.pack(s, p) for s, p in zip(sequences, positions)))
+
+    def _parse(self, buf, offset):
+        """(sequence, time, payload slice, next offset) of the record at offset, or None"""
+        if len(buf) - offset < self.RECORD.size:
+            return None
+        length, crc, sequence, stamp = self.RECORD.unpack_from(buf, offset)
+        start = offset + self.RECORD.size
+        end = start + length
+        if end > len(buf):
+            return None
+        payload = buf[start:end]
+        if zlib.crc32(payload) != crc:
+            return None
+        return sequence, stamp, payload, end
+
+    # ---------- writing ----------
+
+    def _open_segment(self, base):
+        self._segments.append(base)
+        self._indexes[base] = ([], [])
+        self._file = open(self._path(base, '.log'), 'ab')
+        self._index_file = open(self._path(base, '.idx'), 'ab')
+        self._size = 0
+        self._last_indexed = -self.index_interval
+
+    def append(self, payload, timestamp=None):
+        """Append one message and return its sequence number"""
+        with self._lock:
+            if self.read_only:
+                raise ValueError("message log is read-only")
+            if self._closed.is_set():
+                raise ValueError("message log is closed")
+            sequence = self.next_seq
+            if self._size >= self.segment_bytes:
+                self._rotate(sequence)
+            if self._size - self._last_indexed >= self.index_interval:
+                sequences, positions = self._indexes[self._segments[-1]]
+                sequences.append(sequence)
+                positions.append(self._size)
+                self._index_file.write(self.INDEX_ENTRY.pack(sequence, self._size))
+                self._last_indexed = self._size
+            record = self.RECORD.pack(len(payload), zlib.crc32(payload), sequence,
+                                      time.time() if timestamp is None else timestamp)
+            self._file.write(record)
+            self._file.write(payload)
+            self._size += len(record) + len(payload)
+            self.next_seq += 1
+            self.stats['appended'] += 1
+            self._pending += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if self._pending >= self.fsync_messages:
+                self._sync_locked()
+            return sequence
+
+    def _sync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._index_file.flush()
+        self._pending = 0
+        self._pending_since = None
+        self.stats['fsyncs'] += 1
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.fsync_interval / 2):
+            with self._lock:
+                if self._pending and time.monotonic() - self._pending_since >= self.fsync_interval:
+                    self._sync_locked()
+
+    def sync(self):
+        with self._lock:
+            if self._pending:
+                self._sync_locked()
+
+    def _rotate(self, base):
+        self._sync_locked()
+        self._file.close()
+        self._index_file.close()
+        self._open_segment(base)
+        self.stats['segments_rotated'] += 1
+        while len(self._segments) > self.max_segments:
+            oldest = self._segments.pop(0)
+            self._indexes.pop(oldest, None)
+            self._maps.pop(oldest, None)  # readers may still hold it; unmapped when released
+            for suffix in ('.log', '.idx'):
+                try:
+                    os.remove(self._path(oldest, suffix))
+                except OSError:
+                    pass
+
+    # ---------- reading ----------
+
+    def _map(self, base, size):
+        """mmap of a segment; sealed segments stay mapped, the active one is remapped per read"""
+        if size is None:
+            mapped = self._maps.get(base)
+            if mapped is not None:
+                self._maps.move_to_end(base)
+                return mapped
+        with open(self._path(base, '.log'), 'rb') as f:
+            length = size if size is not None else os.fstat(f.fileno()).st_size
+            if not length:
                 return None
-            
-            payload_length = frame[1] & 127
-            if payload_length == 126:
-                frame += client_socket.recv(2)
-                payload_length = int.from_bytes(frame[2:4], 'big')
-                mask_start = 4
-            elif payload_length == 127:
-                frame += client_socket.recv(8)
-                payload_length = int.from_bytes(frame[2:10], 'big')
-                mask_start = 10
+            mapped = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ)
+        if size is None:
+            self._maps[base] = mapped
+            if len(self._maps) > 8:
+                self._maps.popitem(last=False)
+        return mapped
+
+    def read_since(self, sequence, limit=None):
+        """[(sequence, time, payload)] for messages from `sequence` on, oldest first"""
+        with self._lock:
+            if self._closed.is_set() or not self._segments:
+                return []
+            if self._file is not None:
+                self._file.flush()  # make the unsynced tail visible to the mmap
+                active_size = self._size
             else:
-                mask_start = 2
-            
-            # Read mask and payload
-            mask = client_socket.recv(4)
-            masked_payload = client_socket.recv(payload_length)
-            
-            # Unmask payload
-            payload = bytearray()
-            for i in range(len(masked_payload)):
-                payload.append(masked_payload[i] ^ mask[i % 4])
-            
-            return payload.decode('utf-8')
-        except:
-            return None
+                try:
+                    active_size = os.path.getsize(self._path(self._segments[-1], '.log'))
+                except OSError:
+                    active_size = 0
+            segments = list(self._segments)
+            start = max(sequence, segments[0])
+            first = max(0, bisect.bisect_right(segments, start) - 1)
+            plan = []
+            for base in segments[first:]:
+                sequences, positions = self._indexes[base]
+                entry = bisect.bisect_right(sequences, start) - 1
+                plan.append((base, positions[entry] if entry >= 0 else 0,
+                             active_size if base == segments[-1] else None))
+
+        results = []
+        for base, position, size in plan:
+            # Map one segment at a time so a limited read stops mapping once it is full
+            with self._lock:
+                if self._closed.is_set():
+                    break
+                try:
+                    mapped = self._map(base, size)
+                except (OSError, ValueError):
+                    continue  # removed by retention in the writing process
+            if mapped is None:
+                continue
+            try:
+                while True:
+                    record = self._parse(mapped, position)
+                    if record is None:
+                        break
+                    record_seq, stamp, payload, position = record
+                    if record_seq >= start:
+                        results.append((record_seq, stamp, payload))
+                        if limit is not None and len(results) >= limit:
+                            return results
+            finally:
+                if size is not None:
+                    mapped.close()
+        return results
 
-    def _send_websocket_frame(self, client_socket, message):
+    def read_at(self, sequence):
+        """(sequence, time, payload) of one message, or None if it is no longer on disk"""
+        records = self.read_since(sequence, 1)
+        if records and records[0][0] == sequence:
+            return records[0]
+        return None
+
+    def tail(self, count):
+        return self.read_since(max(0, self.next_seq - count))
+
+    def close(self):
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._index_file.close()
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+# ==================== SEARCH INDEX ====================
+
+_TOKEN_PATTERN = re.compile(r'\w{2,}')
+
+def tokenize(text):
+    """Distinct lower-case search terms of text (single characters are skipped)"""
+    return {token[:32] for token in _TOKEN_PATTERN.findall(text.lower())}
+
+def decode_logged_message(source, payload):
+    """Fields of a message read back from the task1/task2/task3 logs"""
+    text = payload.decode('utf-8', errors='replace')
+    if source != 'task2':  # Task 2 logs the raw chat text, the others a JSON record
         try:
-            message_bytes = message.encode('utf-8')
-            frame = bytearray()
-            frame.append(0x81)  # Text frame
-            
-            if len(message_bytes) < 126:
-                frame.append(len(message_bytes))
-            elif len(message_bytes) < 65536:
-                frame.append(126)
-                frame.extend(len(message_bytes).to_bytes(2, 'big'))
-            else:
-                frame.append(127)
-                frame.extend(len(message_bytes).to_bytes(8, 'big'))
-            
-            frame.extend(message_bytes)
-            client_socket.send(frame)
-        except:
+            record = json.loads(text)
+            if isinstance(record, dict):
+                return record
+        except ValueError:
             pass
+    return {'message': text}
 
-    def _broadcast_message(self, message, sender_socket):
-        for client in self.clients[:]:
-            if client != sender_socket:
-                try:
-                    self._send_websocket_frame(client, message)
-                except:
-                    self.clients.remove(client)
+class SearchIndex:
+    """Incremental inverted index over the on-disk message logs
 
-# ==================== WEB SERVERS ====================
+    Tails one read-only MessageLog per source. Each message gets the
+    next document id; its (source, log sequence) pair lives in two
+    compact arrays and every token maps to an array('I') of document
+    ids. Ids only grow, so posting lists stay sorted with plain appends,
+    and a query walks its shortest list newest-first, probing the
+    others with bisect, until one page is full. Message text stays in
+    the logs and is read back through mmap only for the hits returned.
+    """
+    def __init__(self, sources):
+        self.sources = list(sources.items())  # [(name, MessageLog)]
+        self._positions = [0] * len(self.sources)  # next log sequence to index, per source
+        self._doc_source = array('B')
+        self._doc_seq = array('Q')
+        self._postings = {}  # {token: array('I') of document ids}
+        self._lock = threading.Lock()
+        self.stats = {'documents': 0, 'postings': 0, 'refresh_ms': 0.0}
 
-class Task1Server:
-    """HTTP server for Task 1: UDP Messaging"""
-    def __init__(self, host='localhost', port=8001):
-        self.host = host
-        self.port = port
-        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    @classmethod
+    def for_message_logs(cls, directory=None, names=('task1', 'task2', 'task3')):
+        directory = directory or MESSAGE_LOG_DIR
+        return cls({name: MessageLog(os.path.join(directory, name), read_only=True) for name in names})
 
-    def start(self):
-        import http.server
-        import socketserver
-        from urllib.parse import urlparse, parse_qs
-        import json
-        
-        server_host = self.host  # Store host for use in handler
-        server_port = self.port  # Store port for use in handler
-        
-        class TaskHandler(http.server.BaseHTTPRequestHandler):
-            def do_GET(self):
-                if self.path == '/':
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    self.wfile.write(generate_task1_html(server_host, server_port).encode())
+    def add(self, source_number, sequence, text):
+        document = len(self._doc_seq)
+        self._doc_source.append(source_number)
+        self._doc_seq.append(sequence)
+        tokens = tokenize(text)
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = array('I')
+            posting.append(document)
+        self.stats['documents'] += 1
+        self.stats['postings'] += len(tokens)
+
+    def refresh(self, batch=5000):
+        """Index whatever the logs gained since the last call; returns the number of new messages"""
+        with self._lock:
+            started = time.perf_counter()
+            added = 0
+            for number, (name, log) in enumerate(self.sources):
+                if log.read_only:
+                    log.refresh()
+                while True:
+                    records = log.read_since(self._positions[number], batch)
+                    for sequence, _, payload in records:
+                        record = decode_logged_message(name, payload)
+                        self.add(number, sequence, f"{record.get('message', '')} {record.get('sender', '')}")
+                    if records:
+                        self._positions[number] = records[-1][0] + 1
+                    added += len(records)
+                    if len(records) < batch:
+                        break
+            self.stats['refresh_ms'] = (time.perf_counter() - started) * 1000
+            return added
+
+    def search(self, query, limit=20, before=None):
+        """One page of matches for every term in query, newest first: (results, next cursor)"""
+        with self._lock:
+            postings = [self._postings.get(term) for term in tokenize(query)]
+            if not postings or None in postings:
+                return [], None
+            postings.sort(key=len)
+            lead, others = postings[0], postings[1:]
+            end = len(lead) if before is None else bisect.bisect_left(lead, before)
+            hits = []
+            for i in range(end - 1, -1, -1):
+                document = lead[i]
+                for posting in others:
+                    j = bisect.bisect_left(posting, document)
+                    if j == len(posting) or posting[j] != document:
+                        break
                 else:
-                    self.send_response(404)
-                    self.end_headers()
+                    hits.append(document)
+                    if len(hits) > limit:
+                        break
+            located = [(document, self.sources[self._doc_source[document]], self._doc_seq[document])
+                       for document in hits[:limit]]
+        results = []
+        for document, (name, log), sequence in located:
+            record = log.read_at(sequence)
+            if record is not None:
+                result = decode_logged_message(name, record[2])
+                result.update({'id': document, 'source': name, 'seq': sequence, 'time': record[1]})
+                results.append(result)
+        return results, (hits[limit - 1] if len(hits) > limit else None)
 
-            def do_POST(self):
-                if self.path == '/send_udp':
-                    try:
-                        content_length = int(self.headers.get('Content-Length', 0))
-                        post_data = self.rfile.read(content_length)
-                        
-                        data = json.loads(post_data.decode())
+    def memory_usage(self):
+        with self._lock:
+            posting_bytes = sum(len(posting) * posting.itemsize for posting in self._postings.values())
+            return {
+                'documents': len(self._doc_seq),
+                'terms': len(self._postings),
+                'postings': self.stats['postings'],
+                'posting_bytes': posting_bytes,
+                'document_bytes': len(self._doc_seq) * (self._doc_seq.itemsize + self._doc_source.itemsize),
+            }
+
+# ==================== SIMPLE WEBSOCKET SERVER ====================
+
+class WebSocketProtocolError(Exception):
+    """Raised when a peer breaks RFC 6455 framing rules"""
+    def __init__(self, message, close_code=1002):
+        super().__init__(message)
+        self.close_code = close_code
+
+def _unmask(payload, mask):
+    """XOR a payload with its 4-byte mask as one big integer instead of byte by byte"""
+    length = len(payload)
+    if not length:
+        return b''
+    key = (bytes(mask) * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'little') ^ int.from_bytes(key, 'little')).to_bytes(length, 'little')
+
+def encode_websocket_frame(payload, opcode=0x1, rsv1=False):
+    """Build one unmasked server frame; the result is immutable and safe to share"""
+    length = len(payload)
+    first = 0x80 | opcode | (0x40 if rsv1 else 0)
+    if length < 126:
+        header = struct.pack('!BB', first, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', first, 126, length)
+    else:
+        header = struct.pack('!BBQ', first, 127, length)
+    return header + payload
+
+def _parse_headers(request):
+    """Lower-cased {name: value} for an HTTP request head; repeated headers are comma-joined"""
+    headers = {}
+    for line in request.split('\r\n')[1:]:
+        name, sep, value = line.partition(':')
+        if not sep:
+            continue
+        name = name.strip().lower()
+        value = value.strip()
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return headers
+
+class DeflateOptions:
+    """Server-side permessage-deflate (RFC 7692) settings
+
+    Messages shorter than threshold bytes are always sent uncompressed.
+    With server_no_context_takeover (the default) every outgoing message
+    is compressed independently, so one compressed broadcast frame can
+    be shared by all recipients; turning it off trades that for better
+    ratios on repetitive traffic at one compressor per connection.
+    """
+    def __init__(self, threshold=256, level=6, server_no_context_takeover=True,
+                 server_max_window_bits=15, client_max_window_bits=None):
+        if not 9 <= server_max_window_bits <= 15:
+            raise ValueError("server_max_window_bits must be between 9 and 15")
+        if client_max_window_bits is not None and not 8 <= client_max_window_bits <= 15:
+            raise ValueError("client_max_window_bits must be between 8 and 15")
+        self.threshold = threshold
+        self.level = level
+        self.server_no_context_takeover = server_no_context_takeover
+        self.server_max_window_bits = server_max_window_bits
+        self.client_max_window_bits = client_max_window_bits
+
+def deflate_message(payload, level=6, window_bits=15, compressor=None):
+    """Compress one message body as permessage-deflate (trailing 00 00 ff ff removed)"""
+    if compressor is None:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -window_bits)
+    return (compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+
+class PerMessageDeflate:
+    """permessage-deflate parameters and zlib state negotiated for one connection"""
+    PARAMETERS = ('server_no_context_takeover', 'client_no_context_takeover',
+                  'server_max_window_bits', 'client_max_window_bits')
+
+    def __init__(self, options, stats, server_no_context_takeover, client_no_context_takeover,
+                 server_max_window_bits, client_max_window_bits, response):
+        self.options = options
+        self.stats = stats
+        self.server_no_context_takeover = server_no_context_takeover
+        self.client_no_context_takeover = client_no_context_takeover
+        self.server_max_window_bits = server_max_window_bits
+        self.client_max_window_bits = client_max_window_bits
+        self.response = response
+        self._compressor = None
+        self._decompressor = None
+
+    @classmethod
+    def negotiate(cls, offers, options, stats):
+        """Accept the first acceptable permessage-deflate offer, or return None"""
+        for offer in offers.split(','):
+            parts = [part.strip() for part in offer.split(';')]
+            if parts[0].lower() != 'permessage-deflate':
+                continue
+            params = {}
+            for part in parts[1:]:
+                name, _, value = part.partition('=')
+                name = name.strip().lower()
+                if name in params or name not in cls.PARAMETERS:
+                    params = None
+                    break
+                params[name] = value.strip().strip('"')
+            if params is None:
+                continue
+
+            response = ['permessage-deflate']
+            server_bits = options.server_max_window_bits
+            if 'server_max_window_bits' in params:
+                try:
+                    requested = int(params['server_max_window_bits'])
+                except ValueError:
+                    continue
+                # zlib cannot compress with a 256-byte window, so 8 is declined
+                if not 9 <= requested <= 15:
+                    continue
+                server_bits = min(server_bits, requested)
+                response.append(f"server_max_window_bits={server_bits}")
+            client_bits = 15
+            if 'client_max_window_bits' in params:
+                if params['client_max_window_bits']:
+                    try:
+                        client_bits = int(params['client_max_window_bits'])
+                    except ValueError:
+                        continue
+                    if not 8 <= client_bits <= 15:
+                        continue
+                if options.client_max_window_bits:
+                    client_bits = min(client_bits, options.client_max_window_bits)
+                    response.append(f"client_max_window_bits={client_bits}")
+
+            server_no_takeover = options.server_no_context_takeover or 'server_no_context_takeover' in params
+            client_no_takeover = 'client_no_context_takeover' in params
+            if server_no_takeover:
+                response.append('server_no_context_takeover')
+            if client_no_takeover:
+                response.append('client_no_context_takeover')
+            return cls(options, stats, server_no_takeover, client_no_takeover,
+                       server_bits, client_bits, '; '.join(response))
+        return None
+
+    def compress(self, payload):
+        """Compress with this connection's own context (context takeover)"""
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(self.options.level, zlib.DEFLATED, -self.server_max_window_bits)
+        return deflate_message(payload, compressor=self._compressor)
+
+    def decompress(self, payload, max_length):
+        started = time.perf_counter()
+        if self._decompressor is None or self.client_no_context_takeover:
+            self._decompressor = zlib.decompressobj(-15)
+        data = self._decompressor.decompress(payload + b'\x00\x00\xff\xff', max_length + 1)
+        if len(data) > max_length:
+            raise WebSocketProtocolError(f"message exceeds {max_length} bytes", close_code=1009)
+        self.stats['inflated_messages'] += 1
+        self.stats['inflate_seconds'] += time.perf_counter() - started
+        return data
+
+PING_FRAME = encode_websocket_frame(b'', opcode=0x9)
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 64
+HAVE_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+class WebSocketFrameParser:
+    """Incremental, short-read-safe parser for client WebSocket frames
+
+    Bytes are read straight into one reusable bytearray through a
+    memoryview, so a frame split across any number of recv() calls is
+    reassembled without intermediate copies. Fragmented messages are
+    joined, control frames are returned as soon as they arrive, and
+    any message larger than max_payload is rejected from its header.
+    The buffer only grows for large frames and shrinks back once they
+    are consumed, so idle connections stay small.
+    """
+    def __init__(self, max_payload=1 << 20, buffer_size=4096):
+        self.max_payload = max_payload
+        self._buffer_size = buffer_size
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+        self._fragments = []
+        self._fragment_opcode = None
+        self._fragment_size = 0
+        self._fragment_compressed = False
+        self.deflate = None  # PerMessageDeflate once negotiated
+
+    def buffered(self):
+        return self._end - self._start
+
+    def _reserve(self, needed):
+        """Make room for at least `needed` bytes after the buffered data"""
+        if len(self._buf) - self._end >= needed:
+            return
+        pending = self._end - self._start
+        if self._start:
+            leftover = bytes(self._view[self._start:self._end])
+            self._buf[:pending] = leftover
+            self._start, self._end = 0, pending
+        if len(self._buf) - self._end < needed:
+            self._view.release()
+            self._buf.extend(bytes(pending + needed - len(self._buf)))
+            self._view = memoryview(self._buf)
+
+    def feed(self, data):
+        self._reserve(len(data))
+        self._view[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def recv_into(self, sock, min_free=1024):
+        """Read from sock directly into the free tail of the buffer; returns 0 on EOF"""
+        self._reserve(min_free)
+        count = sock.recv_into(self._view[self._end:])
+        self._end += count
+        return count
+
+    def next_frame(self):
+        """Return the next complete (opcode, payload) or None if more bytes are needed"""
+        while True:
+            available = self._end - self._start
+            if available < 2:
+                return None
+            view, start = self._view, self._start
+            first, second = view[start], view[start + 1]
+            fin = first & 0x80
+            rsv = first & 0x70
+            opcode = first & 0x0F
+            if not second & 0x80:
+                raise WebSocketProtocolError("client frame is not masked")
+            if opcode not in (0x0, 0x1, 0x2, 0x8, 0x9, 0xA):
+                raise WebSocketProtocolError(f"unknown opcode {opcode:#x}")
+            # RSV1 marks a compressed message and is only legal on its first frame
+            if rsv and (rsv != 0x40 or self.deflate is None or opcode in (0x0, 0x8, 0x9, 0xA)):
+                raise WebSocketProtocolError("unexpected RSV bits")
+
+            length = second & 127
+            header_length = 2
+            if length == 126:
+                header_length = 4
+            elif length == 127:
+                header_length = 10
+            if available < header_length:
+                return None
+            if length == 126:
+                length = int.from_bytes(view[start + 2:start + 4], 'big')
+            elif length == 127:
+                length = int.from_bytes(view[start + 2:start + 10], 'big')
+
+            if opcode >= 0x8:
+                if not fin or length > 125:
+                    raise WebSocketProtocolError("invalid control frame")
+            elif length + self._fragment_size > self.max_payload:
+                raise WebSocketProtocolError(
+                    f"message exceeds {self.max_payload} bytes", close_code=1009)
+
+            frame_length = header_length + 4 + length
+            if available < frame_length:
+                # Grow once for the whole frame rather than on every short read
+                self._reserve(frame_length - available)
+                return None
+
+            mask_start = start + header_length
+            payload = _unmask(view[mask_start + 4:mask_start + 4 + length], view[mask_start:mask_start + 4])
+            self._start += frame_length
+            if self._start == self._end:
+                self._start = self._end = 0
+                if len(self._buf) > self._buffer_size:
+                    self._view.release()
+                    self._buf = bytearray(self._buffer_size)
+                    self._view = memoryview(self._buf)
+
+            if opcode >= 0x8:
+                return opcode, payload
+            if opcode == 0x0:
+                if self._fragment_opcode is None:
+                    raise WebSocketProtocolError("unexpected continuation frame")
+                self._fragments.append(payload)
+                self._fragment_size += length
+                if not fin:
+                    continue
+                opcode, payload = self._fragment_opcode, b''.join(self._fragments)
+                compressed = self._fragment_compressed
+                self._fragments, self._fragment_opcode, self._fragment_size = [], None, 0
+                if compressed:
+                    payload = self.deflate.decompress(payload, self.max_payload)
+                return opcode, payload
+            if self._fragment_opcode is not None:
+                raise WebSocketProtocolError("new message before previous one finished")
+            if fin:
+                if rsv:
+                    payload = self.deflate.decompress(payload, self.max_payload)
+                return opcode, payload
+            self._fragments = [payload]
+            self._fragment_opcode = opcode
+            self._fragment_size = length
+            self._fragment_compressed = bool(rsv)
+
+class TimerWheel:
+    """Hashed timing wheel for connection deadlines
+
+    Scheduling is O(1) and each tick only looks at the timers that hash
+    into that tick's slot, so the cost of expiring deadlines does not
+    grow with the number of idle connections. Cancelled timers are not
+    removed; callers ignore items that are no longer live when they fire.
+    """
+    def __init__(self, tick=1.0, slots=128):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._current = int(time.monotonic() / tick)
+
+    def schedule(self, deadline, item):
+        tick_number = max(-int(-deadline // self.tick), self._current + 1)
+        self._slots[tick_number % len(self._slots)].append((tick_number, item))
+
+    def next_timeout(self, now):
+        return max(0.0, (self._current + 1) * self.tick - now)
+
+    def expire(self, now):
+        """Return every item whose deadline has passed"""
+        target = int(now / self.tick)
+        due = []
+        for step in range(1, min(target - self._current, len(self._slots)) + 1):
+            slot = self._slots[(self._current + step) % len(self._slots)]
+            if not slot:
+                continue
+            due.extend(item for tick_number, item in slot if tick_number <= target)
+            slot[:] = [entry for entry in slot if entry[0] > target]
+        self._current = max(self._current, target)
+        return due
+
+class WebSocketConnection:
+    """Compact per-connection record used by both engines"""
+    __slots__ = ('id', 'sock', 'addr', 'username', 'joined_at',
+                 'bytes_in', 'bytes_out', 'messages_in', 'messages_out',
+                 'closed', 'closing', 'handshake_done', 'inbuf', 'parser', 'deflate', 'send_lock',
+                 'outbuf', 'queued_bytes', 'dropping', 'dropped_frames', 'events',
+                 'last_seen', 'ping_sent_at', 'next_check', 'subprotocol', 'retry_after', 'admitted',
+                 'limiter', 'throttled_messages')
+    _ids = itertools.count(1)
+
+    def __init__(self, sock, addr, max_payload):
+        self.id = next(WebSocketConnection._ids)
+        self.sock = sock
+        self.addr = addr
+        self.username = None
+        self.joined_at = None  # wall-clock time the handshake completed
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.closed = False
+        self.closing = False  # eventloop: close frame queued, hang up once outbuf drains
+        self.handshake_done = False
+        self.inbuf = bytearray()  # handshake bytes only
+        self.parser = WebSocketFrameParser(max_payload)
+        self.deflate = None  # PerMessageDeflate when the client negotiated compression
+        self.send_lock = None  # threaded engine: one writer at a time
+        self.outbuf = deque()  # shared frame buffers still waiting for the socket
+        self.queued_bytes = 0
+        self.dropping = False  # over the high watermark, shedding frames until below low
+        self.dropped_frames = 0
+        self.events = selectors.EVENT_READ
+        self.last_seen = time.monotonic()
+        self.ping_sent_at = None  # monotonic time of the unanswered ping, if any
+        self.next_check = None  # deadline of the live timer; earlier wheel entries are stale
+        self.subprotocol = None  # Sec-WebSocket-Protocol agreed in the handshake
+        self.retry_after = None  # seconds to tell a client turned away by admission control
+        self.admitted = False  # holds one of its IP's slots in the AdmissionController
+        self.limiter = None  # ClientRateLimiter when the server limits incoming messages
+        self.throttled_messages = 0
+
+    def queue_depth(self):
+        return len(self.outbuf), self.queued_bytes
+
+class ConnectionRegistry:
+    """Thread-safe {connection id: WebSocketConnection} registry
+
+    add, remove and get are O(1). snapshot() hands out an immutable
+    tuple that is only rebuilt after membership changes, so iterating
+    for a broadcast never races with joins and leaves on other threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._snapshot = ()
+        self._stale = False
+
+    def add(self, conn):
+        with self._lock:
+            self._by_id[conn.id] = conn
+            self._stale = True
+
+    def remove(self, conn):
+        """Remove conn; returns False if it was not registered"""
+        with self._lock:
+            if self._by_id.pop(conn.id, None) is None:
+                return False
+            self._stale = True
+            return True
+
+    def get(self, conn_id):
+        return self._by_id.get(conn_id)
+
+    def snapshot(self):
+        with self._lock:
+            if self._stale:
+                self._snapshot = tuple(self._by_id.values())
+                self._stale = False
+            return self._snapshot
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, conn):
+        return self._by_id.get(conn.id) is conn
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now=None):
+        """Add the tokens earned since the last call; returns the current balance"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def consume(self, amount=1, now=None):
+        """Take amount tokens if they are available; returns False otherwise"""
+        if self.refill(now) < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def wait_time(self, amount=1):
+        """Seconds until amount tokens will be available, as of the last refill"""
+        return max(0.0, (amount - self.tokens) / self.rate) if self.rate else float('inf')
+
+class AdmissionController:
+    """Decides which new connections a server takes on right now
+
+    New connections spend a token from an accept-rate bucket (accept_rate
+    per second, accept_burst at once), and no IP may hold more than
+    max_per_ip connections. A refused connection gets a retry hint
+    instead: the time the bucket needs to admit everyone refused in the
+    last second, clamped to [min_retry, max_retry]. A reconnect storm is
+    therefore told to spread itself over as long as it will take to
+    serve, rather than all coming back at the same instant.
+    max_per_ip=0 disables the per-IP cap.
+    """
+    def __init__(self, accept_rate=100.0, accept_burst=200, max_per_ip=32,
+                 min_retry=1.0, max_retry=30.0, ip_retry=10.0):
+        self.bucket = TokenBucket(accept_rate, accept_burst)
+        self.max_per_ip = max_per_ip
+        self.min_retry = min_retry
+        self.max_retry = max_retry
+        self.ip_retry = ip_retry
+        self._per_ip = {}  # {ip: admitted connections still open}
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_rejected = 0
+        self.stats = {'admitted': 0, 'rejected_rate': 0, 'rejected_ip': 0}
+
+    def admit(self, ip, now=None):
+        """None if the connection may proceed, else the seconds it should wait"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.max_per_ip and self._per_ip.get(ip, 0) >= self.max_per_ip:
+                self.stats['rejected_ip'] += 1
+                return self.ip_retry
+            if not self.bucket.consume(1, now):
+                self.stats['rejected_rate'] += 1
+                if now - self._window_start >= 1.0:
+                    self._window_start, self._window_rejected = now, 0
+                self._window_rejected += 1
+                backlog = self.bucket.wait_time() + self._window_rejected / max(self.bucket.rate, 1e-9)
+                return min(self.max_retry, max(self.min_retry, backlog))
+            self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+            self.stats['admitted'] += 1
+            return None
+
+    def release(self, ip):
+        """An admitted connection from ip has closed"""
+        with self._lock:
+            count = self._per_ip.get(ip, 0) - 1
+            if count > 0:
+                self._per_ip[ip] = count
+            else:
+                self._per_ip.pop(ip, None)
+
+    def connections_from(self, ip):
+        return self._per_ip.get(ip, 0)
+
+class RateLimitOptions:
+    """Per-connection limits on incoming messages
+
+    Each client may send messages_per_second messages (message_burst at
+    once) and bytes_per_second payload bytes (byte_burst at once). A
+    message over either limit is handled according to action: 'drop'
+    discards it, 'queue' holds up to max_queued messages and delivers
+    them in order as the budget refills (dropping beyond that), and
+    'disconnect' closes the connection with code 1008.
+    """
+    ACTIONS = ('drop', 'queue', 'disconnect')
+
+    def __init__(self, messages_per_second=10.0, message_burst=20, bytes_per_second=32 << 10,
+                 byte_burst=128 << 10, action='drop', max_queued=50):
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown rate limit action: {action}")
+        self.messages_per_second = messages_per_second
+        self.message_burst = message_burst
+        self.bytes_per_second = bytes_per_second
+        self.byte_burst = byte_burst
+        self.action = action
+        self.max_queued = max_queued
+
+class ClientRateLimiter:
+    """Message and byte token buckets for one connection, checked together in O(1)"""
+    __slots__ = ('messages', 'bytes', 'queue')
+
+    def __init__(self, options):
+        self.messages = TokenBucket(options.messages_per_second, options.message_burst)
+        self.bytes = TokenBucket(options.bytes_per_second, options.byte_burst)
+        self.queue = deque()  # (message, size) held back by action='queue'
+
+    def allow(self, size, now=None):
+        """Charge one message of size bytes if both budgets cover it"""
+        now = time.monotonic() if now is None else now
+        size = min(size, self.bytes.burst)  # a message bigger than the burst still gets through eventually
+        messages, data = self.messages, self.bytes
+        if messages.refill(now) < 1 or data.refill(now) < size:
+            return False
+        messages.tokens -= 1
+        data.tokens -= size
+        return True
+
+    def wait_time(self, size):
+        """Seconds until a message of size bytes would be allowed"""
+        return max(self.messages.wait_time(1), self.bytes.wait_time(min(size, self.bytes.burst)))
+
+class MessageHistory:
+    """Recent messages per room, capped by message count and total bytes
+
+    Every room keeps a deque of (item, size) pairs. An append that goes
+    past either cap evicts the oldest entries, and at most max_rooms
+    rooms are kept (the least recently written one goes first), so
+    memory stays bounded however long traffic keeps flowing. Each
+    append bumps the room's version so callers can cache encoded
+    replays until something new arrives.
+    """
+    def __init__(self, max_messages=100, max_bytes=256 << 10, max_rooms=256):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_rooms = max_rooms
+        self.evicted = 0
+        self._rooms = OrderedDict()  # {room: [deque of (item, size), total size, version]}
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def append(self, room, item, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._rooms.get(room)
+            if entry is None:
+                entry = self._rooms[room] = [deque(), 0, 0]
+                if len(self._rooms) > self.max_rooms:
+                    _, dropped = self._rooms.popitem(last=False)
+                    self.evicted += len(dropped[0])
+            else:
+                self._rooms.move_to_end(room)
+            items = entry[0]
+            items.append((item, size))
+            entry[1] += size
+            while len(items) > self.max_messages or entry[1] > self.max_bytes:
+                entry[1] -= items.popleft()[1]
+                self.evicted += 1
+            self._version += 1
+            entry[2] = self._version
+
+    def replay(self, room, limit=None):
+        """Return (version, items) for the newest `limit` messages of room, oldest first"""
+        with self._lock:
+            entry = self._rooms.get(room)
+            if entry is None:
+                return 0, []
+            items = [item for item, _ in entry[0]]
+            version = entry[2]
+        if limit is not None:
+            items = items[-limit:] if limit else []
+        return version, items
+
+    def memory_usage(self):
+        """Message count, tracked payload bytes and container overhead across all rooms"""
+        with self._lock:
+            rooms = list(self._rooms.values())
+            overhead = sys.getsizeof(self._rooms)
+            for items, _, _ in rooms:
+                overhead += sys.getsizeof(items) + sum(sys.getsizeof(pair) for pair in items)
+            return {
+                'rooms': len(rooms),
+                'messages': sum(len(items) for items, _, _ in rooms),
+                'payload_bytes': sum(size for _, size, _ in rooms),
+                'overhead_bytes': overhead,
+                'evicted': self.evicted,
+            }
+
+class BroadcastBus:
+    """Relays broadcasts between sharded worker processes
+
+    Each worker binds a Unix datagram socket in a shared directory.
+    Broadcasts published during one event-loop pass are packed into as
+    few length-prefixed datagrams as possible and sent to every peer by
+    flush(). When a peer's queue is full the datagrams wait in a bounded
+    per-peer backlog and are retried on the next pass; only overflow of
+    that backlog loses messages (counted in stats['dropped']). A message
+    longer than max_message is never sent (stats['oversize']).
+    """
+    def __init__(self, directory, worker_id, worker_count, buffer_size=4 << 20,
+                 max_datagram=64 << 10, max_backlog=4096, max_message=1 << 20):
+        self.directory = directory
+        self.worker_id = worker_id
+        self.max_datagram = max_datagram
+        self.max_backlog = max_backlog
+        self.max_message = max_message
+        # One receive buffer for the largest datagram flush() can build: a
+        # message too big to share a datagram travels alone
+        self._recv_buf = bytearray(max(max_datagram, 4 + max_message))
+        self._recv_view = memoryview(self._recv_buf)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+            self.sock.setsockopt(socket.SOL_SOCKET, option, buffer_size)
+        self.sock.bind(self._path(worker_id))
+        self.sock.setblocking(False)
+        self.peers = [self._path(peer) for peer in range(worker_count) if peer != worker_id]
+        self._pending = []
+        self._backlog = {peer: deque() for peer in self.peers}
+        self.stats = {'published': 0, 'received': 0, 'datagrams_sent': 0, 'dropped': 0, 'oversize': 0}
+
+    def _path(self, worker_id):
+        return os.path.join(self.directory, f"worker-{worker_id}.sock")
+
+    def publish(self, payload):
+        if len(payload) > self.max_message:
+            self.stats['oversize'] += 1
+            return
+        self._pending.append(payload)
+        self.stats['published'] += 1
+
+    def backlogged(self):
+        return any(self._backlog.values())
+
+    def flush(self):
+        """Pack pending broadcasts into datagrams and send what the peers will take"""
+        if self._pending:
+            datagrams, current = [], bytearray()
+            for payload in self._pending:
+                record = struct.pack('!I', len(payload)) + payload
+                if current and len(current) + len(record) > self.max_datagram:
+                    datagrams.append(bytes(current))
+                    current = bytearray()
+                current += record
+            datagrams.append(bytes(current))
+            self._pending = []
+            for backlog in self._backlog.values():
+                backlog.extend(datagrams)
+                while len(backlog) > self.max_backlog:
+                    dropped = backlog.popleft()
+                    self.stats['dropped'] += self._record_count(dropped)
+
+        for peer, backlog in self._backlog.items():
+            while backlog:
+                try:
+                    self.sock.sendto(backlog[0], peer)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    # Peer not bound yet or gone; retry on the next pass
+                    break
+                backlog.popleft()
+                self.stats['datagrams_sent'] += 1
+
+    @staticmethod
+    def _record_count(datagram):
+        count = offset = 0
+        while offset < len(datagram):
+            offset += 4 + struct.unpack_from('!I', datagram, offset)[0]
+            count += 1
+        return count
+
+    def receive(self):
+        """Drain every relayed broadcast waiting on the socket"""
+        messages = []
+        buf, view = self._recv_buf, self._recv_view
+        while True:
+            try:
+                # MSG_TRUNC makes recv_into report the datagram's real length
+                size = self.sock.recv_into(buf, len(buf), socket.MSG_TRUNC)
+            except (BlockingIOError, InterruptedError):
+                break
+            if size > len(buf):
+                self.stats['oversize'] += 1
+                continue
+            offset = 0
+            while offset + 4 <= size:
+                (length,) = struct.unpack_from('!I', buf, offset)
+                end = offset + 4 + length
+                if end > size:
+                    break
+                messages.append(bytes(view[offset + 4:end]))
+                offset = end
+        self.stats['received'] += len(messages)
+        return messages
+
+    def close(self):
+        self.sock.close()
+
+class BinaryChatCodec:
+    """Binary encoding of the Task 3 chat events (subprotocol lanchat.bin.v1)
+
+    Every event is one binary frame: an 8-byte header (event type,
+    reserved flags, user id, unix timestamp) followed by a type-specific
+    body. Usernames are interned to 16-bit ids; a user's name and OS are
+    only sent in joined/user_joined/users events, so chat messages carry
+    just the id and the text. join/joined also carry the room name.
+    Presence events (user_joined, user_updated, user_left, users) start
+    their body with the room's 32-bit presence version, and a
+    list_users request may carry the version the client already has.
+    A message whose sender has no id (or any message when encoding with
+    inline_names=True, as history replays do) sets FLAG_INLINE_SENDER
+    and carries the sender's name ahead of the text instead. Ids are server-wide, which keeps every
+    encoded frame identical for all recipients.
+
+    encode() and decode() use the same dicts as the JSON protocol, so
+    handlers never need to know which wire format a client picked.
+    Only the server's encode() assigns ids; a client's decode() learns
+    them from joined/user_joined/users frames. The server decodes client
+    frames with learn=False, which ignores their header id and leaves the
+    id table alone.
+    """
+    SUBPROTOCOL = 'lanchat.bin.v1'
+    HEADER = struct.Struct('!BBHI')
+    FLAG_INLINE_SENDER = 0x01
+    TYPES = ('join', 'joined', 'user_joined', 'user_left', 'message', 'list_users', 'users', 'error',
+             'user_updated')
+    _CODES = {name: code for code, name in enumerate(TYPES, 1)}
+    _COUNT = struct.Struct('!H')
+    _VERSION = struct.Struct('!I')
+
+    def __init__(self):
+        self._ids = {}  # {username: id}
+        self._users = {}  # {id: (username, os)}
+        self._free = []
+        self._next_id = 1
+
+    def intern(self, username, os_name=''):
+        """Return the id for username, allocating one on first use"""
+        user_id = self._ids.get(username)
+        if user_id is None:
+            if self._free:
+                user_id = self._free.pop()
+            elif self._next_id <= 0xFFFF:
+                user_id = self._next_id
+                self._next_id += 1
+            else:
+                raise ValueError("no free chat user ids")
+            self._ids[username] = user_id
+        self._users[user_id] = (username, os_name or self._users.get(user_id, ('', ''))[1])
+        return user_id
+
+    def release(self, username):
+        """Forget username so its id can be reused by a later join"""
+        user_id = self._ids.pop(username, None)
+        if user_id is not None:
+            self._users.pop(user_id, None)
+            self._free.append(user_id)
+
+    def _user_name(self, user_id):
+        return self._users.get(user_id, (f"user{user_id}", ''))[0]
+
+    @staticmethod
+    def _short(text):
+        data = text.encode('utf-8')[:255]
+        return bytes([len(data)]) + data
+
+    def _definition(self, user_id):
+        username, os_name = self._users[user_id]
+        return self._short(os_name) + username.encode('utf-8')
+
+    def encode(self, event, inline_names=False):
+        kind = event['type']
+        user_id = flags = 0
+        body = b''
+        if kind in ('join', 'joined'):
+            if kind == 'joined':
+                user_id = self.intern(event['username'], event.get('os', ''))
+            body = (self._short(event.get('os', '')) + self._short(event.get('room', ''))
+                    + event['username'].encode('utf-8'))
+        elif kind in ('user_joined', 'user_updated'):
+            user_id = self.intern(event['username'], event.get('os', ''))
+            body = self._VERSION.pack(event.get('version', 0)) + self._definition(user_id)
+        elif kind == 'user_left':
+            user_id = self._ids.get(event['username'], 0)
+            body = self._VERSION.pack(event.get('version', 0))
+        elif kind == 'message':
+            sender = event.get('sender')
+            if sender:
+                user_id = 0 if inline_names else self._ids.get(sender, 0)
+                if not user_id:
+                    flags = self.FLAG_INLINE_SENDER
+                    body = self._short(sender)
+            body += event['message'].encode('utf-8')
+        elif kind == 'users':
+            parts = [self._VERSION.pack(event.get('version', 0)), self._COUNT.pack(len(event['users']))]
+            for user in event['users']:
+                member_id = self.intern(user['username'], user.get('os', ''))
+                parts.append(self._COUNT.pack(member_id))
+                parts.append(self._short(user.get('os', '')))
+                parts.append(self._short(user['username']))
+            body = b''.join(parts)
+        elif kind == 'error':
+            body = event['message'].encode('utf-8')
+        elif kind == 'list_users':
+            if event.get('version') is not None:
+                body = self._VERSION.pack(int(event['version']) & 0xFFFFFFFF)
+        else:
+            raise ValueError(f"Unknown chat event type: {kind}")
+        timestamp = int(event.get('time') or time.time())
+        return self.HEADER.pack(self._CODES[kind], flags, user_id, timestamp & 0xFFFFFFFF) + body
+
+    def decode(self, payload, learn=True):
+        if len(payload) < self.HEADER.size:
+            raise ValueError("chat frame shorter than its header")
+        code, flags, user_id, timestamp = self.HEADER.unpack_from(payload)
+        if not learn:
+            user_id = 0
+        if not 1 <= code <= len(self.TYPES):
+            raise ValueError(f"Unknown chat event code: {code}")
+        kind = self.TYPES[code - 1]
+        body = bytes(payload[self.HEADER.size:])
+        event = {'type': kind, 'time': timestamp}
+        if kind in ('user_joined', 'user_updated', 'user_left', 'users') or (kind == 'list_users' and body):
+            if len(body) < self._VERSION.size:
+                raise ValueError(f"{kind} event without a presence version")
+            event['version'] = self._VERSION.unpack_from(body)[0]
+            body = body[self._VERSION.size:]
+        if kind in ('join', 'joined', 'user_joined', 'user_updated'):
+            offset = 1 + (body[0] if body else 0)
+            event['os'] = body[1:offset].decode('utf-8', errors='ignore')
+            if kind in ('join', 'joined'):
+                room_length = body[offset] if len(body) > offset else 0
+                event['room'] = body[offset + 1:offset + 1 + room_length].decode('utf-8', errors='ignore')
+                offset += 1 + room_length
+            event['username'] = body[offset:].decode('utf-8', errors='replace')
+            if user_id:
+                self._ids[event['username']] = user_id
+                self._users[user_id] = (event['username'], event['os'])
+        elif kind == 'user_left':
+            event['username'] = self._user_name(user_id)
+        elif kind == 'message':
+            if flags & self.FLAG_INLINE_SENDER:
+                name_length = body[0] if body else 0
+                event['sender'] = body[1:1 + name_length].decode('utf-8', errors='ignore')
+                body = body[1 + name_length:]
+            elif user_id:
+                event['sender'] = self._user_name(user_id)
+            event['message'] = body.decode('utf-8', errors='replace')
+            if 'sender' in event:
+                event['timestamp'] = time.strftime('%H:%M:%S', time.localtime(timestamp))
+        elif kind == 'users':
+            users = []
+            offset = self._COUNT.size
+            try:
+                for _ in range(self._COUNT.unpack_from(body)[0]):
+                    member_id = self._COUNT.unpack_from(body, offset)[0]
+                    offset += self._COUNT.size
+                    os_length = body[offset]
+                    os_name = body[offset + 1:offset + 1 + os_length].decode('utf-8', errors='ignore')
+                    offset += 1 + os_length
+                    name_length = body[offset]
+                    username = body[offset + 1:offset + 1 + name_length].decode('utf-8', errors='ignore')
+                    offset += 1 + name_length
+                    if learn:
+                        self._ids[username] = member_id
+                        self._users[member_id] = (username, os_name)
+                    users.append({'username': username, 'os': os_name})
+            except (IndexError, struct.error):
+                raise ValueError("truncated users list")
+            event['users'] = users
+        elif kind == 'error':
+            event['message'] = body.decode('utf-8', errors='replace')
+        return event
+
+class SimpleWebSocketServer:
+    """WebSocket chat server for Task 2
+
+    mode='eventloop' (default) serves every connection from one
+    selector-driven thread. mode='threaded' keeps the original
+    thread-per-client engine so the two can be compared.
+    Incoming messages larger than max_payload bytes are refused with
+    close code 1009.
+
+    In event-loop mode each connection has a bounded outbound queue
+    written only by the loop. When a slow consumer's queue passes
+    send_high_watermark bytes, slow_consumer_policy decides whether new
+    frames are dropped until it drains below send_low_watermark
+    ('drop') or the client is disconnected ('disconnect').
+
+    Event-loop clients that offer permessage-deflate get compressed
+    frames according to `compression` (a DeflateOptions, or None to
+    disable); compression_stats counts bytes saved and CPU spent.
+
+    Connections that have been quiet for ping_interval seconds are
+    pinged and dropped if no pong arrives within pong_timeout. Any
+    connection silent for idle_timeout seconds, or still without a
+    handshake after handshake_timeout, is reaped. Deadlines live in a
+    TimerWheel so no sweep over all clients is needed. Pass None to
+    disable ping_interval or idle_timeout.
+
+    reuse_port and bus are set by ShardedWebSocketServer so several
+    worker processes can share the port and relay broadcasts.
+
+    With coalesce_window > 0 (seconds) outgoing frames are held for up
+    to that long, or until a client has coalesce_max_frames pending,
+    and then written with one scatter-gather sendmsg() per client. This
+    trades a bounded amount of latency for far fewer send syscalls in
+    busy rooms; stats['send_calls'] counts them either way.
+
+    subprotocols lists the Sec-WebSocket-Protocol values the server
+    speaks, in order of preference. An event-loop client offering one
+    gets it echoed back and recorded in conn.subprotocol; clients that
+    offer none keep the plain text protocol.
+
+    With a MessageHistory as `history`, every broadcast is remembered
+    and a new client receives the recent messages as one batched write
+    right after its handshake (unless its URL has replay=0, which the
+    Task 2 page uses when it reconnects).
+
+    With a MessageLog as `log`, every message broadcast by a local client
+    is also appended to that durable log.
+
+    backlog is the listen() queue length. With an AdmissionController as
+    `admission`, a connection it turns away still completes the handshake
+    but is closed straight away with code 1013 (Try Again Later) and the
+    reason "retry=<seconds>", which the generated pages honour with
+    jittered exponential backoff. The event loop accepts at most
+    accept_batch connections per wakeup so a storm can't starve the
+    clients already connected.
+
+    With RateLimitOptions as `rate_limit`, every client message is
+    checked against that client's message and byte budgets before
+    on_message sees it, so one flooding browser can't make the server
+    fan out faster than the limit. stats counts throttled messages and
+    what became of them.
+    """
+    def __init__(self, host='localhost', port=8082, mode='eventloop', verbose=True,
+                 max_payload=1 << 20, send_high_watermark=1 << 20,
+                 send_low_watermark=256 << 10, slow_consumer_policy='drop',
+                 compression=DeflateOptions(), ping_interval=20.0, pong_timeout=10.0,
+                 idle_timeout=120.0, handshake_timeout=10.0, reuse_port=False, bus=None,
+                 coalesce_window=0.0, coalesce_max_frames=32, subprotocols=(), history=None,
+                 log=None, backlog=128, admission=None, accept_batch=64, rate_limit=None):
+        if mode not in ('eventloop', 'threaded'):
+            raise ValueError(f"Unknown WebSocket server mode: {mode}")
+        if slow_consumer_policy not in ('drop', 'disconnect'):
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+        if send_low_watermark > send_high_watermark:
+            raise ValueError("send_low_watermark must not exceed send_high_watermark")
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.verbose = verbose
+        self.max_payload = max_payload
+        self.send_high_watermark = send_high_watermark
+        self.send_low_watermark = send_low_watermark
+        self.slow_consumer_policy = slow_consumer_policy
+        self.ping_interval = ping_interval
+        self.pong_timeout = pong_timeout
+        self.idle_timeout = idle_timeout
+        self.handshake_timeout = handshake_timeout
+        self.reuse_port = reuse_port
+        self.bus = bus
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_frames = coalesce_max_frames
+        self.subprotocols = tuple(subprotocols)
+        self.history = history
+        self.log = log
+        self.backlog = backlog
+        self.admission = admission
+        self.accept_batch = accept_batch
+        self.rate_limit = rate_limit
+        self._throttled = {}  # {id: WebSocketConnection} with messages queued by the rate limit
+        self._throttle_deadline = None
+        self._replay_cache = {}  # {history key: (version, replay bytes)}
+        self._coalescing = {}  # {id: WebSocketConnection} holding frames until the window closes
+        self._coalesce_deadline = None
+        self.stats = {'dropped_frames': 0, 'slow_consumer_disconnects': 0,
+                      'pings_sent': 0, 'reaped_connections': 0, 'send_calls': 0,
+                      'throttled_messages': 0, 'throttle_dropped': 0, 'throttle_queued': 0,
+                      'throttle_disconnects': 0}
+        self.compression = compression
+        self.compression_stats = {
+            'compressed_messages': 0, 'uncompressed_bytes': 0, 'compressed_bytes': 0,
+            'wire_bytes_saved': 0, 'deflate_seconds': 0.0,
+            'inflated_messages': 0, 'inflate_seconds': 0.0,
+        }
+        self.clients = ConnectionRegistry()  # connections that completed the handshake
+        self._handshaking = {}  # eventloop mode: {id: WebSocketConnection} still negotiating
+        self.server_socket = None
+        self.ready = threading.Event()
+        self._running = False
+        self._selector = None
+        self._timers = TimerWheel()
+        self._wakeup_r = None
+        self._wakeup_w = None
+
+    def start(self):
+        self._running = True
+        target = self._run_event_loop if self.mode == 'eventloop' else self._run_server
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._running = False
+        if self.mode == 'eventloop':
+            try:
+                self._wakeup_w.send(b'\0')
+            except:
+                pass
+            return
+        for conn in self.clients.snapshot():
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except:
+                pass
+        if self.server_socket:
+            self.server_socket.close()
+
+    def client_count(self):
+        return len(self.clients)
+
+    def queue_depths(self):
+        """{connection id: (queued frames, queued bytes)} for every event-loop connection"""
+        return {conn.id: conn.queue_depth() for conn in self.clients.snapshot()}
+
+    def _log(self, text, color=Colors.ENDC):
+        if self.verbose:
+            print_colored(text, color)
+
+    def _listen(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        bind_host = '0.0.0.0' if self.host != 'localhost' else self.host
+        self.server_socket.bind((bind_host, self.port))
+        self.server_socket.listen(self.backlog)
+        self.port = self.server_socket.getsockname()[1]
+
+    def _admit(self, conn):
+        """Ask the admission controller about a fresh connection"""
+        if self.admission is None:
+            return
+        conn.retry_after = self.admission.admit(conn.addr[0])
+        conn.admitted = conn.retry_after is None
+
+    def _release(self, conn):
+        if conn.admitted:
+            conn.admitted = False
+            self.admission.release(conn.addr[0])
+
+    def _reject_frame(self, conn):
+        """Close frame telling a refused client when to come back"""
+        return self._build_close_frame(1013, f"retry={conn.retry_after:.1f}")
+
+    # ---------- threaded engine ----------
+
+    def _run_server(self):
+        try:
+            self._listen()
+            self._log(f"🔌 WebSocket server listening on {self.host}:{self.port}", Colors.GREEN)
+            self.ready.set()
+
+            while self._running:
+                client_socket, addr = self.server_socket.accept()
+                conn = WebSocketConnection(client_socket, addr, self.max_payload)
+                self._admit(conn)
+                client_thread = threading.Thread(target=self._handle_client, args=(conn,))
+                client_thread.daemon = True
+                client_thread.start()
+        except Exception as e:
+            if self._running:
+                print_colored(f"❌ WebSocket server error: {e}", Colors.FAIL)
+        finally:
+            self.ready.set()
+
+    def _handle_client(self, conn):
+        client_socket, addr = conn.sock, conn.addr
+        try:
+            # Simple WebSocket handshake
+            request = bytearray()
+            while b'\r\n\r\n' not in request and len(request) <= 8192:
+                chunk = client_socket.recv(1024)
+                if not chunk:
+                    return
+                request += chunk
+            request, _, leftover = bytes(request).partition(b'\r\n\r\n')
+            request = request.decode('utf-8', errors='replace')
+            if 'Upgrade: websocket' in request and conn.retry_after is not None:
+                self._websocket_handshake(client_socket, request)
+                client_socket.send(self._reject_frame(conn))
+                self._log(f"⏳ WebSocket client {addr} asked to retry in {conn.retry_after:.1f}s", Colors.WARNING)
+                return
+            if 'Upgrade: websocket' in request:
+                self._websocket_handshake(client_socket, request)
+                conn.send_lock = threading.Lock()
+                conn.handshake_done = True
+                conn.joined_at = time.time()
+                if self.rate_limit:
+                    conn.limiter = ClientRateLimiter(self.rate_limit)
+                self.clients.add(conn)
+                self._log(f"🔌 WebSocket client connected from {addr}", Colors.GREEN)
+                self.on_open(conn, request)
+
+                conn.parser.feed(leftover)
+                client_socket.settimeout(self.idle_timeout)
+                while True:
+                    try:
+                        data = self._receive_websocket_frame(conn)
+                        if not data:
+                            break
+                        if conn.limiter is None or self._allow_message(conn, data, len(data)):
+                            self._deliver(conn, data)
+                        if conn.closed:
+                            break
+                    except:
+                        break
+        except Exception as e:
+            self._log(f"❌ WebSocket client error: {e}", Colors.FAIL)
+        finally:
+            conn.closed = True
+            self._release(conn)
+            if self.clients.remove(conn):
+                self.on_close(conn)
+                self._log(f"🔌 WebSocket client disconnected from {addr}", Colors.WARNING)
+            client_socket.close()
+
+    # ---------- event-loop engine ----------
+
+    def _run_event_loop(self):
+        try:
+            self._listen()
+            self.server_socket.setblocking(False)
+            self._wakeup_r, self._wakeup_w = socket.socketpair()
+            self._wakeup_r.setblocking(False)
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.server_socket, selectors.EVENT_READ, self._accept_ready)
+            self._selector.register(self._wakeup_r, selectors.EVENT_READ, self._wakeup_ready)
+            if self.bus:
+                self._selector.register(self.bus.sock, selectors.EVENT_READ, self._bus_ready)
+            self._log(f"🔌 WebSocket server listening on {self.host}:{self.port} (event loop)", Colors.GREEN)
+            self.ready.set()
+
+            while self._running:
+                now = time.monotonic()
+                timeout = self._timers.next_timeout(now)
+                if self.bus and self.bus.backlogged():
+                    timeout = min(timeout, 0.005)
+                if self._coalescing:
+                    timeout = max(0.0, min(timeout, self._coalesce_deadline - now))
+                if self._throttled:
+                    timeout = max(0.0, min(timeout, self._throttle_deadline - now))
+                for key, events in self._selector.select(timeout):
+                    if isinstance(key.data, WebSocketConnection):
+                        conn = key.data
+                        if events & selectors.EVENT_WRITE:
+                            self._flush(conn)
+                        if events & selectors.EVENT_READ and not conn.closed and not conn.closing:
+                            self._read_ready(conn)
+                    else:
+                        key.data()
+                now = time.monotonic()
+                for conn in self._timers.expire(now):
+                    self._check_heartbeat(conn, now)
+                if self._coalescing and now >= self._coalesce_deadline:
+                    self._flush_coalesced()
+                if self._throttled and now >= self._throttle_deadline:
+                    self._release_throttled(now)
+                if self.bus:
+                    self.bus.flush()
+        except Exception as e:
+            if self._running:
+                print_colored(f"❌ WebSocket event loop stopped: {e!r}", Colors.FAIL)
+        finally:
+            self._running = False
+            self._close_event_loop()
+            self.ready.set()
+
+    def _close_event_loop(self):
+        for conn in list(self._handshaking.values()) + list(self.clients.snapshot()):
+            self._close_connection(conn)
+        for sock in (self.server_socket, self._wakeup_r, self._wakeup_w):
+            if sock:
+                sock.close()
+        if self.bus:
+            self.bus.close()
+        if self._selector:
+            self._selector.close()
+
+    def _wakeup_ready(self):
+        try:
+            self._wakeup_r.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _bus_ready(self):
+        for payload in self.bus.receive():
+            self._on_bus_message(payload)
+
+    def _on_bus_message(self, payload):
+        """A broadcast relayed from another worker: deliver locally only"""
+        self._broadcast_message(payload.decode('utf-8', errors='replace'), None, relay=False)
+
+    def _accept_ready(self):
+        # Take a bounded batch per wakeup; the rest wait in the listen backlog
+        for _ in range(self.accept_batch):
+            try:
+                client_socket, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            client_socket.setblocking(False)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = WebSocketConnection(client_socket, addr, self.max_payload)
+            self._admit(conn)
+            self._handshaking[conn.id] = conn
+            self._selector.register(client_socket, selectors.EVENT_READ, conn)
+            if self.handshake_timeout:
+                conn.next_check = conn.last_seen + self.handshake_timeout
+                self._timers.schedule(conn.next_check, conn)
+
+    def _read_ready(self, conn):
+        if conn.handshake_done:
+            self._read_frames(conn)
+            return
+        try:
+            data = conn.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close_connection(conn)
+            return
+
+        conn.inbuf += data
+        end = conn.inbuf.find(b'\r\n\r\n')
+        if end < 0:
+            if len(conn.inbuf) > 8192:
+                self._close_connection(conn)
+            return
+        request = conn.inbuf[:end + 4].decode('utf-8', errors='replace')
+        response = self._handshake_response(request, conn) if 'Upgrade: websocket' in request else None
+        if response is None:
+            self._close_connection(conn)
+            return
+        if conn.retry_after is not None:
+            # Refused: never registered, so a storm costs one write per attempt
+            try:
+                conn.sock.send(response + self._reject_frame(conn))
+            except OSError:
+                pass
+            self._log(f"⏳ WebSocket client {conn.addr} asked to retry in {conn.retry_after:.1f}s", Colors.WARNING)
+            self._close_connection(conn)
+            return
+        conn.handshake_done = True
+        conn.joined_at = time.time()
+        if self.rate_limit:
+            conn.limiter = ClientRateLimiter(self.rate_limit)
+        del self._handshaking[conn.id]
+        self.clients.add(conn)
+        conn.parser.feed(conn.inbuf[end + 4:])
+        conn.inbuf = None
+        self._queue_send(conn, response, droppable=False)
+        self._log(f"🔌 WebSocket client connected from {conn.addr}", Colors.GREEN)
+        conn.last_seen = time.monotonic()
+        self._schedule_heartbeat(conn)
+        self.on_open(conn, request)
+        self._dispatch_frames(conn)
+
+    def _read_frames(self, conn):
+        try:
+            count = conn.parser.recv_into(conn.sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            count = 0
+        if not count:
+            self._close_connection(conn)
+            return
+        conn.bytes_in += count
+        conn.last_seen = time.monotonic()
+        self._dispatch_frames(conn)
+
+    def _dispatch_frames(self, conn):
+        try:
+            while not conn.closed and not conn.closing:
+                frame = conn.parser.next_frame()
+                if frame is None:
+                    return
+                opcode, payload = frame
+                if opcode == 0x8:
+                    # Echo the close code back before hanging up
+                    self._queue_send(conn, encode_websocket_frame(payload[:2], 0x8), droppable=False)
+                    self._close_connection(conn)
+                elif opcode == 0x9:
+                    self._queue_send(conn, encode_websocket_frame(payload, 0xA), droppable=False)
+                elif opcode == 0xA:
+                    conn.ping_sent_at = None
+                elif opcode == 0x1 or opcode == 0x2:
+                    conn.messages_in += 1
+                    message = payload.decode('utf-8', errors='replace') if opcode == 0x1 else payload
+                    if conn.limiter is None or self._allow_message(conn, message, len(payload)):
+                        self._deliver(conn, message)
+        except WebSocketProtocolError as e:
+            self._log(f"❌ WebSocket protocol error from {conn.addr}: {e}", Colors.FAIL)
+            self._send_close(conn, e.close_code)
+
+    def _deliver(self, conn, message):
+        """Hand message to on_message; a handler that raises costs only this connection"""
+        try:
+            self.on_message(conn, message)
+        except Exception as e:
+            print_colored(f"❌ WebSocket handler error for {conn.addr}: {e!r}", Colors.FAIL)
+            self._send_close(conn, 1011, "internal error")
+
+    def _allow_message(self, conn, message, size):
+        """Apply conn's rate limit; False if the message must not be handled now"""
+        limiter = conn.limiter
+        # Anything behind a queued message waits too, so ordering is kept
+        if not limiter.queue and limiter.allow(size):
+            return True
+        conn.throttled_messages += 1
+        self.stats['throttled_messages'] += 1
+        action = self.rate_limit.action
+        if action == 'disconnect':
+            self.stats['throttle_disconnects'] += 1
+            self._log(f"🚫 WebSocket client {conn.addr} exceeded its rate limit", Colors.WARNING)
+            self._send_close(conn, 1008, "rate limit exceeded")
+            return False
+        if action == 'queue' and self.mode == 'threaded':
+            # This thread only serves conn, so just wait; TCP pushes back on the sender meanwhile
+            self.stats['throttle_queued'] += 1
+            while not limiter.allow(size):
+                time.sleep(limiter.wait_time(size))
+            return True
+        if action == 'queue' and len(limiter.queue) < self.rate_limit.max_queued:
+            self.stats['throttle_queued'] += 1
+            limiter.queue.append((message, size))
+            if conn.id not in self._throttled:
+                self._throttled[conn.id] = conn
+                deadline = time.monotonic() + limiter.wait_time(size)
+                if self._throttle_deadline is None or len(self._throttled) == 1:
+                    self._throttle_deadline = deadline
+                else:
+                    self._throttle_deadline = min(self._throttle_deadline, deadline)
+            return False
+        self.stats['throttle_dropped'] += 1
+        return False
+
+    def _release_throttled(self, now):
+        """Deliver queued messages whose budget has refilled"""
+        deadline = None
+        for conn in list(self._throttled.values()):
+            queue = conn.limiter.queue
+            while queue and not conn.closed and not conn.closing and conn.limiter.allow(queue[0][1], now):
+                self._deliver(conn, queue.popleft()[0])
+            if conn.closed or conn.closing or not queue:
+                self._throttled.pop(conn.id, None)
+                continue
+            due = now + conn.limiter.wait_time(queue[0][1])
+            deadline = due if deadline is None else min(deadline, due)
+        self._throttle_deadline = deadline
+
+    def _schedule_heartbeat(self, conn):
+        deadlines = []
+        if self.ping_interval:
+            if conn.ping_sent_at is not None:
+                deadlines.append(conn.ping_sent_at + self.pong_timeout)
+            else:
+                deadlines.append(conn.last_seen + self.ping_interval)
+        if self.idle_timeout:
+            deadlines.append(conn.last_seen + self.idle_timeout)
+        if deadlines:
+            conn.next_check = min(deadlines)
+            self._timers.schedule(conn.next_check, conn)
+
+    def _check_heartbeat(self, conn, now):
+        """Timer callback: ping quiet peers, reap dead ones, re-arm the rest"""
+        if conn.closed or conn.next_check is None or now < conn.next_check:
+            return
+        conn.next_check = None
+        if not conn.handshake_done:
+            reason = "no handshake"
+        elif conn.ping_sent_at is not None and now - conn.ping_sent_at >= self.pong_timeout:
+            reason = "no pong"
+        elif self.idle_timeout and now - conn.last_seen >= self.idle_timeout:
+            reason = "idle"
+        else:
+            reason = None
+        if reason:
+            self.stats['reaped_connections'] += 1
+            self._log(f"💤 Reaping WebSocket client {conn.addr} ({reason})", Colors.WARNING)
+            self._close_connection(conn)
+            return
+
+        if self.ping_interval and conn.ping_sent_at is None and now - conn.last_seen >= self.ping_interval:
+            conn.ping_sent_at = now
+            self.stats['pings_sent'] += 1
+            self._queue_send(conn, PING_FRAME, droppable=False)
+        self._schedule_heartbeat(conn)
+
+    def _queue_send(self, conn, data, droppable=True):
+        if conn.closed or conn.closing:
+            return
+        if not conn.outbuf and not self.coalesce_window:
+            # Nothing queued: write straight to the socket and only queue the remainder
+            conn.messages_out += 1
+            self.stats['send_calls'] += 1
+            try:
+                sent = conn.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self._close_connection(conn)
+                return
+            conn.bytes_out += sent
+            if sent < len(data):
+                conn.outbuf.append(memoryview(data)[sent:] if sent else data)
+                conn.queued_bytes += len(data) - sent
+                self._update_events(conn)
+            return
+        if droppable and (conn.dropping or conn.queued_bytes + len(data) > self.send_high_watermark):
+            if self.slow_consumer_policy == 'disconnect':
+                self.stats['slow_consumer_disconnects'] += 1
+                self._log(f"🐢 Disconnecting slow consumer {conn.addr} "
+                          f"({conn.queued_bytes} bytes queued)", Colors.WARNING)
+                self._close_connection(conn)
+                return
+            conn.dropping = True
+            conn.dropped_frames += 1
+            self.stats['dropped_frames'] += 1
+            return
+        conn.outbuf.append(data)
+        conn.queued_bytes += len(data)
+        conn.messages_out += 1
+        if not self.coalesce_window or conn.events & selectors.EVENT_WRITE:
+            return
+        if not droppable or len(conn.outbuf) >= self.coalesce_max_frames:
+            self._coalescing.pop(conn.id, None)
+            self._flush(conn)
+        elif conn.id not in self._coalescing:
+            if not self._coalescing:
+                self._coalesce_deadline = time.monotonic() + self.coalesce_window
+            self._coalescing[conn.id] = conn
+
+    def _flush_coalesced(self):
+        pending, self._coalescing = self._coalescing, {}
+        for conn in pending.values():
+            if not conn.closed:
+                self._flush(conn)
+
+    def _flush(self, conn):
+        try:
+            while conn.outbuf:
+                if HAVE_SENDMSG and len(conn.outbuf) > 1:
+                    # Scatter-gather: every queued frame in one syscall, no joining copy
+                    buffers = list(itertools.islice(conn.outbuf, IOV_MAX))
+                    sent = conn.sock.sendmsg(buffers)
+                    wanted = sum(len(buffer) for buffer in buffers)
+                else:
+                    sent = conn.sock.send(conn.outbuf[0])
+                    wanted = len(conn.outbuf[0])
+                self.stats['send_calls'] += 1
+                conn.queued_bytes -= sent
+                conn.bytes_out += sent
+                remaining = sent
+                while remaining:
+                    head = conn.outbuf[0]
+                    if remaining < len(head):
+                        conn.outbuf[0] = memoryview(head)[remaining:]
+                        break
+                    remaining -= len(head)
+                    conn.outbuf.popleft()
+                if sent < wanted:
+                    break
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._close_connection(conn)
+            return
+        if conn.dropping and conn.queued_bytes <= self.send_low_watermark:
+            conn.dropping = False
+        if conn.closing and not conn.outbuf:
+            self._close_connection(conn)
+            return
+        self._update_events(conn)
+
+    def _update_events(self, conn):
+        # A closing connection reads nothing more; it only waits to write out its close frame
+        events = (0 if conn.closing else selectors.EVENT_READ) | (selectors.EVENT_WRITE if conn.outbuf else 0)
+        if events != conn.events:
+            conn.events = events
+            self._selector.modify(conn.sock, events, conn)
+
+    def _close_connection(self, conn):
+        if conn.closed:
+            return
+        conn.closed = True
+        self._release(conn)
+        self._throttled.pop(conn.id, None)
+        if not self.clients.remove(conn):
+            self._handshaking.pop(conn.id, None)
+        try:
+            self._selector.unregister(conn.sock)
+        except Exception:
+            pass
+        conn.sock.close()
+        if conn.handshake_done:
+            self._log(f"🔌 WebSocket client disconnected from {conn.addr}", Colors.WARNING)
+            self.on_close(conn)
+
+    # ---------- framing (shared) ----------
+
+    def _handshake_response(self, request, conn=None):
+        headers = _parse_headers(request)
+        key = headers.get('sec-websocket-key')
+        if not key:
+            return None
+        magic_string = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+        accept = base64.b64encode(hashlib.sha1((key + magic_string).encode()).digest()).decode()
+
+        extra_headers = ''
+        offers = headers.get('sec-websocket-extensions')
+        if conn is not None and self.compression and offers:
+            conn.deflate = PerMessageDeflate.negotiate(offers, self.compression, self.compression_stats)
+            if conn.deflate:
+                conn.parser.deflate = conn.deflate
+                extra_headers = f"Sec-WebSocket-Extensions: {conn.deflate.response}\r\n"
+
+        offered = headers.get('sec-websocket-protocol')
+        if conn is not None and self.subprotocols and offered:
+            offered = [name.strip() for name in offered.split(',')]
+            for name in self.subprotocols:
+                if name in offered:
+                    conn.subprotocol = name
+                    extra_headers += f"Sec-WebSocket-Protocol: {name}\r\n"
+                    break
+
+        response = (
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n"
+            f"{extra_headers}"
+            "\r\n"
+        )
+        return response.encode()
+
+    def _websocket_handshake(self, client_socket, request):
+        response = self._handshake_response(request)
+        if response:
+            client_socket.send(response)
+
+    def _receive_websocket_frame(self, conn):
+        """Block until the next text message arrives; None on close or error"""
+        try:
+            while True:
+                frame = conn.parser.next_frame()
+                if frame is None:
+                    count = conn.parser.recv_into(conn.sock)
+                    if not count:
+                        return None
+                    conn.bytes_in += count
+                    continue
+                opcode, payload = frame
+                if opcode == 0x8:
+                    return None
+                if opcode == 0x9:
+                    self._send_websocket_frame(conn, encode_websocket_frame(payload, 0xA))
+                elif opcode == 0x1:
+                    conn.messages_in += 1
+                    return payload.decode('utf-8')
+        except WebSocketProtocolError as e:
+            self._send_close(conn, e.close_code)
+            return None
+        except:
+            return None
+
+    def _build_close_frame(self, code, reason=''):
+        return encode_websocket_frame(code.to_bytes(2, 'big') + reason.encode('utf-8')[:123], 0x8)
+
+    def _send_close(self, conn, code, reason=''):
+        """Send a close frame behind anything already queued for conn, then hang up
+
+        The event loop queues it like any other frame and closes the socket
+        once outbuf has drained; the threaded engine writes it under
+        send_lock and marks conn closed so its reader loop ends.
+        """
+        if conn.closed or conn.closing:
+            return
+        frame = self._build_close_frame(code, reason)
+        if self.mode != 'eventloop':
+            self._send_websocket_frame(conn, frame)
+            conn.closed = True
+            return
+        self._queue_send(conn, frame, droppable=False)
+        if conn.closed:
+            return
+        if conn.outbuf:
+            conn.closing = True
+            self._coalescing.pop(conn.id, None)
+            self._update_events(conn)
+        else:
+            self._close_connection(conn)
+
+    def _build_frame(self, message):
+        return encode_websocket_frame(message.encode('utf-8'))
+
+    def _send_websocket_frame(self, conn, frame):
+        if conn.closed:
+            return
+        try:
+            with conn.send_lock:
+                conn.sock.sendall(frame)
+            conn.bytes_out += len(frame)
+            conn.messages_out += 1
+        except:
+            pass
+
+    def _frame_for(self, conn, payload, shared, opcode=0x1):
+        """Frame payload for conn, reusing any identical frame already built in `shared`"""
+        deflate = conn.deflate
+        if deflate is None or len(payload) < self.compression.threshold:
+            frame = shared.get(None)
+            if frame is None:
+                frame = shared[None] = encode_websocket_frame(payload, opcode)
+            return frame
+
+        if deflate.server_no_context_takeover:
+            window_bits = deflate.server_max_window_bits
+            frame = shared.get(window_bits)
+            if frame is None:
+                level = self.compression.level
+                frame = shared[window_bits] = self._deflate_frame(
+                    payload, lambda data: deflate_message(data, level, window_bits), opcode)
+        else:
+            # Context takeover: this connection's compressor state is private, and the
+            # client's inflater must see every message it was fed, even one that grew
+            frame = self._deflate_frame(payload, deflate.compress, opcode, always=True)
+        plain_length = len(payload) + (2 if len(payload) < 126 else 4 if len(payload) < 65536 else 10)
+        self.compression_stats['wire_bytes_saved'] += plain_length - len(frame)
+        return frame
+
+    def _deflate_frame(self, payload, compress, opcode=0x1, always=False):
+        """RSV1 frame of compress(payload); the plain frame if that isn't smaller, unless always"""
+        stats = self.compression_stats
+        started = time.perf_counter()
+        compressed = compress(payload)
+        stats['deflate_seconds'] += time.perf_counter() - started
+        if len(compressed) >= len(payload) and not always:
+            return encode_websocket_frame(payload, opcode)
+        stats['compressed_messages'] += 1
+        stats['uncompressed_bytes'] += len(payload)
+        stats['compressed_bytes'] += len(compressed)
+        return encode_websocket_frame(compressed, opcode, rsv1=True)
+
+    # ---------- application hooks ----------
+
+    def on_open(self, conn, request):
+        """Called once the handshake completes, with the client's request head"""
+        if self.history is not None and 'replay=0' not in request.split('\r\n', 1)[0]:
+            self._replay_history(conn, None, encode_websocket_frame)
+
+    def on_message(self, conn, message):
+        """Called for every complete message: str for text frames, bytes for binary"""
+        if isinstance(message, str):
+            self._broadcast_message(message, conn)
+
+    def on_close(self, conn):
+        """Called once when a connection that completed its handshake goes away"""
+
+    def _replay_history(self, conn, room, build_frame, cache_key=None):
+        """Send room's history to conn as one write, reusing the bytes until history changes"""
+        version, items = self.history.replay(room)
+        if not items:
+            return
+        key = (room, cache_key)
+        cached = self._replay_cache.get(key)
+        if cached is None or cached[0] != version:
+            if len(self._replay_cache) > 2 * self.history.max_rooms:
+                self._replay_cache.clear()
+            cached = self._replay_cache[key] = (version, b''.join(build_frame(item) for item in items))
+        if self.mode == 'eventloop':
+            self._queue_send(conn, cached[1], droppable=False)
+        else:
+            self._send_websocket_frame(conn, cached[1])
+
+    def _broadcast_message(self, message, sender, relay=True):
+        # Encode once; every recipient gets the same immutable frame bytes
+        payload = message.encode('utf-8')
+        if self.history is not None:
+            self.history.append(None, payload, len(payload))
+        if self.log is not None and relay:
+            self.log.append(payload)
+        if self.mode == 'eventloop':
+            shared = {}
+            for conn in self.clients.snapshot():
+                if conn is not sender:
+                    self._queue_send(conn, self._frame_for(conn, payload, shared))
+            if relay and self.bus:
+                self.bus.publish(payload)
+            return
+
+        frame = self._build_frame(message)
+
+        for conn in self.clients.snapshot():
+            if conn is not sender:
+                self._send_websocket_frame(conn, frame)
+
+class ShardedWebSocketServer:
+    """Forks several event-loop WebSocket workers that share one port
+
+    Every worker binds the port with SO_REUSEPORT, so the kernel spreads
+    new connections across processes and therefore across cores.
+    Broadcasts travel between workers over a BroadcastBus, so a message
+    from a client on worker A still reaches the clients on worker B.
+    Where fork() or SO_REUSEPORT is unavailable a single in-process
+    server is started instead.
+    """
+    def __init__(self, host='localhost', port=8082, workers=None, verbose=True, **options):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.verbose = verbose
+        self.options = options
+        self.worker_pids = []
+        self._fallback = None
+        self._reservation = None
+        self._bus_dir = None
+
+    @staticmethod
+    def supported():
+        return hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')
+
+    def start(self):
+        if self.workers == 1 or not self.supported():
+            self._fallback = SimpleWebSocketServer(self.host, self.port, verbose=self.verbose, **self.options)
+            self._fallback.start()
+            self._fallback.ready.wait(5)
+            self.port = self._fallback.port
+            return
+
+        # Hold the port (bound, never listening) so every worker gets the same one
+        bind_host = '0.0.0.0' if self.host != 'localhost' else self.host
+        self._reservation = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._reservation.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._reservation.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self._reservation.bind((bind_host, self.port))
+        self.port = self._reservation.getsockname()[1]
+        self._bus_dir = tempfile.mkdtemp(prefix='lanchat-bus-')
+
+        for worker_id in range(self.workers):
+            pid = os.fork()
+            if pid == 0:
+                self._run_worker(worker_id)
+            self.worker_pids.append(pid)
+        if self.verbose:
+            print_colored(f"🔀 {self.workers} WebSocket workers sharing port {self.port}", Colors.GREEN)
+
+    def _run_worker(self, worker_id):
+        try:
+            self._reservation.close()
+            bus = BroadcastBus(self._bus_dir, worker_id, self.workers,
+                               max_message=self.options.get('max_payload', 1 << 20))
+            server = SimpleWebSocketServer(self.host, self.port, verbose=self.verbose,
+                                           reuse_port=True, bus=bus, **self.options)
+            signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+            server._running = True
+            server._run_event_loop()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os._exit(0)
+
+    def stop(self):
+        if self._fallback:
+            self._fallback.stop()
+            return
+        for pid in self.worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        for pid in self.worker_pids:
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        self.worker_pids = []
+        if self._reservation:
+            self._reservation.close()
+        if self._bus_dir:
+            shutil.rmtree(self._bus_dir, ignore_errors=True)
+
+class ChatRoomServer(SimpleWebSocketServer):
+    """Multi-user chat server for Task 3
+
+    Serves the join/message/list_users protocol of the Task 3 page as
+    JSON text frames, or as lanchat.bin.v1 binary frames for clients
+    that negotiate it. Every user is in one named room; `rooms` maps a
+    room name to its members, so a message only touches the sockets of
+    that room no matter how many clients are connected. Always runs on
+    the event-loop engine, so the handlers below never race.
+    Joining a room replays that room's recent history, and chat messages
+    go to the MessageLog passed as `log`, if any.
+
+    Presence is versioned per room: every join, leave or update bumps the
+    room's version and goes out as one user_joined/user_left/user_updated
+    delta carrying it (re-joining the same room under a new name is a
+    user_left plus a user_joined). The full `users` snapshot is only sent to the
+    client that joins, or to one whose list_users names a stale version
+    (it saw a gap, e.g. after frames were dropped for a slow consumer).
+    """
+    CLIENT_EVENTS = ('join', 'message', 'list_users')
+
+    def __init__(self, host='localhost', port=8083, default_room='lobby', verbose=True, **options):
+        options.setdefault('subprotocols', (BinaryChatCodec.SUBPROTOCOL,))
+        options.setdefault('history', MessageHistory())
+        super().__init__(host, port, mode='eventloop', verbose=verbose, **options)
+        self.default_room = default_room
+        self.codec = BinaryChatCodec()
+        self.rooms = {}  # {room name: {connection id: WebSocketConnection}}
+        self.users = {}  # {connection id: {'username', 'os', 'room'}}
+        self._names = {}  # {username: connection id}, usernames are unique server-wide
+        self._presence = {}  # {room name: presence version}
+
+    def on_message(self, conn, message):
+        try:
+            if isinstance(message, str):
+                event = json.loads(message)
+            elif self._client_event(message):
+                # A client's header id is never trusted or interned
+                event = self.codec.decode(message, learn=False)
+            else:
+                event = None
+        except (ValueError, RecursionError):  # RecursionError: absurdly deep JSON nesting
+            event = None
+        if not isinstance(event, dict):
+            self._send_error(conn, "Malformed message")
+            return
+
+        kind = event.get('type')
+        if kind == 'join':
+            self._join(conn, event)
+        elif kind not in self.CLIENT_EVENTS:
+            self._send_error(conn, f"Unknown message type: {kind}")
+        elif conn.id not in self.users:
+            self._send_error(conn, "Join the chat first")
+        elif kind == 'message':
+            self._chat(conn, event)
+        else:
+            room = self.users[conn.id]['room']
+            if event.get('version') != self._presence.get(room):
+                self._send_event(conn, self._users_event(room))
+
+    def on_open(self, conn, request):
+        pass  # history is per room, so it is replayed on join instead
+
+    def on_close(self, conn):
+        self._leave(conn)
+
+    @classmethod
+    def _client_event(cls, payload):
+        # Only decode event types a client may send
+        code = payload[0] if payload else 0
+        return 0 < code <= len(BinaryChatCodec.TYPES) and BinaryChatCodec.TYPES[code - 1] in cls.CLIENT_EVENTS
+
+    def _join(self, conn, event):
+        username = str(event.get('username') or '').strip()[:20]
+        os_name = str(event.get('os') or '').strip()[:32]
+        room = str(event.get('room') or '').strip()[:32] or self.default_room
+        if not username:
+            self._send_error(conn, "Username is required")
+            return
+        if self._names.get(username, conn.id) != conn.id:
+            self._send_error(conn, f"Username {username} is already taken")
+            return
+
+        previous = self.users.get(conn.id)
+        if previous is not None and previous['room'] == room and previous['username'] == username:
+            # Same room and name again: the others only need to hear about the changed details
+            previous['os'] = os_name
+            self._room_broadcast(room, self._presence_event(room, 'user_updated', username, os_name), exclude=conn)
+        else:
+            self._leave(conn)  # re-joining moves the user to the new room or name
+            conn.username = username
+            self._names[username] = conn.id
+            self.users[conn.id] = {'username': username, 'os': os_name, 'room': room}
+            self._room_broadcast(room, self._presence_event(room, 'user_joined', username, os_name))
+            self.rooms.setdefault(room, {})[conn.id] = conn
+        self._send_event(conn, {'type': 'joined', 'username': username, 'os': os_name, 'room': room})
+        self._send_event(conn, self._users_event(room))
+        if self.history is not None:
+            binary = conn.subprotocol == BinaryChatCodec.SUBPROTOCOL
+            self._replay_history(conn, room, lambda event: self._history_frame(event, binary), binary)
+        self._log(f"👤 {username} joined #{room} from {conn.addr}", Colors.GREEN)
+
+    def _chat(self, conn, event):
+        text = str(event.get('message') or '')
+        if not text:
+            return
+        user = self.users[conn.id]
+        now = time.time()
+        event = {
+            'type': 'message',
+            'sender': user['username'],
+            'message': text,
+            'timestamp': time.strftime('%H:%M:%S', time.localtime(now)),
+            'time': int(now),
+        }
+        self._room_broadcast(user['room'], event, exclude=conn)
+        if self.history is not None:
+            self.history.append(user['room'], event, len(text.encode('utf-8')) + len(user['username']))
+        if self.log is not None:
+            self.log.append(json.dumps({'room': user['room'], 'sender': user['username'], 'message': text}).encode(),
+                            timestamp=now)
+
+    def _leave(self, conn):
+        user = self.users.pop(conn.id, None)
+        if user is None:
+            return
+        username, room = user['username'], user['room']
+        self._names.pop(username, None)
+        members = self.rooms.get(room)
+        if members is not None:
+            members.pop(conn.id, None)
+            if members:
+                self._room_broadcast(room, self._presence_event(room, 'user_left', username))
+            else:
+                del self.rooms[room]
+                self._presence.pop(room, None)
+        self.codec.release(username)
+        self._log(f"👤 {username} left #{room}", Colors.WARNING)
+
+    def _presence_event(self, room, kind, username, os_name=None):
+        """Delta event for room, bumping its presence version"""
+        version = self._presence[room] = (self._presence.get(room, 0) + 1) & 0xFFFFFFFF
+        event = {'type': kind, 'username': username, 'version': version}
+        if os_name is not None:
+            event['os'] = os_name
+        return event
+
+    def _users_event(self, room):
+        members = self.rooms.get(room, {})
+        return {'type': 'users', 'room': room, 'version': self._presence.get(room, 0),
+                'users': [{'username': self.users[conn_id]['username'], 'os': self.users[conn_id]['os']}
+                          for conn_id in members]}
+
+    def _event_frame(self, conn, event, shared):
+        """Frame for event in conn's wire format, encoded once per format"""
+        if conn.subprotocol == BinaryChatCodec.SUBPROTOCOL:
+            key, opcode = 'binary', 0x2
+        else:
+            key, opcode = 'json', 0x1
+        entry = shared.get(key)
+        if entry is None:
+            payload = self.codec.encode(event) if opcode == 0x2 else json.dumps(event).encode('utf-8')
+            entry = shared[key] = (payload, {})
+        return self._frame_for(conn, entry[0], entry[1], opcode)
+
+    def _history_frame(self, event, binary):
+        # Names inline: the sender may have left and their id been reused since
+        if binary:
+            return encode_websocket_frame(self.codec.encode(event, inline_names=True), 0x2)
+        return encode_websocket_frame(json.dumps(event).encode('utf-8'))
+
+    def _send_event(self, conn, event):
+        self._queue_send(conn, self._event_frame(conn, event, {}))
+
+    def _send_error(self, conn, message):
+        self._send_event(conn, {'type': 'error', 'message': message})
+
+    def _room_broadcast(self, room, event, exclude=None):
+        members = self.rooms.get(room)
+        if not members:
+            return
+        shared = {}
+        # Snapshot: a slow consumer may be disconnected, and leave the room, mid-loop
+        for conn in tuple(members.values()):
+            if conn is not exclude:
+                self._queue_send(conn, self._event_frame(conn, event, shared))
+
+# ==================== WEB SERVERS ====================
+
+STATIC_DIR = os.path.join(os.path.expanduser('~'), '.lan-chat', 'static')
+
+# sendfile() errors that mean "not for this kind of socket or file", not a failed send
+_SENDFILE_UNSUPPORTED = {errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK,
+                         getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL)}
+
+class StaticFile:
+    """A pre-rendered response body on disk, sent to sockets with os.sendfile()
+
+    Files are named after their content, so servers can share STATIC_DIR
+    and a name always holds the same bytes. Where sendfile() is missing
+    (Windows) or refused, the file is mmap'd once and written from
+    memoryview slices instead.
+    """
+    __slots__ = ('file', 'size', '_view')
+
+    use_sendfile = hasattr(os, 'sendfile')
+
+    def __init__(self, path):
+        self.file = open(path, 'rb', buffering=0)
+        self.size = os.fstat(self.file.fileno()).st_size
+        self._view = None
+
+    @classmethod
+    def store(cls, name, data, directory=None):
+        """StaticFile for directory/name, writing data there atomically if it's missing"""
+        directory = directory or STATIC_DIR
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + name)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+        return cls(path)
+
+    def send(self, sock, offset, count):
+        """Write count bytes starting at offset to a connected socket"""
+        end = offset + count
+        if self.use_sendfile:
+            socket_fd, file_fd = sock.fileno(), self.file.fileno()
+            while offset < end:
+                try:
+                    sent = os.sendfile(socket_fd, file_fd, offset, end - offset)
+                except BlockingIOError:
+                    # A socket with a timeout is non-blocking underneath
+                    self._wait_writable(sock)
+                    continue
+                except OSError as e:
+                    if e.errno in _SENDFILE_UNSUPPORTED:
+                        break
+                    raise
+                if not sent:
+                    raise ConnectionError("static file is shorter than expected")
+                offset += sent
+        if offset < end:
+            if self._view is None:
+                self._view = memoryview(mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ))
+            sock.sendall(self._view[offset:end])
+
+    @staticmethod
+    def _wait_writable(sock):
+        with selectors.DefaultSelector() as selector:
+            selector.register(sock, selectors.EVENT_WRITE)
+            if not selector.select(sock.gettimeout()):
+                raise socket.timeout("timed out")
+
+def parse_byte_range(value, size):
+    """(start, stop) for a single 'bytes=' Range header value, or None to send everything
+
+    Malformed and multi-range headers get None, which RFC 9110 allows;
+    a range that starts past the end raises ValueError (416).
+    """
+    if not value or not value.startswith('bytes=') or ',' in value:
+        return None
+    first, dash, last = value[6:].strip().partition('-')
+    if not dash or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size
+    start = int(first)
+    stop = size if not last else min(size, int(last) + 1)
+    if start >= size:
+        raise ValueError("range starts past the end")
+    if stop <= start:
+        return None
+    return start, stop
+
+def negotiate_encoding(accept_encoding, available):
+    """Pick the best of `available` content codings for an Accept-Encoding value
+
+    Honours q-values (q=0 refuses a coding), '*' and identity. Ties go to
+    the earlier entry of `available`; 'identity' is returned when nothing
+    better is acceptable.
+    """
+    if not accept_encoding:
+        return 'identity'
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding] = weight
+    wildcard = weights.get('*', 0.0)
+    best, best_weight = 'identity', 0.0
+    for coding in available:
+        weight = weights.get(coding, wildcard)
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    # identity only wins over an accepted coding when the client ranks it higher
+    if weights.get('identity', 0.0) > best_weight:
+        return 'identity'
+    return best
+
+class CachedPage:
+    """One rendered page: its body in every content coding, each with a strong ETag
+
+    The gzip and deflate variants are compressed once, when the page is
+    first rendered, and only kept if they are smaller than the page.
+    """
+    __slots__ = ('body', 'etag', 'variants', 'files')
+
+    ENCODINGS = ('gzip', 'deflate')
+
+    def __init__(self, body):
+        self.body = body
+        digest = hashlib.sha1(body).hexdigest()
+        self.etag = f'"{digest}"'
+        self.variants = {'identity': (body, self.etag)}  # {coding: (bytes, etag)}
+        for coding, compressed in (('gzip', gzip.compress(body, 9, mtime=0)),
+                                   ('deflate', zlib.compress(body, 9))):
+            if len(compressed) < len(body):
+                # Strong ETags must differ between byte-different representations
+                self.variants[coding] = (compressed, f'"{digest}-{coding}"')
+        self.files = {}  # {coding: StaticFile, or False if it couldn't be written}
+
+    def select(self, accept_encoding):
+        """(coding, bytes, etag) of the variant to send for this Accept-Encoding"""
+        coding = negotiate_encoding(accept_encoding, [name for name in self.ENCODINGS if name in self.variants])
+        body, etag = self.variants[coding]
+        return coding, body, etag
+
+    def file(self, coding):
+        """StaticFile of a variant, written to STATIC_DIR on first use; None if that failed"""
+        static = self.files.get(coding)
+        if static is None:
+            body, etag = self.variants[coding]
+            try:
+                static = StaticFile.store(etag.strip('"'), body)
+                if static.size != len(body):
+                    static = False
+            except OSError:
+                static = False  # read-only home directory etc.: keep serving from memory
+            self.files[coding] = static
+        return static or None
+
+    @staticmethod
+    def matches(etag, if_none_match):
+        """True if an If-None-Match header value names etag"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # If-None-Match uses the weak comparison, so W/"x" matches "x"
+        return '*' in tags or etag in tags or 'W/' + etag in tags
+
+class PageCache:
+    """HTML pages rendered once per (page, host, port)
+
+    The page generators' output depends on nothing else, so each page
+    is formatted and encoded the first time it is asked for and served
+    from those bytes afterwards. port=None uses the generator's default.
+    """
+    GENERATORS = {
+        'index': generate_index_html,
+        'task1': generate_task1_html,
+        'task2': generate_task2_html,
+        'task3': generate_task3_html,
+    }
+
+    def __init__(self):
+        self._pages = {}  # {(page, host, port): CachedPage}
+        self.stats = {'renders': 0, 'hits': 0, 'not_modified': 0, 'bytes_sent': 0, 'bytes_saved': 0}
+
+    def get(self, page, host, port=None):
+        key = (page, host, port)
+        cached = self._pages.get(key)
+        if cached is None:
+            # Two workers may race to render the same page; both get identical bytes
+            html = self.GENERATORS[page](*((host,) if port is None else (host, port)))
+            cached = self._pages.setdefault(key, CachedPage(html.encode()))
+            self.stats['renders'] += 1
+        else:
+            self.stats['hits'] += 1
+        return cached
+
+    def warm(self, pages, host, port=None):
+        """Render and compress pages up front so no visitor pays for it"""
+        for page in pages:
+            self.get(page, host, port)
+
+    def clear(self):
+        self._pages.clear()
+
+PAGE_CACHE = PageCache()
+
+class AssetStore:
+    """Static CSS and JS served under content-hashed /assets/ URLs
+
+    The URL changes whenever the content does, so browsers may cache an
+    asset forever (Cache-Control: immutable) and never revalidate it.
+    Each asset is a CachedPage, so it gets the same gzip/deflate variants.
+    """
+    CONTENT_TYPES = {
+        'css': 'text/css; charset=utf-8',
+        'js': 'text/javascript; charset=utf-8',
+    }
+    CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+    def __init__(self, sources):
+        self._urls = {}  # {name: url}
+        self._assets = {}  # {url: (CachedPage, content type)}
+        self.stats = {'not_modified': 0, 'bytes_sent': 0, 'bytes_saved': 0}
+        for name, text in sources.items():
+            asset = CachedPage(text.encode())
+            stem, extension = name.rsplit('.', 1)
+            url = f"/assets/{stem}.{asset.etag[1:13]}.{extension}"
+            self._urls[name] = url
+            self._assets[url] = (asset, self.CONTENT_TYPES[extension])
+
+    def url(self, name):
+        return self._urls[name]
+
+    def lookup(self, url):
+        """(CachedPage, content type) for an asset URL, or None"""
+        return self._assets.get(url.split('?', 1)[0])
+
+ASSETS = AssetStore({
+    'index.css': INDEX_CSS, 'index.js': INDEX_JS,
+    'task1.css': TASK1_CSS, 'task1.js': TASK1_JS,
+    'task2.css': TASK2_CSS, 'task2.js': TASK2_JS,
+    'task3.css': TASK3_CSS, 'task3.js': TASK3_JS,
+})
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    """Base request handler for the page servers
+
+    Speaks HTTP/1.1, so a browser reuses one connection for a page and
+    the requests that follow it. send_body() always sets Content-Length,
+    which keep-alive needs to find the end of each response. An idle
+    connection is closed after `timeout` seconds, and right after its
+    current response when other connections are waiting for a worker.
+    send_page() serves a page from PAGE_CACHE and send_asset() a file
+    from ASSETS, gzip- or deflate-encoded when Accept-Encoding allows,
+    answering a matching If-None-Match with 304 and a Range with 206.
+    Bodies of sendfile_threshold bytes or more go out with sendfile()
+    from files under STATIC_DIR (use_static_files=False writes every
+    body from memory instead).
+    A handler that answers without reading the request body must call
+    discard_body() first, or the body would be parsed as the next request.
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+    disable_nagle_algorithm = True
+    use_static_files = True
+    sendfile_threshold = 64 << 10  # smaller bodies are cheaper to write from memory
+    max_discard = 64 << 10  # unread bodies up to this size are skipped; larger ones close the connection
+
+    def discard_body(self):
+        """Skip the unread request body, or close the connection after this response if it can't be"""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.close_connection = True
+            return
+        try:
+            remaining = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            remaining = -1
+        if not 0 <= remaining <= self.max_discard:
+            self.close_connection = True
+            return
+        while remaining > 0:
+            data = self.rfile.read(min(remaining, 65536))
+            if not data:
+                self.close_connection = True
+                return
+            remaining -= len(data)
+
+    def send_head(self, content_type, status, headers, length):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-type', content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        if status not in (204, 304):
+            self.send_header('Content-Length', str(length))
+        backlogged = getattr(self.server, 'backlogged', None)
+        if self.close_connection or backlogged is not None and backlogged():
+            self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def send_body(self, body, content_type='text/html', status=200, headers=()):
+        self.send_head(content_type, status, headers, len(body))
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def send_cached(self, cached, content_type, cache_control, stats):
+        coding, body, etag = cached.select(self.headers.get('Accept-Encoding'))
+        headers = [('ETag', etag), ('Cache-Control', cache_control), ('Vary', 'Accept-Encoding'),
+                   ('Accept-Ranges', 'bytes')]
+        if cached.matches(etag, self.headers.get('If-None-Match')):
+            stats['not_modified'] += 1
+            self.send_body(b'', None, 304, headers)
+            return
+        if coding != 'identity':
+            headers.append(('Content-Encoding', coding))
+
+        status, start, stop = 200, 0, len(body)
+        if_range = self.headers.get('If-Range')
+        if if_range is None or if_range.strip() == etag:
+            try:
+                byte_range = parse_byte_range(self.headers.get('Range'), len(body))
+            except ValueError:
+                self.send_body(b'', None, 416, headers + [('Content-Range', f"bytes */{len(body)}")])
+                return
+            if byte_range is not None:
+                status, (start, stop) = 206, byte_range
+                headers.append(('Content-Range', f"bytes {start}-{stop - 1}/{len(body)}"))
+        stats['bytes_sent'] += stop - start
+        stats['bytes_saved'] += len(cached.body) - len(body)
+
+        static = None
+        if self.use_static_files and stop - start >= self.sendfile_threshold:
+            static = cached.file(coding)
+        self.send_head(content_type, status, headers, stop - start)
+        if self.command == 'HEAD':
+            return
+        if static is not None:
+            static.send(self.connection, start, stop - start)
+        else:
+            self.wfile.write(memoryview(body)[start:stop])
+
+    def send_page(self, page, host, port=None):
+        # no-cache: browsers keep the page but revalidate it, which costs a bodyless 304
+        self.send_cached(PAGE_CACHE.get(page, host, port), 'text/html', 'no-cache', PAGE_CACHE.stats)
+
+    def send_asset(self, url):
+        found = ASSETS.lookup(url)
+        if found is None:
+            self.send_body(b'', None, 404)
+            return
+        asset, content_type = found
+        self.send_cached(asset, content_type, ASSETS.CACHE_CONTROL, ASSETS.stats)
+
+    def log_message(self, format, *args):
+        pass  # Suppress default logging
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCPServer that hands connections to a fixed pool of worker threads
+
+    Accepted connections wait in a queue of at most queue_size for one
+    of `workers` threads, so a slow client only ties up its own worker.
+    When the queue is full the connection is answered with 503 and
+    Retry-After straight from the accept loop: a burst sheds load
+    instead of growing latency without bound.
+    """
+    allow_reuse_address = True
+    request_queue_size = 128  # listen() backlog
+
+    SHED_RESPONSE = (b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n"
+                     b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+
+    def __init__(self, server_address, handler_class, workers=32, queue_size=64):
+        self._queue = queue.Queue(queue_size)
+        self.stats = {'connections': 0, 'shed': 0}
+        super().__init__(server_address, handler_class)
+        self._workers = []
+        for number in range(workers):
+            worker = threading.Thread(target=self._work, name=f"http-worker-{number}")
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def process_request(self, request, client_address):
+        try:
+            self._queue.put_nowait((request, client_address))
+            self.stats['connections'] += 1
+        except queue.Full:
+            self.stats['shed'] += 1
+            try:
+                request.sendall(self.SHED_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def backlogged(self):
+        """True while accepted connections are waiting for a worker"""
+        return not self._queue.empty()
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, socket.timeout)):
+            super().handle_error(request, client_address)  # a browser leaving mid-response isn't worth a traceback
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+def open_message_log(name):
+    """MessageLog under MESSAGE_LOG_DIR, or None (with a warning) if it can't be opened"""
+    try:
+        return MessageLog(os.path.join(MESSAGE_LOG_DIR, name))
+    except OSError as e:
+        print_colored(f"⚠️  Message log '{name}' disabled: {e}", Colors.WARNING)
+        return None
+
+def search_response(index, path):
+    """JSON body for GET /search?q=...&limit=N&before=<cursor>"""
+    query = parse_qs(urlparse(path).query)
+    text = query.get('q', [''])[0]
+    try:
+        limit = min(100, max(1, int(query.get('limit', ['20'])[0])))
+        before = int(query['before'][0]) if 'before' in query else None
+    except ValueError:
+        limit, before = 20, None
+    started = time.perf_counter()
+    index.refresh()
+    refreshed = time.perf_counter()
+    results, cursor = index.search(text, limit, before)
+    finished = time.perf_counter()
+    return json.dumps({
+        'query': text,
+        'results': results,
+        'next': cursor,
+        'indexed': index.stats['documents'],
+        'refresh_ms': round((refreshed - started) * 1000, 3),
+        'took_ms': round((finished - refreshed) * 1000, 3),
+    }).encode()
+
+def message_log_response(log, path):
+    """JSON body for GET /history?since=N&limit=M, read from log"""
+    query = parse_qs(urlparse(path).query)
+    try:
+        since = max(0, int(query.get('since', ['0'])[0]))
+        limit = min(1000, max(1, int(query.get('limit', ['100'])[0])))
+    except ValueError:
+        since, limit = 0, 100
+    records = log.read_since(since, limit) if log is not None else []
+    return json.dumps({
+        'messages': [{'seq': seq, 'time': stamp, 'message': payload.decode('utf-8', errors='replace')}
+                     for seq, stamp, payload in records],
+        'next': records[-1][0] + 1 if records else since,
+    }).encode()
+
+BATCH_MAX_ITEMS = 10000
+BATCH_MAX_ITEM_BYTES = 64 << 10
+_CHUNK_SIZE_PATTERN = re.compile(rb'[0-9A-Fa-f]{1,16}')  # int(x, 16) alone would take '-1', '+1', '0x1', '1_0'
+
+def iter_request_body(rfile, headers, chunk_size=65536):
+    """Yield a request body in pieces as it arrives, undoing chunked transfer encoding
+
+    Raises ValueError for a malformed or truncated body.
+    """
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        while True:
+            line = rfile.readline(1024)
+            size = line.split(b';', 1)[0].strip()
+            if not _CHUNK_SIZE_PATTERN.fullmatch(size):
+                raise ValueError("bad chunk size line")
+            size = int(size, 16)
+            if size == 0:
+                # Skip any trailer fields up to the blank line that ends the body
+                while rfile.readline(1024) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            while size:
+                data = rfile.read(min(size, chunk_size))
+                if not data:
+                    raise ValueError("body ended inside a chunk")
+                size -= len(data)
+                yield data
+            if rfile.readline(3) not in (b'\r\n', b'\n'):
+                raise ValueError("chunk not followed by CRLF")
+    remaining = int(headers.get('Content-Length') or 0)
+    while remaining > 0:
+        data = rfile.read(min(remaining, chunk_size))
+        if not data:
+            raise ValueError("body shorter than Content-Length")
+        remaining -= len(data)
+        yield data
+
+def _parse_item(line):
+    try:
+        return json.loads(line.decode('utf-8')), None
+    except ValueError as e:
+        return None, f"invalid JSON: {e}"
+    except RecursionError:
+        return None, "invalid JSON: nested too deeply"
+
+def iter_ndjson(chunks, max_item_bytes=BATCH_MAX_ITEM_BYTES):
+    """Yield (item, None) or (None, error) for each line of a newline-delimited JSON stream
+
+    A bad line only rejects that item; lines longer than max_item_bytes
+    are skipped without being buffered.
+    """
+    pending = bytearray()
+    skipping = False
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif line.strip():
+                yield _parse_item(line)
+        if len(pending) > max_item_bytes:
+            if not skipping:
+                yield None, f"item longer than {max_item_bytes} bytes"
+            skipping = True
+            pending = bytearray()
+    if pending.strip() and not skipping:
+        yield _parse_item(pending)
+
+def iter_json_array(chunks, max_item_bytes=BATCH_MAX_ITEM_BYTES):
+    """Yield (item, None) for each element of a JSON array as soon as it has arrived
+
+    Only the unparsed tail of the body is held in memory. The array's
+    own syntax can't be resynchronised after an error, so a bad element
+    raises ValueError instead of rejecting just that item.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf, pos, eof = '', 0, False
+    expect = '['  # then 'first' (element or ']'), ',' (',' or ']'), 'item', 'end'
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+        if pos < len(buf):
+            char = buf[pos]
+            if expect == 'item' or expect == 'first' and char != ']':
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except ValueError as e:
+                    if eof:
+                        raise ValueError(f"invalid array element: {e}")
+                    end = None  # most likely not all here yet
+                except RecursionError:
+                    raise ValueError("array element nested too deeply")
+                # A number at the end of what has arrived may still be growing: "1" of "1.5e3"
+                if end is not None and (eof or end < len(buf) and buf[end] not in '0123456789.eE+-'):
+                    pos, expect = end, ','
+                    yield item, None
+                    continue
+                if len(buf) - pos > max_item_bytes:
+                    raise ValueError(f"array element invalid or longer than {max_item_bytes} bytes")
+            else:
+                if expect == '[' and char == '[':
+                    expect = 'first'
+                elif expect in ('first', ',') and char == ']':
+                    expect = 'end'
+                elif expect == ',' and char == ',':
+                    expect = 'item'
+                else:
+                    raise ValueError(f"unexpected {char!r} in JSON array")
+                pos += 1
+                continue
+        elif eof:
+            if expect == 'end':
+                return
+            raise ValueError("body ended inside the JSON array")
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            chunk, eof = b'', True
+        try:
+            buf = buf[pos:] + utf8.decode(chunk, eof)
+        except UnicodeDecodeError as e:
+            raise ValueError(f"body is not UTF-8: {e}")
+        pos = 0
+
+def ingest_batch(handler, accept, max_items=BATCH_MAX_ITEMS):
+    """Stream a batch request body through accept(item) and return (status, ack)
+
+    The body is a JSON array, or newline-delimited JSON when the
+    Content-Type says ndjson/jsonlines; either may use chunked transfer
+    encoding. accept() returns a dict merged into the item's status or
+    raises ValueError to reject it; any other exception (the message log
+    failing, say) ends the batch with a 500. Items are handled as they
+    are parsed, so an error part-way still acks everything before it.
+    """
+    results = []
+    accepted = 0
+    status, error = 200, None
+    content_type = handler.headers.get('Content-Type', '').lower()
+    chunks = iter_request_body(handler.rfile, handler.headers)
+    items = iter_ndjson(chunks) if 'ndjson' in content_type or 'jsonl' in content_type else iter_json_array(chunks)
+    try:
+        for item, problem in items:
+            if len(results) == max_items:
+                status, error = 413, f"more than {max_items} items"
+                break
+            if problem is None:
+                result = {'ok': True}
+                try:
+                    result.update(accept(item))
+                    results.append(result)
+                    accepted += 1
+                    continue
+                except ValueError as e:
+                    problem = str(e)
+            results.append({'ok': False, 'error': problem})
+    except ValueError as e:
+        status, error = 400, str(e)
+    except Exception as e:
+        print_colored(f"❌ Error processing batch: {e}", Colors.FAIL)
+        status, error = 500, str(e)
+    if status != 200:
+        # The rest of the body is unread, so the connection can't carry another request
+        handler.close_connection = True
+    ack = {'success': status == 200, 'accepted': accepted, 'rejected': len(results) - accepted, 'results': results}
+    if error:
+        ack['error'] = error
+    return status, ack
+
+# Linux reports the socket's cumulative count of datagrams dropped for lack of buffer space
+# as SO_RXQ_OVFL ancillary data; Python doesn't export the constant
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40 if sys.platform.startswith('linux') else None)
+
+class UDPMessageListener:
+    """Receives Task 1 messages as real UDP datagrams
+
+    A datagram holds one JSON object {"message": ...}, several of them as
+    NDJSON lines, or plain UTF-8 text. After each wakeup up to `batch`
+    datagrams are drained with recvmsg_into() into a pool of preallocated
+    buffers and then decoded together, so nothing is allocated per
+    receive. SO_RCVBUF is raised so bursts queue in the kernel. Where
+    SO_RXQ_OVFL is available, stats['dropped'] counts datagrams that still
+    didn't fit, but only as of the last datagram received: the kernel
+    stamps its running count on each datagram it queues, so drops after
+    that one show up with the next arrival. refresh_dropped() sends the
+    listener an empty datagram to bring the count up to date. Truncated or non-UTF-8 datagrams and
+    lines that aren't a JSON message are counted in stats['malformed'].
+    """
+    def __init__(self, host='0.0.0.0', port=8001, on_messages=None, rcvbuf=4 << 20, batch=64,
+                 buffer_size=65535):
+        self.on_messages = on_messages  # called with [(message, (ip, port)), ...] per batch
+        self.batch = batch
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if rcvbuf:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        # Linux reports double the requested size (it counts bookkeeping) and caps it at net.core.rmem_max
+        self.rcvbuf = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        self._ancillary = 0
+        if SO_RXQ_OVFL is not None and hasattr(socket, 'CMSG_SPACE'):
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self._ancillary = socket.CMSG_SPACE(4)
+            except OSError:
+                pass
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self._buffers = [bytearray(buffer_size) for _ in range(batch)]
+        self._views = [[memoryview(buffer)] for buffer in self._buffers]
+        self._running = False
+        self._thread = None
+        self.stats = {'received': 0, 'messages': 0, 'malformed': 0, 'dropped': 0, 'bytes': 0, 'batches': 0}
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(2)
+        self.sock.close()
+
+    def _run(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.sock, selectors.EVENT_READ)
+            while self._running:
+                if selector.select(0.5):
+                    self.drain()
+
+    def drain(self):
+        """Receive and decode every waiting datagram, up to one batch; returns how many"""
+        received = []
+        use_recvmsg = hasattr(self.sock, 'recvmsg_into')
+        for index in range(self.batch):
+            try:
+                if use_recvmsg:
+                    size, ancdata, flags, address = self.sock.recvmsg_into(self._views[index], self._ancillary)
+                else:
+                    size, address = self.sock.recvfrom_into(self._buffers[index])
+                    ancdata, flags = (), 0
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # e.g. an ICMP error from an earlier send on Windows; the socket is still usable
+                continue
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+                    self.stats['dropped'] = struct.unpack('=I', data[:4])[0]
+            if not size and address[1] == self.port:
+                continue  # refresh_dropped()'s probe, sent from this socket
+            if flags & getattr(socket, 'MSG_TRUNC', 0):
+                self.stats['malformed'] += 1
+                continue
+            received.append((index, size, address))
+        if not received:
+            return 0
+        messages = []
+        for index, size, address in received:
+            self._decode(self._views[index][0][:size], address, messages)
+        self.stats['received'] += len(received)
+        self.stats['bytes'] += sum(size for _, size, _ in received)
+        self.stats['messages'] += len(messages)
+        self.stats['batches'] += 1
+        if messages and self.on_messages is not None:
+            self.on_messages(messages)
+        return len(received)
+
+    def refresh_dropped(self):
+        """Queue an empty datagram to this socket so the next drain() updates stats['dropped']"""
+        host = self.sock.getsockname()[0]
+        try:
+            self.sock.sendto(b'', ('127.0.0.1' if host == '0.0.0.0' else host, self.port))
+        except OSError:
+            pass
+
+    def _decode(self, view, address, messages):
+        try:
+            text = str(view, 'utf-8')
+        except UnicodeDecodeError:
+            self.stats['malformed'] += 1
+            return
+        if not text.lstrip().startswith('{'):
+            if text.strip():
+                messages.append((text.rstrip('\r\n'), address))
+            else:
+                self.stats['malformed'] += 1
+            return
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except (ValueError, RecursionError):  # RecursionError: absurdly deep nesting
+                item = None
+            if isinstance(item, dict) and isinstance(item.get('message'), str):
+                messages.append((item['message'], address))
+            else:
+                self.stats['malformed'] += 1
+
+class UDPRelay:
+    """Forwards messages as UDP datagrams to one sink over a single connected socket
+
+    send() only queues a message, so an HTTP worker never waits on the
+    network. A sender thread takes everything queued since its last pass
+    and packs it as NDJSON lines into as few datagrams of at most
+    max_datagram bytes as it can (the format UDPMessageListener reads).
+    At most max_in_flight messages may be queued or being sent; past
+    that send() refuses them (stats['rejected']). Send errors, such as the
+    "connection refused" a connected socket reports when nothing listens
+    at the sink, are counted and the sender carries on. self.rates holds
+    messages, datagrams and errors per second over the last second.
+    """
+    def __init__(self, address, max_in_flight=1024, max_datagram=1472):
+        self.address = address
+        self.max_in_flight = max_in_flight
+        self.max_datagram = max_datagram  # 1472 = a 1500-byte Ethernet MTU minus IP and UDP headers
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.sock.connect(address)  # resolves the sink once; sends then skip the per-datagram route lookup
+        except (OSError, OverflowError):
+            self.sock.close()
+            raise
+        self.stats = {'queued': 0, 'sent': 0, 'datagrams': 0, 'bytes': 0, 'errors': 0, 'failed': 0,
+                      'rejected': 0, 'last_error': None}
+        self.rates = {'messages_per_sec': 0.0, 'datagrams_per_sec': 0.0, 'errors_per_sec': 0.0}
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._in_flight = 0
+        self._running = False
+        self._thread = None
+        self._rate_mark = (time.monotonic(), 0, 0, 0)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Send whatever is still queued, then close the socket"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(5)
+        self.sock.close()
+
+    def send(self, payload):
+        """Queue one message (bytes without newlines); False if max_in_flight is reached"""
+        with self._cond:
+            if self._in_flight >= self.max_in_flight:
+                self.stats['rejected'] += 1
+                return False
+            self._pending.append(payload)
+            self._in_flight += 1
+            self.stats['queued'] += 1
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._running and not self._pending:
+                    self._cond.wait(1.0)
+                batch, self._pending = self._pending, deque()
+                running = self._running
+            if batch:
+                self._send_batch(batch)
+                with self._cond:
+                    self._in_flight -= len(batch)
+            self._update_rates()
+            if not running and not batch:
+                return
+
+    def _send_batch(self, batch):
+        datagram, count = bytearray(), 0
+        for payload in batch:
+            if datagram and len(datagram) + len(payload) + 1 > self.max_datagram:
+                self._transmit(datagram, count)
+                datagram, count = bytearray(), 0
+            datagram += payload
+            datagram += b'\n'
+            count += 1
+        if datagram:
+            self._transmit(datagram, count)
+
+    def _transmit(self, datagram, count):
+        try:
+            self.sock.send(datagram)
+        except OSError as e:
+            self.stats['errors'] += 1
+            self.stats['failed'] += count
+            self.stats['last_error'] = str(e)
+            return
+        self.stats['sent'] += count
+        self.stats['datagrams'] += 1
+        self.stats['bytes'] += len(datagram)
+
+    def _update_rates(self):
+        now = time.monotonic()
+        since, sent, datagrams, errors = self._rate_mark
+        if now - since < 1.0:
+            return
+        elapsed = now - since
+        self.rates = {
+            'messages_per_sec': round((self.stats['sent'] - sent) / elapsed, 1),
+            'datagrams_per_sec': round((self.stats['datagrams'] - datagrams) / elapsed, 1),
+            'errors_per_sec': round((self.stats['errors'] - errors) / elapsed, 1),
+        }
+        self._rate_mark = (now, self.stats['sent'], self.stats['datagrams'], self.stats['errors'])
+
+    def report(self):
+        """JSON-ready stats and current rates"""
+        return {'sink': f"{self.address[0]}:{self.address[1]}", 'in_flight': self._in_flight,
+                'stats': dict(self.stats), 'rates': dict(self.rates)}
+
+def parse_host_port(text, default_port=8001):
+    """('host', port) from 'host:port' or 'host'; raises ValueError unless the port is 1-65535"""
+    host, _, port = text.strip().rpartition(':')
+    if not host:
+        return port, default_port
+    port = int(port)
+    if not 0 < port <= 65535:
+        raise ValueError(f"port {port} is out of range")
+    return host, port
+
+class Task1Server:
+    """HTTP server for Task 1: UDP Messaging
+
+    relay_to=(host, port) also forwards every message posted to
+    /send_udp or /send_udp/batch to that UDP sink through a UDPRelay;
+    GET /relay_stats reports its rates and errors.
+    """
+    def __init__(self, host='localhost', port=8001, relay_to=None):
+        self.host = host
+        self.port = port
+        self.relay_to = relay_to
+        self.relay = None
+        self.udp_listener = None
+        self.log = None
+
+    def start(self):
+        import http.server
+        import socketserver
+        from urllib.parse import urlparse, parse_qs
+        import json
+        
+        server_host = self.host  # Store host for use in handler
+        server_port = self.port  # Store port for use in handler
+        self.log = message_log = open_message_log('task1')
+        relay = None
+        if self.relay_to:
+            try:
+                self.relay = relay = UDPRelay(self.relay_to)
+                relay.start()
+                print_colored(f"📤 Forwarding Task 1 messages to UDP {self.relay_to[0]}:{self.relay_to[1]}",
+                              Colors.GREEN)
+            except (OSError, OverflowError) as e:  # OverflowError: a port past 65535
+                print_colored(f"⚠️  UDP relay to {self.relay_to} disabled: {e}", Colors.WARNING)
+
+        def forward(sender, message):
+            """Queue a message for the relay; None when no relay is configured"""
+            if relay is None:
+                return None
+            return relay.send(json.dumps({'from': sender, 'message': message}).encode())
+        
+        class TaskHandler(KeepAliveHandler):
+            def do_GET(self):
+                if self.path == '/':
+                    self.send_page('task1', server_host, server_port)
+                elif self.path.startswith('/assets/'):
+                    self.send_asset(self.path)
+                elif self.path.startswith('/history'):
+                    self.send_body(message_log_response(message_log, self.path), 'application/json')
+                elif self.path == '/relay_stats' and relay is not None:
+                    self.send_body(json.dumps(relay.report()).encode(), 'application/json')
+                else:
+                    self.send_body(b'', None, 404)
+
+            def do_POST(self):
+                if self.path == '/send_udp':
+                    try:
+                        content_length = int(self.headers.get('Content-Length', 0))
+                        post_data = self.rfile.read(content_length)
+                        
+                        data = json.loads(post_data.decode())
                         message = data.get('message', '')
                         
-                        # Simulate UDP send (just log it)
+                        # Log it, and send it on as a real datagram when a relay is configured
                         timestamp = time.strftime("%H:%M:%S")
                         print_colored(f"[{timestamp}] 📨 UDP Message from Windows PC: {message}", Colors.BLUE)
+                        if message_log is not None:
+                            message_log.append(json.dumps({'from': self.client_address[0], 'message': message}).encode())
+                        forwarded = forward(self.client_address[0], message)
                         
                         # Send proper JSON response
-                        self.send_response(200)
-                        self.send_header('Content-type', 'application/json')
-                        self.send_header('Access-Control-Allow-Origin', '*')
-                        self.send_header('Access-Control-Allow-Methods', 'POST')
-                        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-                        self.end_headers()
-                        
                         response = {'success': True, 'message': 'Message received by Ubuntu PC'}
-                        self.wfile.write(json.dumps(response).encode())
+                        if forwarded is not None:
+                            response['forwarded'] = forwarded
+                        self.send_body(json.dumps(response).encode(), 'application/json', headers=(
+                            ('Access-Control-Allow-Origin', '*'),
+                            ('Access-Control-Allow-Methods', 'POST'),
+                            ('Access-Control-Allow-Headers', 'Content-Type'),
+                        ))
                         
                     except Exception as e:
                         print_colored(f"❌ Error processing message: {e}", Colors.FAIL)
-                        
-                        self.send_response(500)
-                        self.send_header('Content-type', 'application/json')
-                        self.send_header('Access-Control-Allow-Origin', '*')
-                        self.end_headers()
+                        self.close_connection = True  # the body may not have been read in full
                         
                         response = {'success': False, 'error': str(e)}
-                        self.wfile.write(json.dumps(response).encode())
+                        self.send_body(json.dumps(response).encode(), 'application/json', 500,
+                                       headers=(('Access-Control-Allow-Origin', '*'),))
+                elif self.path == '/send_udp/batch':
+                    sender = self.client_address[0]
+
+                    def accept(item):
+                        if not isinstance(item, dict) or not isinstance(item.get('message'), str):
+                            raise ValueError("expected an object with a 'message' string")
+                        status = {}
+                        if message_log is not None:
+                            status['seq'] = message_log.append(
+                                json.dumps({'from': sender, 'message': item['message']}).encode())
+                        forwarded = forward(sender, item['message'])
+                        if forwarded is not None:
+                            status['forwarded'] = forwarded
+                        return status
+
+                    status, ack = ingest_batch(self, accept)
+                    timestamp = time.strftime("%H:%M:%S")
+                    print_colored(f"[{timestamp}] 📨 {ack['accepted']} UDP messages from {sender} in one batch"
+                                  + (f" ({ack['rejected']} rejected)" if ack['rejected'] else ''), Colors.BLUE)
+                    self.send_body(json.dumps(ack).encode(), 'application/json', status,
+                                   headers=(('Access-Control-Allow-Origin', '*'),))
                 else:
                     # Handle unknown paths
-                    self.send_response(404)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
+                    self.discard_body()
                     response = {'success': False, 'error': 'Endpoint not found'}
-                    self.wfile.write(json.dumps(response).encode())
+                    self.send_body(json.dumps(response).encode(), 'application/json', 404)
             
             def do_OPTIONS(self):
                 # Handle CORS preflight requests
-                self.send_response(200)
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-                self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-                self.end_headers()
-
-            def log_message(self, format, *args):
-                pass  # Suppress default logging
+                self.send_body(b'', None, headers=(
+                    ('Access-Control-Allow-Origin', '*'),
+                    ('Access-Control-Allow-Methods', 'POST, OPTIONS'),
+                    ('Access-Control-Allow-Headers', 'Content-Type'),
+                ))
 
         bind_host = '0.0.0.0' if self.host != 'localhost' else self.host
-        
+
+        def log_datagrams(messages):
+            timestamp = time.strftime("%H:%M:%S")
+            if len(messages) <= 10:
+                for message, address in messages:
+                    print_colored(f"[{timestamp}] 📨 UDP datagram from {address[0]}: {message}", Colors.BLUE)
+            else:
+                # Don't let a flood of datagrams stall the listener on terminal output
+                print_colored(f"[{timestamp}] 📨 {len(messages)} UDP messages received", Colors.BLUE)
+            if message_log is not None:
+                for message, address in messages:
+                    message_log.append(json.dumps({'from': address[0], 'message': message}).encode())
+
         try:
-            with socketserver.TCPServer((bind_host, self.port), TaskHandler) as httpd:
+            self.udp_listener = UDPMessageListener(bind_host, self.port, log_datagrams)
+            self.udp_listener.start()
+            print_colored(f"📡 Task 1 UDP listener on {self.host}:{self.port} "
+                          f"(receive buffer {self.udp_listener.rcvbuf >> 10} KB)", Colors.GREEN)
+        except OSError as e:
+            self.udp_listener = None
+            print_colored(f"⚠️  UDP listener disabled: {e}", Colors.WARNING)
+
+        try:
+            PAGE_CACHE.warm(('task1',), server_host, server_port)
+            with PooledHTTPServer((bind_host, self.port), TaskHandler) as httpd:
                 print_colored(f"📨 Task 1 Web Server running on {self.host}:{self.port}", Colors.GREEN)
                 print_colored(f"🪟 Windows PC should visit: http://{self.host}:{self.port}", Colors.WARNING)
                 httpd.serve_forever()
         except KeyboardInterrupt:
             print_colored("\n📨 Task 1 server stopped", Colors.WARNING)
+        finally:
+            if self.udp_listener is not None:
+                self.udp_listener.stop()
+            if relay is not None:
+                relay.stop()
+                stats = relay.stats
+                print_colored(f"📤 Relay sent {stats['sent']} messages in {stats['datagrams']} datagrams "
+                              f"({stats['failed']} failed, {stats['rejected']} over the in-flight limit)",
+                              Colors.CYAN)
+            if message_log is not None:
+                message_log.close()
 
 class Task2Server:
-    """WebSocket server for Task 2: TCP Chat"""
-    def __init__(self, host='localhost', port=8002):
+    """WebSocket server for Task 2: TCP Chat
+
+    Chat messages are kept in a durable MessageLog (single-worker mode
+    only, since forked workers would share its files); the recent ones
+    are replayed to new clients, even after a restart, and
+    GET /history?since=N reads older ones.
+    """
+    def __init__(self, host='localhost', port=8002, ws_workers=1):
         self.host = host
         self.port = port
+        self.ws_workers = ws_workers  # >1 shards the chat socket across processes
 
     def start(self):
         import http.server
@@ -1402,36 +4963,53 @@ class Task2Server:
         server_host = self.host  # Store host for use in handler
         server_port = self.port  # Store port for use in handler
         
-        class TaskHandler(http.server.BaseHTTPRequestHandler):
+        class TaskHandler(KeepAliveHandler):
             def do_GET(self):
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(generate_task2_html(server_host, server_port).encode())
-
-            def log_message(self, format, *args):
-                pass
+                if self.path.startswith('/history'):
+                    self.send_body(message_log_response(message_log, self.path), 'application/json')
+                    return
+                if self.path.startswith('/assets/'):
+                    self.send_asset(self.path)
+                    return
+                self.send_page('task2', server_host, server_port)
 
         bind_host = '0.0.0.0' if self.host != 'localhost' else self.host
         
         # Start WebSocket server
-        ws_server = SimpleWebSocketServer(self.host, 8082)
+        history = MessageHistory()
+        if self.ws_workers > 1:
+            message_log = None
+            ws_server = ShardedWebSocketServer(self.host, 8082, workers=self.ws_workers, history=history,
+                                               admission=AdmissionController(),
+                                               rate_limit=RateLimitOptions())
+        else:
+            message_log = open_message_log('task2')
+            if message_log is not None:
+                for _, _, payload in message_log.tail(history.max_messages):
+                    history.append(None, payload, len(payload))
+            ws_server = SimpleWebSocketServer(self.host, 8082, history=history, log=message_log,
+                                              admission=AdmissionController(),
+                                              rate_limit=RateLimitOptions())
         ws_server.start()
         
         try:
-            with socketserver.TCPServer((bind_host, self.port), TaskHandler) as httpd:
+            PAGE_CACHE.warm(('task2',), server_host, server_port)
+            with PooledHTTPServer((bind_host, self.port), TaskHandler) as httpd:
                 print_colored(f"💬 Task 2 Web Server running on {self.host}:{self.port}", Colors.GREEN)
                 print_colored(f"🪟 Windows PC should visit: http://{self.host}:{self.port}", Colors.WARNING)
                 httpd.serve_forever()
         except KeyboardInterrupt:
             print_colored("\n💬 Task 2 server stopped", Colors.WARNING)
+        finally:
+            ws_server.stop()
+            if message_log is not None:
+                message_log.close()
 
 class Task3Server:
     """WebSocket server for Task 3: Multi-user Chat"""
     def __init__(self, host='localhost', port=8003):
         self.host = host
         self.port = port
-        self.users = {}  # {websocket: user_info}
 
     def start(self):
         import http.server
@@ -1440,88 +5018,1436 @@ class Task3Server:
         server_host = self.host  # Store host for use in handler
         server_port = self.port  # Store port for use in handler
         
-        class TaskHandler(http.server.BaseHTTPRequestHandler):
+        class TaskHandler(KeepAliveHandler):
             def do_GET(self):
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                self.wfile.write(generate_task3_html(server_host, server_port).encode())
-
-            def log_message(self, format, *args):
-                pass
+                if self.path.startswith('/assets/'):
+                    self.send_asset(self.path)
+                    return
+                self.send_page('task3', server_host, server_port)
 
         bind_host = '0.0.0.0' if self.host != 'localhost' else self.host
         
-        # Start WebSocket server for multi-user chat
-        self._start_websocket_server()
+        # Start WebSocket server for multi-user chat, with each room's history restored from the log
+        history = MessageHistory()
+        message_log = open_message_log('task3')
+        if message_log is not None:
+            for _, stamp, payload in message_log.tail(history.max_messages * 10):
+                record = decode_logged_message('task3', payload)
+                history.append(record.get('room'), {
+                    'type': 'message', 'sender': record.get('sender', ''), 'message': record.get('message', ''),
+                    'timestamp': time.strftime('%H:%M:%S', time.localtime(stamp)), 'time': int(stamp),
+                }, len(payload))
+        ws_server = ChatRoomServer(self.host, 8083, history=history, log=message_log,
+                                   admission=AdmissionController(), rate_limit=RateLimitOptions())
+        ws_server.start()
         
         try:
-            with socketserver.TCPServer((bind_host, self.port), TaskHandler) as httpd:
+            PAGE_CACHE.warm(('task3',), server_host, server_port)
+            with PooledHTTPServer((bind_host, self.port), TaskHandler) as httpd:
                 print_colored(f"🌐 Task 3 Web Server running on {self.host}:{self.port}", Colors.GREEN)
                 print_colored(f"🪟 Windows PC should visit: http://{self.host}:{self.port}", Colors.WARNING)
                 httpd.serve_forever()
         except KeyboardInterrupt:
             print_colored("\n🌐 Task 3 server stopped", Colors.WARNING)
-
-    def _start_websocket_server(self):
-        # This is a simplified implementation
-        # In a real application, you'd use a proper WebSocket library
-        threading.Thread(target=self._run_websocket_server, daemon=True).start()
-
-    def _run_websocket_server(self):
-        print_colored(f"🔌 Task 3 WebSocket server on port 8083", Colors.GREEN)
+        finally:
+            ws_server.stop()
+            if message_log is not None:
+                message_log.close()
 
 class MainWebServer:
-    """Main web server that serves the index page"""
+    """Main web server that serves the index page
+
+    GET /search?q=words&limit=20&before=<next> searches the Task 1-3
+    message logs through a SearchIndex that catches up with the logs on
+    every request.
+    """
     def __init__(self, host='localhost', port=8000):
         self.host = host
         self.port = port
+        self.search_index = None
 
     def start(self):
         import http.server
         import socketserver
         
         server_host = self.host  # Store host for use in handler
+        self.search_index = search_index = SearchIndex.for_message_logs()
+        search_index.refresh()
         
-        class MainHandler(http.server.BaseHTTPRequestHandler):
+        class MainHandler(KeepAliveHandler):
             def do_GET(self):
-                if self.path == '/' or self.path == '/index':
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    self.wfile.write(generate_index_html(server_host).encode())
-                elif self.path == '/task1':
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    self.wfile.write(generate_task1_html(server_host).encode())
-                elif self.path == '/task2':
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    self.wfile.write(generate_task2_html(server_host).encode())
-                elif self.path == '/task3':
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    self.wfile.write(generate_task3_html(server_host).encode())
+                if self.path.startswith('/search'):
+                    self.send_body(search_response(search_index, self.path), 'application/json')
+                elif self.path == '/' or self.path == '/index':
+                    self.send_page('index', server_host)
+                elif self.path in ('/task1', '/task2', '/task3'):
+                    self.send_page(self.path[1:], server_host)
+                elif self.path.startswith('/assets/'):
+                    self.send_asset(self.path)
                 else:
-                    self.send_response(404)
-                    self.end_headers()
-
-            def log_message(self, format, *args):
-                pass
+                    self.send_body(b'', None, 404)
 
         bind_host = '0.0.0.0' if self.host != 'localhost' else self.host
         
         try:
-            with socketserver.TCPServer((bind_host, self.port), MainHandler) as httpd:
+            PAGE_CACHE.warm(PageCache.GENERATORS, server_host)
+            with PooledHTTPServer((bind_host, self.port), MainHandler) as httpd:
                 print_colored(f"🌐 Main Web Server running on {self.host}:{self.port}", Colors.GREEN)
                 print_colored(f"🪟 Windows PC should visit: http://{self.host}:{self.port}", Colors.WARNING)
                 httpd.serve_forever()
         except KeyboardInterrupt:
             print_colored("\n🌐 Main server stopped", Colors.WARNING)
 
+# ==================== BENCHMARKS ====================
+
+def _current_rss_kb():
+    """Resident set size of this process in KB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class _BenchWebSocketClient:
+    """Minimal blocking WebSocket client used by the benchmarks"""
+    def __init__(self, host, port, path='/'):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        self._buf = b''
+        while b'\r\n\r\n' not in self._buf:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("handshake failed")
+            self._buf += chunk
+        self._buf = self._buf.split(b'\r\n\r\n', 1)[1]
+
+    def send_text(self, text):
+        payload = text.encode('utf-8')
+        mask = os.urandom(4)
+        header = bytearray([0x81])
+        if len(payload) < 126:
+            header.append(0x80 | len(payload))
+        elif len(payload) < 65536:
+            header.append(0x80 | 126)
+            header += len(payload).to_bytes(2, 'big')
+        else:
+            header.append(0x80 | 127)
+            header += len(payload).to_bytes(8, 'big')
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.sock.sendall(bytes(header) + mask + masked)
+
+    def _read(self, n):
+        while len(self._buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("connection closed")
+            self._buf += chunk
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def recv_frame(self):
+        """Return (opcode, payload) of the next server frame"""
+        head = self._read(2)
+        length = head[1] & 127
+        if length == 126:
+            length = int.from_bytes(self._read(2), 'big')
+        elif length == 127:
+            length = int.from_bytes(self._read(8), 'big')
+        return head[0] & 0x0F, self._read(length)
+
+    def recv_text(self):
+        return self.recv_frame()[1].decode('utf-8')
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+def benchmark_websocket_engines(connection_counts=(100, 500, 1000), samples=50):
+    """Compare idle-connection memory and broadcast latency of both engines"""
+    print_colored("\n📊 WebSocket engine: connections vs RSS / threads / latency", Colors.CYAN)
+    print_colored(f"   {'mode':<10}{'conns':>7}{'RSS +KB':>10}{'threads':>9}{'p50 ms':>9}{'p99 ms':>9}", Colors.BOLD)
+    for mode in ('threaded', 'eventloop'):
+        for count in connection_counts:
+            server = SimpleWebSocketServer('localhost', 0, mode=mode, verbose=False)
+            server.start()
+            server.ready.wait(5)
+            rss_before = _current_rss_kb()
+            clients = []
+            try:
+                for _ in range(count):
+                    clients.append(_BenchWebSocketClient('localhost', server.port))
+                deadline = time.time() + 10
+                while server.client_count() < count and time.time() < deadline:
+                    time.sleep(0.01)
+                rss_after = _current_rss_kb()
+                threads = threading.active_count()
+
+                sender, receiver = clients[0], clients[-1]
+                latencies = []
+                for i in range(samples):
+                    started = time.perf_counter()
+                    sender.send_text(f"ping {i}")
+                    receiver.recv_text()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                print_colored(
+                    f"   {mode:<10}{count:>7}{rss_after - rss_before:>10}{threads:>9}"
+                    f"{_percentile(latencies, 50):>9.2f}{_percentile(latencies, 99):>9.2f}",
+                    Colors.WHITE)
+            except OSError as e:
+                print_colored(f"   {mode:<10}{count:>7}  ❌ {e}", Colors.FAIL)
+            finally:
+                for client in clients:
+                    client.close()
+                server.stop()
+                time.sleep(0.2)
+
+def _bench_socketpair_room(server, size):
+    """Attach `size` socketpair-backed clients to an unstarted event-loop server"""
+    server._selector = selectors.DefaultSelector()
+    peers = []
+    for _ in range(size):
+        ours, theirs = socket.socketpair()
+        ours.setblocking(False)
+        theirs.setblocking(False)
+        conn = WebSocketConnection(ours, ('socketpair', 0), server.max_payload)
+        conn.handshake_done = True
+        server.clients.add(conn)
+        server._selector.register(ours, selectors.EVENT_READ, conn)
+        peers.append(theirs)
+    return peers
+
+def _bench_drain(peers):
+    """Read everything buffered on the client ends; returns the byte count"""
+    total = 0
+    for peer in peers:
+        try:
+            while True:
+                chunk = peer.recv(262144)
+                if not chunk:
+                    break
+                total += len(chunk)
+        except (BlockingIOError, InterruptedError):
+            pass
+    return total
+
+def _bench_close_room(server, peers):
+    for conn in server.clients.snapshot():
+        server._close_connection(conn)
+    for peer in peers:
+        peer.close()
+    server._selector.close()
+
+def _legacy_build_frame(message):
+    """The original per-recipient framing, kept for comparison"""
+    message_bytes = message.encode('utf-8')
+    frame = bytearray()
+    frame.append(0x81)
+    if len(message_bytes) < 126:
+        frame.append(len(message_bytes))
+    elif len(message_bytes) < 65536:
+        frame.append(126)
+        frame.extend(len(message_bytes).to_bytes(2, 'big'))
+    else:
+        frame.append(127)
+        frame.extend(len(message_bytes).to_bytes(8, 'big'))
+    frame.extend(message_bytes)
+    return frame
+
+def benchmark_broadcast_fanout(room_sizes=(10, 100, 1000), messages=200):
+    """CPU per broadcast message: per-recipient encoding vs encode-once"""
+    print_colored("\n📊 Broadcast fan-out: CPU µs per message", Colors.CYAN)
+    print_colored(f"   {'room':>6}{'per-recipient':>16}{'encode-once':>14}{'speedup':>10}", Colors.BOLD)
+    message = json.dumps({'type': 'message', 'username': 'bench', 'message': 'hello room ' * 8})
+    for size in room_sizes:
+        server = SimpleWebSocketServer('localhost', 0, verbose=False)
+        peers = _bench_socketpair_room(server, size)
+        conns = server.clients.snapshot()
+        results = []
+        try:
+            for strategy in ('legacy', 'encode-once'):
+                cpu = 0.0
+                for i in range(messages):
+                    started = time.process_time()
+                    if strategy == 'legacy':
+                        for conn in conns:
+                            conn.sock.send(_legacy_build_frame(message))
+                    else:
+                        server._broadcast_message(message, None)
+                    cpu += time.process_time() - started
+                    if i % 20 == 19:
+                        _bench_drain(peers)
+                _bench_drain(peers)
+                results.append(cpu / messages * 1e6)
+        finally:
+            _bench_close_room(server, peers)
+        print_colored(f"   {size:>6}{results[0]:>16.1f}{results[1]:>14.1f}{results[0] / max(results[1], 1e-9):>9.2f}x",
+                      Colors.WHITE)
+
+def _bench_chat_messages(count):
+    """Task 3 style JSON chat events for benchmarks"""
+    names = ['alice', 'bob', 'charlie', 'dana', 'eve']
+    words = ['hello', 'anyone', 'seen', 'the', 'lab', 'notes', 'for', 'task', 'three', 'yes', 'ping', 'udp']
+    messages = []
+    for i in range(count):
+        text = ' '.join(words[(i * 7 + k * 3) % len(words)] for k in range(5 + i % 20))
+        messages.append(json.dumps({
+            'type': 'message', 'sender': names[i % len(names)], 'message': text,
+            'timestamp': time.strftime('%H:%M:%S', time.gmtime(1700000000 + i)),
+            'users': [{'username': name, 'os': 'Windows'} for name in names],
+        }))
+    return messages
+
+def benchmark_compression(room_size=10, messages=500):
+    """Wire bytes and CPU for permessage-deflate variants on chat JSON"""
+    print_colored(f"\n📊 permessage-deflate on chat JSON ({room_size} clients, {messages} messages)", Colors.CYAN)
+    print_colored(f"   {'variant':<22}{'wire KB':>9}{'saved':>8}{'deflate ms':>12}{'µs/msg':>9}", Colors.BOLD)
+    chat = _bench_chat_messages(messages)
+    variants = [
+        ('off', None, None),
+        ('no context takeover', DeflateOptions(), 'permessage-deflate'),
+        ('context takeover', DeflateOptions(server_no_context_takeover=False), 'permessage-deflate'),
+    ]
+    for name, options, offer in variants:
+        server = SimpleWebSocketServer('localhost', 0, verbose=False, compression=options)
+        peers = _bench_socketpair_room(server, room_size)
+        for conn in server.clients.snapshot():
+            if offer:
+                conn.deflate = PerMessageDeflate.negotiate(offer, options, server.compression_stats)
+        wire = 0
+        started = time.process_time()
+        try:
+            for i, message in enumerate(chat):
+                server._broadcast_message(message, None)
+                if i % 20 == 19:
+                    wire += _bench_drain(peers)
+            wire += _bench_drain(peers)
+        finally:
+            cpu = time.process_time() - started
+            _bench_close_room(server, peers)
+        raw = sum(len(encode_websocket_frame(message.encode('utf-8'))) for message in chat) * room_size
+        stats = server.compression_stats
+        print_colored(f"   {name:<22}{wire / 1024:>9.1f}{(1 - wire / raw) * 100:>7.1f}%"
+                      f"{stats['deflate_seconds'] * 1000:>12.2f}{cpu / messages * 1e6:>9.1f}", Colors.WHITE)
+
+def benchmark_heartbeat_reaping(connection_counts=(1000, 10000, 100000), interval=20.0, tick=1.0):
+    """Per-tick cost of finding due heartbeats: full client scan vs timer wheel"""
+    print_colored(f"\n📊 Heartbeat bookkeeping per {tick:.0f}s tick (deadlines spread over {interval:.0f}s)", Colors.CYAN)
+    print_colored(f"   {'conns':>8}{'scan µs':>10}{'wheel µs':>10}{'due/tick':>10}", Colors.BOLD)
+    for count in connection_counts:
+        now = 1000.0
+        deadlines = [now + interval * i / count for i in range(count)]
+        ticks = int(interval / tick)
+
+        started = time.perf_counter()
+        for step in range(1, ticks + 1):
+            current = now + step * tick
+            due = [i for i, deadline in enumerate(deadlines) if deadline <= current and deadline > current - tick]
+        scan = (time.perf_counter() - started) / ticks
+
+        wheel = TimerWheel(tick=tick)
+        wheel._current = int(now / tick)
+        for i, deadline in enumerate(deadlines):
+            wheel.schedule(deadline, i)
+        started = time.perf_counter()
+        expired = 0
+        for step in range(1, ticks + 1):
+            expired += len(wheel.expire(now + step * tick))
+        wheel_cost = (time.perf_counter() - started) / ticks
+        print_colored(f"   {count:>8}{scan * 1e6:>10.0f}{wheel_cost * 1e6:>10.0f}{expired // ticks:>10}", Colors.WHITE)
+
+def _bench_count_frames(buf):
+    """Count complete server frames at the start of buf; returns (frames, bytes consumed)"""
+    count = pos = 0
+    while len(buf) - pos >= 2:
+        length = buf[pos + 1] & 127
+        header = 2
+        if length == 126:
+            header = 4
+        elif length == 127:
+            header = 10
+        if len(buf) - pos < header:
+            break
+        if length == 126:
+            length = int.from_bytes(buf[pos + 2:pos + 4], 'big')
+        elif length == 127:
+            length = int.from_bytes(buf[pos + 2:pos + 10], 'big')
+        if len(buf) - pos < header + length:
+            break
+        pos += header + length
+        count += 1
+    return count, pos
+
+def _bench_shard_receiver(port, clients, expected, barrier, results, timeout=30.0):
+    conns = [_BenchWebSocketClient('localhost', port) for _ in range(clients)]
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    for client in conns:
+        client.sock.setblocking(False)
+        buffers[client.sock] = bytearray(client._buf)
+        selector.register(client.sock, selectors.EVENT_READ)
+    barrier.wait()
+    received, first, last = 0, None, None
+    deadline = time.time() + timeout
+    while received < expected and time.time() < deadline:
+        for key, _ in selector.select(0.5):
+            try:
+                chunk = key.fileobj.recv(1 << 20)
+            except (BlockingIOError, InterruptedError):
+                continue
+            buf = buffers[key.fileobj]
+            buf += chunk
+            count, used = _bench_count_frames(buf)
+            del buf[:used]
+            if count:
+                last = time.time()
+                first = first or last
+                received += count
+    results.put((received, first, last))
+
+def _bench_shard_sender(port, clients, messages, barrier):
+    conns = [_BenchWebSocketClient('localhost', port) for _ in range(clients)]
+    barrier.wait()
+    for i in range(messages):
+        for client in conns:
+            client.send_text(f"shard benchmark message {i}")
+    time.sleep(1)
+
+def benchmark_sharding(worker_counts=(1, 2, 4), senders=2, receivers=2, clients=10, messages=200):
+    """Broadcast deliveries per second as the number of worker processes grows"""
+    if not ShardedWebSocketServer.supported():
+        print_colored("\n📊 Sharding benchmark needs fork() and SO_REUSEPORT", Colors.WARNING)
+        return
+    import multiprocessing
+    context = multiprocessing.get_context('fork')
+    print_colored(f"\n📊 Sharded broadcast throughput ({os.cpu_count()} CPUs, "
+                  f"{senders * clients} senders → {receivers * clients} receivers)", Colors.CYAN)
+    print_colored(f"   {'workers':>8}{'delivered':>11}{'seconds':>9}{'msgs/s':>10}", Colors.BOLD)
+    expected = senders * clients * messages * clients
+    for workers in worker_counts:
+        server = ShardedWebSocketServer('localhost', 0, workers=workers, verbose=False)
+        server.start()
+        time.sleep(0.3)
+        barrier = context.Barrier(senders + receivers)
+        results = context.Queue()
+        processes = [context.Process(target=_bench_shard_receiver,
+                                     args=(server.port, clients, expected, barrier, results))
+                     for _ in range(receivers)]
+        processes += [context.Process(target=_bench_shard_sender,
+                                      args=(server.port, clients, messages, barrier))
+                      for _ in range(senders)]
+        try:
+            for process in processes:
+                process.start()
+            outcomes = [results.get(timeout=60) for _ in range(receivers)]
+            delivered = sum(outcome[0] for outcome in outcomes)
+            firsts = [outcome[1] for outcome in outcomes if outcome[1]]
+            lasts = [outcome[2] for outcome in outcomes if outcome[2]]
+            elapsed = max(lasts) - min(firsts) if firsts else 0.0
+            rate = delivered / elapsed if elapsed else 0.0
+            print_colored(f"   {workers:>8}{delivered:>11}{elapsed:>9.2f}{rate:>10.0f}", Colors.WHITE)
+        except Exception as e:
+            print_colored(f"   {workers:>8}  ❌ {e}", Colors.FAIL)
+        finally:
+            for process in processes:
+                process.join(5)
+                if process.is_alive():
+                    process.terminate()
+            server.stop()
+
+def benchmark_reconnect_storm(storm_sizes=(500, 2000), samples=100):
+    """Latency for a connected client while a burst of clients reconnects at once"""
+    print_colored("\n📊 Reconnect storm: existing client's round trip while everyone reconnects", Colors.CYAN)
+    print_colored(f"   {'storm':>6}{'admission':>11}{'admitted':>10}{'refused':>9}{'p50 ms':>9}{'p99 ms':>9}", Colors.BOLD)
+    for size in storm_sizes:
+        for label in ('off', 'on'):
+            admission = AdmissionController(max_per_ip=0) if label == 'on' else None
+            # A full history makes every admitted client cost what it does on the Task 2 server
+            history = MessageHistory()
+            for text in _bench_chat_messages(history.max_messages):
+                history.append(None, text.encode('utf-8'), len(text))
+            server = SimpleWebSocketServer('localhost', 0, verbose=False, compression=None,
+                                           history=history, admission=admission, backlog=1024)
+            server.start()
+            server.ready.wait(5)
+            sender = _BenchWebSocketClient('localhost', server.port, '/?replay=0')
+            receiver = _BenchWebSocketClient('localhost', server.port, '/?replay=0')
+            storm = []
+
+            def reconnect_all():
+                for _ in range(size):
+                    try:
+                        storm.append(_BenchWebSocketClient('localhost', server.port))
+                    except OSError:
+                        pass
+
+            thread = threading.Thread(target=reconnect_all)
+            thread.daemon = True
+            latencies = []
+            try:
+                thread.start()
+                for i in range(samples):
+                    started = time.perf_counter()
+                    sender.send_text(f"ping {i}")
+                    receiver.recv_text()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if not thread.is_alive():
+                        break
+                thread.join(60)
+                admitted = admission.stats['admitted'] - 2 if admission else len(storm)
+                refused = admission.stats['rejected_rate'] if admission else 0
+                print_colored(f"   {size:>6}{label:>11}{admitted:>10}{refused:>9}"
+                              f"{_percentile(latencies, 50):>9.2f}{_percentile(latencies, 99):>9.2f}", Colors.WHITE)
+            finally:
+                for client in storm + [sender, receiver]:
+                    client.close()
+                server.stop()
+                time.sleep(0.2)
+
+def benchmark_connection_registry(connection_counts=(1000, 10000), operations=2000):
+    """Lookup/removal/snapshot cost: plain client list vs ConnectionRegistry"""
+    print_colored("\n📊 Connection registry: µs per operation", Colors.CYAN)
+    print_colored(f"   {'conns':>7}{'list in':>10}{'list rm':>10}{'reg get':>10}{'reg rm':>10}{'snapshot':>10}", Colors.BOLD)
+    sock = socket.socket()
+    try:
+        for count in connection_counts:
+            records = [WebSocketConnection(sock, ('bench', i), 1 << 20) for i in range(count)]
+            victims = records[-operations:]
+
+            clients = list(records)
+            started = time.perf_counter()
+            for conn in victims:
+                conn in clients
+            list_in = (time.perf_counter() - started) / len(victims)
+            started = time.perf_counter()
+            for conn in victims:
+                clients.remove(conn)
+            list_remove = (time.perf_counter() - started) / len(victims)
+
+            registry = ConnectionRegistry()
+            for conn in records:
+                registry.add(conn)
+            registry.snapshot()
+            started = time.perf_counter()
+            for conn in victims:
+                registry.get(conn.id)
+            reg_get = (time.perf_counter() - started) / len(victims)
+            started = time.perf_counter()
+            for _ in range(operations):
+                registry.snapshot()
+            snapshot = (time.perf_counter() - started) / operations
+            started = time.perf_counter()
+            for conn in victims:
+                registry.remove(conn)
+            reg_remove = (time.perf_counter() - started) / len(victims)
+            print_colored(f"   {count:>7}{list_in * 1e6:>10.2f}{list_remove * 1e6:>10.2f}"
+                          f"{reg_get * 1e6:>10.2f}{reg_remove * 1e6:>10.2f}{snapshot * 1e6:>10.2f}", Colors.WHITE)
+    finally:
+        sock.close()
+
+def benchmark_rate_limit(room_size=100, messages=5000, batch=50):
+    """What one flooding client costs a room, without and with a per-client rate limit"""
+    print_colored(f"\n📊 Rate limiting: one client floods {messages} messages into a {room_size}-client room",
+                  Colors.CYAN)
+    print_colored(f"   {'limit':<12}{'handled':>9}{'throttled':>11}{'frames out':>12}{'CPU ms':>9}{'check µs':>10}",
+                  Colors.BOLD)
+    text = json.loads(_bench_chat_messages(1)[0])['message'].encode('utf-8')[:120]
+    # Client frames must be masked; an all-zero mask leaves the payload as it is
+    frame = bytes([0x81, 0x80 | len(text)]) + bytes(4) + text
+    limits = (
+        ('none', None),
+        ('drop', RateLimitOptions(action='drop')),
+        ('queue', RateLimitOptions(action='queue')),
+    )
+    for label, options in limits:
+        server = SimpleWebSocketServer('localhost', 0, verbose=False, compression=None, rate_limit=options)
+        peers = _bench_socketpair_room(server, room_size)
+        flooder = server.clients.snapshot()[0]
+        if options:
+            flooder.limiter = ClientRateLimiter(options)
+        delivered = 0
+        try:
+            started = time.process_time()
+            for sent in range(0, messages, batch):
+                flooder.parser.feed(frame * min(batch, messages - sent))
+                server._dispatch_frames(flooder)
+                for peer in peers[1:]:
+                    try:
+                        while True:
+                            chunk = peer.recv(262144)
+                            if not chunk:
+                                break
+                            delivered += _bench_count_frames(chunk)[0]
+                    except (BlockingIOError, InterruptedError):
+                        pass
+            cpu = time.process_time() - started
+        finally:
+            _bench_close_room(server, peers)
+        throttled = server.stats['throttled_messages']
+        # Cost of the O(1) check alone, on a limiter that always has budget
+        check = 'n/a'
+        if options:
+            limiter = ClientRateLimiter(RateLimitOptions(messages_per_second=1e9, message_burst=1e9,
+                                                         bytes_per_second=1e12, byte_burst=1e12))
+            started = time.perf_counter()
+            for _ in range(100000):
+                limiter.allow(len(text))
+            check = f"{(time.perf_counter() - started) / 100000 * 1e6:.2f}"
+        print_colored(f"   {label:<12}{messages - throttled:>9}{throttled:>11}{delivered:>12}{cpu * 1000:>9.1f}{check:>10}",
+                      Colors.WHITE)
+
+def benchmark_coalescing(room_size=100, messages=400, bursts=(1, 8, 32)):
+    """send() syscalls and CPU for immediate writes vs coalesced sendmsg() batches"""
+    print_colored(f"\n📊 Broadcast coalescing ({room_size} clients, {messages} messages)", Colors.CYAN)
+    print_colored(f"   {'burst':>6}{'variant':>14}{'syscalls':>10}{'per msg':>9}{'µs/msg':>9}", Colors.BOLD)
+    message = json.dumps({'type': 'message', 'username': 'bench', 'message': 'hello room ' * 4})
+    for burst in bursts:
+        for name, window in (('immediate', 0.0), ('coalesce 2ms', 0.002)):
+            server = SimpleWebSocketServer('localhost', 0, verbose=False, compression=None,
+                                           coalesce_window=window)
+            peers = _bench_socketpair_room(server, room_size)
+            cpu = 0.0
+            try:
+                for i in range(0, messages, burst):
+                    # A burst is what arrives within one window; the loop flushes after it
+                    started = time.process_time()
+                    for _ in range(min(burst, messages - i)):
+                        server._broadcast_message(message, None)
+                    server._flush_coalesced()
+                    cpu += time.process_time() - started
+                    _bench_drain(peers)
+                calls = server.stats['send_calls']
+            finally:
+                _bench_close_room(server, peers)
+            print_colored(f"   {burst:>6}{name:>14}{calls:>10}{calls / messages:>9.1f}{cpu / messages * 1e6:>9.1f}",
+                          Colors.WHITE)
+
+def benchmark_chat_codec(messages=5000, room_size=20):
+    """Wire bytes and encode/decode CPU of Task 3 events: JSON text vs lanchat.bin.v1"""
+    print_colored(f"\n📊 Task 3 chat encoding ({messages} messages, {room_size}-user lists)", Colors.CYAN)
+    print_colored(f"   {'event':<10}{'format':<8}{'bytes':>8}{'enc µs':>9}{'dec µs':>9}", Colors.BOLD)
+    users = [{'username': f"user{i:03d}", 'os': ('Windows', 'Linux', 'Mac')[i % 3]} for i in range(room_size)]
+    events = {
+        'message': [{'type': 'message', 'sender': users[i % room_size]['username'],
+                     'message': json.loads(text)['message'],
+                     'timestamp': time.strftime('%H:%M:%S', time.gmtime(1700000000 + i))}
+                    for i, text in enumerate(_bench_chat_messages(messages))],
+        'users': [{'type': 'users', 'users': users}] * (messages // 10),
+    }
+    for name, batch in events.items():
+        codec = BinaryChatCodec()
+        for user in users:
+            codec.intern(user['username'], user['os'])
+        formats = (
+            ('json', lambda event: json.dumps(event).encode('utf-8'), lambda data: json.loads(data)),
+            ('binary', codec.encode, BinaryChatCodec().decode),
+        )
+        for label, encode, decode in formats:
+            started = time.perf_counter()
+            encoded = [encode(event) for event in batch]
+            encode_time = time.perf_counter() - started
+            started = time.perf_counter()
+            for data in encoded:
+                decode(data)
+            decode_time = time.perf_counter() - started
+            size = sum(len(data) for data in encoded) / len(encoded)
+            print_colored(f"   {name:<10}{label:<8}{size:>8.0f}{encode_time / len(batch) * 1e6:>9.2f}"
+                          f"{decode_time / len(batch) * 1e6:>9.2f}", Colors.WHITE)
+
+def benchmark_room_fanout(totals=(1000, 10000), room_sizes=(10, 100), messages=200):
+    """CPU per Task 3 message: scanning every client vs the room->members index"""
+    print_colored("\n📊 Room fan-out: CPU µs per message", Colors.CYAN)
+    print_colored(f"   {'total':>7}{'room':>6}{'scan all':>11}{'room index':>12}{'speedup':>10}", Colors.BOLD)
+    dummy = socket.socket()
+    try:
+        for total in totals:
+            for size in room_sizes:
+                server = ChatRoomServer('localhost', 0, verbose=False, compression=None)
+                peers = _bench_socketpair_room(server, size)
+                for conn in server.clients.snapshot():
+                    server.users[conn.id] = {'username': f"member{conn.id}", 'os': 'Linux', 'room': 'bench'}
+                    server.rooms.setdefault('bench', {})[conn.id] = conn
+                # Everyone else sits in other rooms and never needs a real socket
+                for i in range(total - size):
+                    conn = WebSocketConnection(dummy, ('bench', i), 1 << 20)
+                    conn.handshake_done = True
+                    server.clients.add(conn)
+                    server.users[conn.id] = {'username': f"other{conn.id}", 'os': 'Linux', 'room': f"room{i % 50}"}
+                    server.rooms.setdefault(f"room{i % 50}", {})[conn.id] = conn
+                event = {'type': 'message', 'sender': 'bench', 'message': 'hello room ' * 4, 'timestamp': '12:00:00'}
+                results = []
+                try:
+                    for strategy in ('scan', 'index'):
+                        cpu = 0.0
+                        for i in range(messages):
+                            started = time.process_time()
+                            if strategy == 'scan':
+                                shared = {}
+                                for conn in server.clients.snapshot():
+                                    if server.users[conn.id]['room'] == 'bench':
+                                        server._queue_send(conn, server._event_frame(conn, event, shared))
+                            else:
+                                server._room_broadcast('bench', event)
+                            cpu += time.process_time() - started
+                            if i % 20 == 19:
+                                _bench_drain(peers)
+                        _bench_drain(peers)
+                        results.append(cpu / messages * 1e6)
+                finally:
+                    for conn in server.clients.snapshot():
+                        if conn.sock is dummy:
+                            server.clients.remove(conn)
+                    _bench_close_room(server, peers)
+                print_colored(f"   {total:>7}{size:>6}{results[0]:>11.1f}{results[1]:>12.1f}"
+                              f"{results[0] / max(results[1], 1e-9):>9.1f}x", Colors.WHITE)
+    finally:
+        dummy.close()
+
+def benchmark_presence_deltas(room_sizes=(50, 200, 500)):
+    """Bytes and CPU to keep Task 3 user lists current: full lists vs versioned deltas"""
+    print_colored("\n📊 Presence updates: everyone joins one room, then everyone leaves", Colors.CYAN)
+    print_colored(f"   {'users':>6}{'format':>8}{'full KB':>10}{'delta KB':>10}{'full ms':>10}{'delta ms':>10}", Colors.BOLD)
+    for size in room_sizes:
+        for label in ('json', 'binary'):
+            results = []
+            for strategy in ('full', 'delta'):
+                server = ChatRoomServer('localhost', 0, verbose=False, compression=None)
+                peers = _bench_socketpair_room(server, size)
+                conns = server.clients.snapshot()
+                received = 0
+                cpu = 0.0
+                try:
+                    for conn in conns:
+                        if label == 'binary':
+                            conn.subprotocol = BinaryChatCodec.SUBPROTOCOL
+                    steps = [(conn, True) for conn in conns] + [(conn, False) for conn in conns]
+                    for i, (conn, joining) in enumerate(steps):
+                        started = time.process_time()
+                        if joining:
+                            server.on_message(conn, json.dumps(
+                                {'type': 'join', 'username': f"user{i:04d}", 'os': 'Linux', 'room': 'bench'}))
+                        else:
+                            server.on_close(conn)
+                        if strategy == 'full' and server.rooms.get('bench'):
+                            # What every join and leave used to cost on top of the delta
+                            server._room_broadcast('bench', server._users_event('bench'))
+                        cpu += time.process_time() - started
+                        if i % 10 == 9:
+                            received += _bench_drain(peers)
+                    received += _bench_drain(peers)
+                finally:
+                    _bench_close_room(server, peers)
+                results.append((received / 1024, cpu * 1000))
+            (full_kb, full_ms), (delta_kb, delta_ms) = results
+            print_colored(f"   {size:>6}{label:>8}{full_kb:>10.0f}{delta_kb:>10.0f}{full_ms:>10.1f}{delta_ms:>10.1f}",
+                          Colors.WHITE)
+
+def benchmark_message_history(messages=200000, rooms=50, checkpoints=4):
+    """History memory under sustained traffic, and the cost of replaying it to a joiner"""
+    print_colored(f"\n📊 Message history ({messages} messages over {rooms} rooms)", Colors.CYAN)
+    print_colored(f"   {'appended':>9}{'rooms':>7}{'kept':>7}{'payload KB':>12}{'overhead KB':>13}{'RSS +KB':>9}", Colors.BOLD)
+    history = MessageHistory()
+    chat = [text.encode('utf-8') for text in _bench_chat_messages(1000)]
+    rss_before = _current_rss_kb()
+    step = messages // checkpoints
+    for i in range(messages):
+        payload = bytes(bytearray(chat[i % len(chat)]))  # a fresh object, like a received message
+        history.append(f"room{i % rooms}", payload, len(payload))
+        if (i + 1) % step == 0:
+            usage = history.memory_usage()
+            print_colored(f"   {i + 1:>9}{usage['rooms']:>7}{usage['messages']:>7}{usage['payload_bytes'] / 1024:>12.1f}"
+                          f"{usage['overhead_bytes'] / 1024:>13.1f}{_current_rss_kb() - rss_before:>9}", Colors.WHITE)
+
+    server = SimpleWebSocketServer('localhost', 0, verbose=False, compression=None, history=history)
+    peers = _bench_socketpair_room(server, 1)
+    conn = server.clients.snapshot()[0]
+    try:
+        for label in ('first join', 'cached'):
+            calls = server.stats['send_calls']
+            started = time.perf_counter()
+            server._replay_history(conn, 'room0', encode_websocket_frame)
+            elapsed = time.perf_counter() - started
+            print_colored(f"   replay ({label}): {len(history.replay('room0')[1])} messages, "
+                          f"{_bench_drain(peers) / 1024:.1f} KB in {server.stats['send_calls'] - calls} write(s), "
+                          f"{elapsed * 1e6:.0f} µs", Colors.WHITE)
+    finally:
+        _bench_close_room(server, peers)
+
+def benchmark_message_log(messages=100000, fsync_messages=2000, tail=100):
+    """Append throughput per fsync policy, and "messages since X" reads: mmap + index vs line parsing"""
+    print_colored("\n📊 Segmented message log", Colors.CYAN)
+    print_colored(f"   {'append policy':<26}{'messages':>9}{'fsyncs':>8}{'msg/s':>10}", Colors.BOLD)
+    chat = [text.encode('utf-8') for text in _bench_chat_messages(1000)]
+    directory = tempfile.mkdtemp(prefix='lanchat-log-')
+    try:
+        for name, count, options in (
+            ('fsync every message', fsync_messages, {'fsync_interval': 0}),
+            ('group commit 50ms/256', messages, {}),
+        ):
+            path = os.path.join(directory, name.split()[0])
+            log = MessageLog(path, segment_bytes=4 << 20, **options)
+            started = time.perf_counter()
+            for i in range(count):
+                log.append(chat[i % len(chat)])
+            log.sync()
+            elapsed = time.perf_counter() - started
+            print_colored(f"   {name:<26}{count:>9}{log.stats['fsyncs']:>8}{count / elapsed:>10.0f}", Colors.WHITE)
+            log.close()
+
+        # The same messages as a JSON-lines file, read the obvious way
+        lines_path = os.path.join(directory, 'messages.jsonl')
+        with open(lines_path, 'w') as f:
+            for i in range(messages):
+                f.write(json.dumps({'seq': i, 'message': chat[i % len(chat)].decode('utf-8')}) + '\n')
+        log = MessageLog(os.path.join(directory, 'group'), segment_bytes=4 << 20)
+        since = messages - tail
+        print_colored(f"   {'read last ' + str(tail):<26}{'ms':>9}", Colors.BOLD)
+        started = time.perf_counter()
+        with open(lines_path) as f:
+            found = [record for record in map(json.loads, f) if record['seq'] >= since]
+        print_colored(f"   {'JSON lines, full parse':<26}{(time.perf_counter() - started) * 1000:>9.2f}", Colors.WHITE)
+        started = time.perf_counter()
+        records = log.read_since(since)
+        print_colored(f"   {'mmap + sparse index':<26}{(time.perf_counter() - started) * 1000:>9.2f}", Colors.WHITE)
+        if len(records) != len(found):
+            print_colored(f"   ❌ read {len(records)} records, expected {len(found)}", Colors.FAIL)
+        log.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def benchmark_search_index(messages=100000, queries=200, page=20):
+    """Inverted index build rate, memory and query latency vs scanning the log"""
+    print_colored(f"\n📊 Chat search over {messages} logged messages", Colors.CYAN)
+    chat = _bench_chat_messages(1000)
+    directory = tempfile.mkdtemp(prefix='lanchat-search-')
+    try:
+        log = MessageLog(os.path.join(directory, 'task2'))
+        for i in range(messages):
+            log.append(f"{json.loads(chat[i % len(chat)])['message']} msg{i}".encode())
+        log.sync()
+        index = SearchIndex.for_message_logs(directory, names=('task2',))
+        started = time.perf_counter()
+        index.refresh()
+        elapsed = time.perf_counter() - started
+        usage = index.memory_usage()
+        print_colored(f"   indexed {usage['documents']} messages in {elapsed:.2f}s "
+                      f"({usage['documents'] / elapsed:.0f} msg/s), {usage['terms']} terms", Colors.WHITE)
+        print_colored(f"   {usage['postings']} postings in {usage['posting_bytes'] / 1024:.0f} KB "
+                      f"({usage['posting_bytes'] / max(usage['postings'], 1):.1f} B each), "
+                      f"document table {usage['document_bytes'] / 1024:.0f} KB", Colors.WHITE)
+
+        print_colored(f"   {'query':<22}{'scan ms':>12}{'index p50 ms':>14}{'index p99 ms':>14}", Colors.BOLD)
+        for query in ('lab', 'notes task', 'anyone seen udp', f"msg{messages // 2}"):
+            terms = tokenize(query)
+            started = time.perf_counter()
+            scanned = [record for record in log.read_since(0)
+                       if terms <= tokenize(record[2].decode('utf-8'))][-page:]
+            scan = (time.perf_counter() - started) * 1000
+            latencies = []
+            for _ in range(queries):
+                started = time.perf_counter()
+                results, _ = index.search(query, page)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if [record[0] for record in reversed(scanned)] != [result['seq'] for result in results]:
+                print_colored(f"   ❌ {query!r}: index and scan disagree", Colors.FAIL)
+            print_colored(f"   {query:<22}{scan:>12.1f}{_percentile(latencies, 50):>14.3f}"
+                          f"{_percentile(latencies, 99):>14.3f}", Colors.WHITE)
+        log.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def _bench_http_load(port, connections, duration, results, path='/'):
+    """wrk-style load: each connection issues GET path back to back; puts (latencies, errors) on results"""
+    import http.client
+    deadline = time.perf_counter() + duration
+
+    def run():
+        client = http.client.HTTPConnection('localhost', port, timeout=2)
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                client.request('GET', path)
+                response = client.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+            except (OSError, http.client.HTTPException):
+                errors += 1
+                client.close()
+        client.close()
+        results.put((latencies, errors))
+
+    threads = [threading.Thread(target=run) for _ in range(connections)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join(duration + 10)
+
+def _bench_http_run(port, connections, duration, path='/'):
+    """Run _bench_http_load against port and return its per-connection results"""
+    import multiprocessing
+    # Generate the load from another process where possible, so it doesn't share our GIL
+    if hasattr(os, 'fork'):
+        results = multiprocessing.get_context('fork').Queue()
+        load = multiprocessing.get_context('fork').Process(
+            target=_bench_http_load, args=(port, connections, duration, results, path))
+    else:
+        results = queue.Queue()
+        load = threading.Thread(target=_bench_http_load, args=(port, connections, duration, results, path))
+    load.start()
+    results = [results.get(timeout=duration + 15) for _ in range(connections)]
+    load.join()
+    return results
+
+def benchmark_http_servers(connection_counts=(1, 16, 64), duration=2.0):
+    """Requests/sec and tail latency of the page server: HTTP/1.0 one-at-a-time vs keep-alive pool"""
+    print_colored(f"\n📊 Page server under load ({duration:.0f}s per run, GET / of the Task 1 page)", Colors.CYAN)
+    print_colored(f"   {'server':<10}{'conns':>6}{'stalled':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}",
+                  Colors.BOLD)
+    page = generate_task1_html('localhost', 8001).encode()
+
+    class LegacyHandler(http.server.BaseHTTPRequestHandler):
+        # The original handlers: HTTP/1.0, a new connection for every request
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-type', 'text/html')
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, format, *args):
+            pass
+
+    class PageHandler(KeepAliveHandler):
+        def do_GET(self):
+            self.send_body(page)
+
+    class LegacyServer(socketserver.TCPServer):
+        def handle_error(self, request, client_address):
+            pass  # clients that gave up while the stalled one held the server
+
+    servers = (
+        ('http/1.0', lambda: LegacyServer(('localhost', 0), LegacyHandler)),
+        ('pooled', lambda: PooledHTTPServer(('localhost', 0), PageHandler)),
+    )
+    for label, make_server in servers:
+        for connections in connection_counts:
+            for stalled in (0, 1):
+                httpd = make_server()
+                serving = threading.Thread(target=httpd.serve_forever)
+                serving.daemon = True
+                serving.start()
+                port = httpd.server_address[1]
+                # A client that connects and never sends its request, like a phone that dropped off the Wi-Fi
+                stalls = [socket.create_connection(('localhost', port)) for _ in range(stalled)]
+                time.sleep(0.1)
+                try:
+                    results = _bench_http_run(port, connections, duration)
+                finally:
+                    for stall in stalls:
+                        stall.close()
+                    httpd.shutdown()
+                    httpd.server_close()
+                latencies = [value for samples, _ in results for value in samples]
+                errors = sum(count for _, count in results)
+                print_colored(f"   {label:<10}{connections:>6}{stalled:>9}{len(latencies) / duration:>9.0f}"
+                              f"{_percentile(latencies, 50):>9.2f}{_percentile(latencies, 99):>9.2f}{errors:>8}",
+                              Colors.WHITE)
+
+def benchmark_page_cache(requests=2000):
+    """Cost of a page view: rendering per request vs the page cache vs a 304 revalidation"""
+    import http.client
+    print_colored(f"\n📊 Page cache: {requests} sequential keep-alive GETs per page", Colors.CYAN)
+    print_colored(f"   {'page':<7}{'mode':<10}{'bytes':>8}{'req/s':>9}{'build µs':>10}", Colors.BOLD)
+    cache = PageCache()
+
+    class RenderingHandler(KeepAliveHandler):
+        # The old path: format and encode the page on every request
+        def do_GET(self):
+            page = self.path.strip('/')
+            self.send_body(PageCache.GENERATORS[page]('localhost').encode())
+
+    class CachedHandler(KeepAliveHandler):
+        def do_GET(self):
+            self.send_page(self.path.strip('/'), 'localhost')
+
+    httpd = PooledHTTPServer(('localhost', 0), RenderingHandler, workers=2)
+    rendering = threading.Thread(target=httpd.serve_forever)
+    rendering.daemon = True
+    rendering.start()
+    cached_httpd = PooledHTTPServer(('localhost', 0), CachedHandler, workers=2)
+    serving = threading.Thread(target=cached_httpd.serve_forever)
+    serving.daemon = True
+    serving.start()
+    try:
+        for page in ('index', 'task1', 'task2', 'task3'):
+            generator = PageCache.GENERATORS[page]
+            started = time.perf_counter()
+            for _ in range(200):
+                generator('localhost').encode()
+            render_us = (time.perf_counter() - started) / 200 * 1e6
+            started = time.perf_counter()
+            for _ in range(200):
+                cache.get(page, 'localhost')
+            lookup_us = (time.perf_counter() - started) / 200 * 1e6
+            etag = PAGE_CACHE.get(page, 'localhost').etag
+            modes = (
+                ('render', httpd, {}, render_us),
+                ('cached', cached_httpd, {}, lookup_us),
+                ('304', cached_httpd, {'If-None-Match': etag}, lookup_us),
+            )
+            for mode, server, headers, build_us in modes:
+                client = http.client.HTTPConnection('localhost', server.server_address[1])
+                size = 0
+                started = time.perf_counter()
+                for _ in range(requests):
+                    client.request('GET', '/' + page, headers=headers)
+                    response = client.getresponse()
+                    size = len(response.read())
+                elapsed = time.perf_counter() - started
+                client.close()
+                print_colored(f"   {page:<7}{mode:<10}{size:>8}{requests / elapsed:>9.0f}{build_us:>10.1f}",
+                              Colors.WHITE)
+    finally:
+        for server in (httpd, cached_httpd):
+            server.shutdown()
+            server.server_close()
+
+def _bench_page_load(port, page, headers):
+    """(wire bytes, status, response headers) of one GET over a raw socket"""
+    sock = socket.create_connection(('localhost', port))
+    try:
+        extra = ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        sock.sendall(f"GET /{page} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n{extra}\r\n".encode())
+        data = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        sock.close()
+    head = data.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+    fields = dict(line.split(': ', 1) for line in head[1:])
+    return len(data), int(head[0].split()[1]), fields
+
+def benchmark_page_compression():
+    """Bytes on the wire per page load with identity, deflate and gzip variants"""
+    print_colored("\n📊 Page compression: wire bytes per page load (headers included)", Colors.CYAN)
+    print_colored(f"   {'page':<7}{'identity':>10}{'deflate':>9}{'gzip':>8}{'304':>6}{'saved':>8}{'gzip µs':>9}",
+                  Colors.BOLD)
+
+    class CachedHandler(KeepAliveHandler):
+        def do_GET(self):
+            self.send_page(self.path.strip('/'), 'localhost')
+
+    httpd = PooledHTTPServer(('localhost', 0), CachedHandler, workers=2)
+    serving = threading.Thread(target=httpd.serve_forever)
+    serving.daemon = True
+    serving.start()
+    port = httpd.server_address[1]
+    totals = [0, 0]
+    try:
+        for page in PageCache.GENERATORS:
+            cached = PAGE_CACHE.get(page, 'localhost')
+            started = time.perf_counter()
+            for _ in range(50):
+                gzip.compress(cached.body, 9, mtime=0)
+            gzip_us = (time.perf_counter() - started) / 50 * 1e6
+            sizes = {}
+            for coding in ('identity', 'deflate', 'gzip'):
+                size, status, fields = _bench_page_load(port, page, {'Accept-Encoding': coding})
+                if fields.get('Content-Encoding', 'identity') != coding or fields.get('Vary') != 'Accept-Encoding':
+                    raise AssertionError(f"{page}: asked for {coding}, got {fields}")
+                sizes[coding] = size
+            etag = cached.select('gzip')[2]
+            revalidated, status, _ = _bench_page_load(port, page, {'Accept-Encoding': 'gzip',
+                                                                    'If-None-Match': etag})
+            if status != 304:
+                raise AssertionError(f"{page}: revalidation returned {status}")
+            totals[0] += sizes['identity']
+            totals[1] += sizes['gzip']
+            saved = 100 * (1 - sizes['gzip'] / sizes['identity'])
+            print_colored(f"   {page:<7}{sizes['identity']:>10}{sizes['deflate']:>9}{sizes['gzip']:>8}"
+                          f"{revalidated:>6}{saved:>7.0f}%{gzip_us:>9.0f}", Colors.WHITE)
+        print_colored(f"   all four pages: {totals[0]} → {totals[1]} bytes per first visit "
+                      f"({100 * (1 - totals[1] / totals[0]):.0f}% less); "
+                      "compression runs once per page at startup", Colors.GREEN)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def benchmark_page_assets():
+    """Wire bytes per navigation with inline CSS/JS vs content-hashed assets"""
+    print_colored("\n📊 Page assets: gzip'd wire bytes per navigation (headers included)", Colors.CYAN)
+    print_colored(f"   {'page':<7}{'inline':>8}{'first visit':>13}{'switch':>8}{'saved':>8}", Colors.BOLD)
+    inline_pages = {}
+    inline_stats = {'not_modified': 0, 'bytes_sent': 0, 'bytes_saved': 0}
+    for page, generator in PageCache.GENERATORS.items():
+        # Rebuild the page the way it was served before, with its stylesheet and script inline
+        css_url, js_url = ASSETS.url(page + '.css'), ASSETS.url(page + '.js')
+        css, js = (ASSETS.lookup(url)[0].body.decode() for url in (css_url, js_url))
+        html = generator('localhost')
+        html = html.replace(f'<link rel="stylesheet" href="{css_url}">', f"<style>{css}</style>")
+        html = html.replace(f'<script src="{js_url}"></script>', f"<script>{js}</script>")
+        inline_pages[page] = CachedPage(html.encode())
+
+    class AssetHandler(KeepAliveHandler):
+        def do_GET(self):
+            if self.path.startswith('/assets/'):
+                self.send_asset(self.path)
+            elif self.path.startswith('/inline/'):
+                self.send_cached(inline_pages[self.path[8:]], 'text/html', 'no-cache', inline_stats)
+            else:
+                self.send_page(self.path.strip('/'), 'localhost')
+
+    httpd = PooledHTTPServer(('localhost', 0), AssetHandler, workers=2)
+    serving = threading.Thread(target=httpd.serve_forever)
+    serving.daemon = True
+    serving.start()
+    port = httpd.server_address[1]
+    accept = {'Accept-Encoding': 'gzip'}
+    try:
+        for page in PageCache.GENERATORS:
+            inline = _bench_page_load(port, 'inline/' + page, accept)[0]
+            switch = _bench_page_load(port, page, accept)[0]
+            first = switch
+            for name in (page + '.css', page + '.js'):
+                size, status, fields = _bench_page_load(port, ASSETS.url(name)[1:], accept)
+                if status != 200 or 'immutable' not in fields.get('Cache-Control', ''):
+                    raise AssertionError(f"{name}: {status} {fields}")
+                first += size
+            print_colored(f"   {page:<7}{inline:>8}{first:>13}{switch:>8}{100 * (1 - switch / inline):>7.0f}%",
+                          Colors.WHITE)
+        print_colored("   switch = a later visit: the immutable assets come from the browser cache", Colors.GREEN)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+def benchmark_static_files(connections=4, duration=2.0):
+    """Server CPU per response: writing cached bytes vs sendfile() vs the mmap fallback"""
+    import random
+    print_colored(f"\n📊 Static files: server CPU per response ({connections} keep-alive connections, "
+                  f"{duration:.0f}s per run)", Colors.CYAN)
+    print_colored(f"   {'body':<18}{'bytes':>9}  {'path':<8}{'req/s':>9}{'CPU µs/resp':>13}", Colors.BOLD)
+    # Incompressible downloads, whose files go to a scratch directory rather than STATIC_DIR
+    rng = random.Random(22)
+    scratch = tempfile.TemporaryDirectory(prefix='lanchat-static-')
+    bodies = {
+        'task3 page': PAGE_CACHE.get('task3', 'localhost'),
+        'task3.js asset': ASSETS.lookup(ASSETS.url('task3.js'))[0],
+        '256 KB download': CachedPage(rng.getrandbits(8 << 18).to_bytes(1 << 18, 'little')),
+        '1 MB download': CachedPage(rng.getrandbits(8 << 20).to_bytes(1 << 20, 'little')),
+    }
+    for label in ('256 KB download', '1 MB download'):
+        download = bodies[label]
+        for coding, (body, etag) in download.variants.items():
+            download.files[coding] = StaticFile.store(etag.strip('"'), body, scratch.name)
+
+    class StaticHandler(KeepAliveHandler):
+        sendfile_threshold = 0  # measure every size, not just the ones served from files
+
+        def do_GET(self):
+            self.send_cached(bodies[self.path[1:].replace('_', ' ')], 'application/octet-stream',
+                             'no-cache', {'not_modified': 0, 'bytes_sent': 0, 'bytes_saved': 0})
+
+    class MemoryHandler(StaticHandler):
+        # The old path: every body is copied out of a Python bytes object
+        use_static_files = False
+
+    paths = (('memory', MemoryHandler, False), ('sendfile', StaticHandler, True), ('mmap', StaticHandler, False))
+    if not StaticFile.use_sendfile:
+        paths = paths[:1] + paths[2:]
+    try:
+        for label, body in bodies.items():
+            for path, handler, use_sendfile in paths:
+                StaticFile.use_sendfile = use_sendfile
+                httpd = PooledHTTPServer(('localhost', 0), handler, workers=connections)
+                serving = threading.Thread(target=httpd.serve_forever)
+                serving.daemon = True
+                serving.start()
+                try:
+                    cpu_before = time.process_time()
+                    results = _bench_http_run(httpd.server_address[1], connections, duration,
+                                              '/' + label.replace(' ', '_'))
+                    cpu = time.process_time() - cpu_before
+                finally:
+                    httpd.shutdown()
+                    httpd.server_close()
+                responses = sum(len(samples) for samples, _ in results)
+                print_colored(f"   {label:<18}{len(body.body):>9}  {path:<8}{responses / duration:>9.0f}"
+                              f"{cpu / max(responses, 1) * 1e6:>13.1f}", Colors.WHITE)
+    finally:
+        StaticFile.use_sendfile = hasattr(os, 'sendfile')
+        scratch.cleanup()
+    print_colored(f"   pages and assets switch to sendfile() at {KeepAliveHandler.sendfile_threshold >> 10} KB",
+                  Colors.GREEN)
+    if not hasattr(os, 'fork'):
+        print_colored("   (no fork(): the load ran in this process, so CPU includes the client)", Colors.WARNING)
+
+def benchmark_batch_ingest(messages=5000, lines_per_chunk=100):
+    """Task 1 ingest: one POST per message vs one JSON-array POST vs a chunked NDJSON stream"""
+    import http.client
+    print_colored(f"\n📊 Task 1 ingest: {messages} messages into a message log over one keep-alive connection",
+                  Colors.CYAN)
+    print_colored(f"   {'mode':<20}{'requests':>9}{'sent KB':>9}{'ack KB':>8}{'msg/s':>10}", Colors.BOLD)
+    directory = tempfile.mkdtemp(prefix='lanchat-ingest-')
+    log = MessageLog(directory)
+    texts = _bench_chat_messages(messages)
+
+    def accept(item):
+        if not isinstance(item, dict) or not isinstance(item.get('message'), str):
+            raise ValueError("expected an object with a 'message' string")
+        return {'seq': log.append(json.dumps({'from': 'bench', 'message': item['message']}).encode())}
+
+    class IngestHandler(KeepAliveHandler):
+        def do_POST(self):
+            if self.path == '/send_udp':
+                # The per-message path, as Task 1 serves it
+                data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode())
+                log.append(json.dumps({'from': 'bench', 'message': data.get('message', '')}).encode())
+                self.send_body(json.dumps({'success': True, 'message': 'Message received by Ubuntu PC'}).encode(),
+                               'application/json')
+            else:
+                status, ack = ingest_batch(self, accept)
+                self.send_body(json.dumps(ack).encode(), 'application/json', status)
+
+    def ndjson_chunks():
+        for start in range(0, messages, lines_per_chunk):
+            yield ''.join(json.dumps({'message': text}) + '\n'
+                          for text in texts[start:start + lines_per_chunk]).encode()
+
+    httpd = PooledHTTPServer(('localhost', 0), IngestHandler, workers=2)
+    serving = threading.Thread(target=httpd.serve_forever)
+    serving.daemon = True
+    serving.start()
+    try:
+        array_body = json.dumps([{'message': text} for text in texts]).encode()
+        for mode in ('one POST each', 'JSON array', 'NDJSON, chunked'):
+            client = http.client.HTTPConnection('localhost', httpd.server_address[1])
+            before = log.next_seq
+            sent = received = requests = 0
+            started = time.perf_counter()
+            if mode == 'one POST each':
+                for text in texts:
+                    body = json.dumps({'message': text}).encode()
+                    client.request('POST', '/send_udp', body, {'Content-Type': 'application/json'})
+                    received += len(client.getresponse().read())
+                    sent += len(body)
+                    requests += 1
+            else:
+                if mode == 'JSON array':
+                    body, headers = array_body, {'Content-Type': 'application/json'}
+                    sent = len(body)
+                else:
+                    body, headers = ndjson_chunks(), {'Content-Type': 'application/x-ndjson'}
+                    sent = sum(len(chunk) for chunk in ndjson_chunks())
+                client.request('POST', '/send_udp/batch', body, headers)
+                ack = client.getresponse().read()
+                received, requests = len(ack), 1
+                if json.loads(ack)['accepted'] != messages:
+                    raise AssertionError(f"{mode}: {ack[:200]}")
+            elapsed = time.perf_counter() - started
+            client.close()
+            if log.next_seq - before != messages:
+                raise AssertionError(f"{mode}: logged {log.next_seq - before} of {messages}")
+            print_colored(f"   {mode:<20}{requests:>9}{sent / 1024:>9.0f}{received / 1024:>8.0f}"
+                          f"{messages / elapsed:>10.0f}", Colors.WHITE)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        log.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+def _bench_udp_send(port, datagrams, count):
+    """Send count datagrams to port, cycling through the given payloads, as fast as possible"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(('127.0.0.1', port))
+    payloads = itertools.cycle(datagrams)
+    for _ in range(count):
+        try:
+            sock.send(next(payloads))
+        except OSError:
+            pass  # ENOBUFS etc.: the datagram is lost, as on a real network
+    sock.close()
+
+def benchmark_udp_listener(count=200000):
+    """Task 1 UDP listener: datagrams/sec and loss vs receive buffer size and batch draining"""
+    import multiprocessing
+    print_colored(f"\n📊 Task 1 UDP listener: {count} datagrams from a local sender", Colors.CYAN)
+    print_colored(f"   {'receiver':<28}{'rcvbuf KB':>10}{'received':>10}{'lost':>7}{'kernel':>8}"
+                  f"{'dgram/s':>10}{'msg/s':>10}", Colors.BOLD)
+    single = [json.dumps({'message': text}).encode() for text in _bench_chat_messages(100)]
+    packed = [b''.join(line + b'\n' for line in single[start:start + 10]) for start in range(0, 100, 10)]
+    for label, datagrams, options in (
+        ('default SO_RCVBUF, 1/wakeup', single, {'rcvbuf': None, 'batch': 1}),
+        ('4 MB SO_RCVBUF, 1/wakeup', single, {'batch': 1}),
+        ('4 MB SO_RCVBUF, batch 64', single, {}),
+        ('  10 NDJSON msgs/datagram', packed, {}),
+    ):
+        listener = UDPMessageListener('127.0.0.1', 0, **options)
+        listener.start()
+        if hasattr(os, 'fork'):
+            sender = multiprocessing.get_context('fork').Process(
+                target=_bench_udp_send, args=(listener.port, datagrams, count))
+        else:
+            sender = threading.Thread(target=_bench_udp_send, args=(listener.port, datagrams, count))
+        started = last_change = time.perf_counter()
+        last_seen = 0
+        sender.start()
+        # Done once the sender has exited and nothing more has arrived for a while
+        while sender.is_alive() or time.perf_counter() - last_change < 0.3:
+            time.sleep(0.02)
+            if listener.stats['received'] != last_seen:
+                last_seen, last_change = listener.stats['received'], time.perf_counter()
+        sender.join()
+        listener.refresh_dropped()  # drops after the last datagram received aren't reported yet
+        time.sleep(0.1)
+        listener.stop()
+        stats = listener.stats
+        elapsed = max(last_change - started, 1e-6)
+        kernel = stats['dropped'] if SO_RXQ_OVFL is not None else '-'
+        print_colored(f"   {label:<28}{listener.rcvbuf >> 10:>10}{stats['received']:>10}"
+                      f"{100 * (1 - stats['received'] / count):>6.1f}%{kernel:>8}"
+                      f"{stats['received'] / elapsed:>10.0f}{stats['messages'] / elapsed:>10.0f}", Colors.WHITE)
+    print_colored("   lost = sent but never received; kernel = drops reported by SO_RXQ_OVFL; "
+                  "Linux reports twice the requested rcvbuf", Colors.GREEN)
+
+def _bench_fresh_socket_send(address, stats):
+    """Baseline for benchmark_udp_relay: a new unconnected socket and sendto() per message"""
+    def send(payload):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.sendto(payload + b'\n', address)
+            stats['sent'] += 1
+            stats['datagrams'] += 1
+        except OSError:
+            stats['errors'] += 1
+        finally:
+            sock.close()
+        return True
+    return send
+
+def benchmark_udp_relay(count=40000, producers=4):
+    """Task 1 HTTP-to-UDP relay: socket reuse, batching and the in-flight limit"""
+    print_colored(f"\n📊 Task 1 UDP relay: {count} messages from {producers} HTTP worker threads", Colors.CYAN)
+    print_colored(f"   {'sender':<30}{'msg/s':>10}{'dgrams':>8}{'sink got':>10}{'rejected':>10}{'errors':>8}",
+                  Colors.BOLD)
+    payloads = [json.dumps({'from': '127.0.0.1', 'message': text}).encode() for text in _bench_chat_messages(100)]
+    closed = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()  # nothing listens there now, so connected sends see ECONNREFUSED
+    for label, options, to_closed in (
+        ('new socket per message', None, False),
+        ('connected, 1 msg/datagram', {'max_datagram': 1}, False),
+        ('connected, batched', {}, False),
+        ('  batched, in-flight 64', {'max_in_flight': 64}, False),
+        ('  batched, sink not listening', {}, True),
+    ):
+        received = [0]
+        sink = UDPMessageListener('127.0.0.1', 0, lambda messages: received.__setitem__(0, received[0] + len(messages)))
+        sink.start()
+        address = ('127.0.0.1', closed_port if to_closed else sink.port)
+        if options is None:
+            relay = None
+            stats = {'sent': 0, 'datagrams': 0, 'errors': 0, 'rejected': 0}
+            send = _bench_fresh_socket_send(address, stats)
+        else:
+            relay = UDPRelay(address, **options)
+            relay.start()
+            stats, send = relay.stats, relay.send
+
+        def produce(share):
+            for i in range(share):
+                # Back off and retry when refused so every row moves the same messages
+                while not send(payloads[i % len(payloads)]):
+                    time.sleep(0.0005)
+        threads = [threading.Thread(target=produce, args=(count // producers,)) for _ in range(producers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if relay is not None:
+            relay.stop()
+        elapsed = time.perf_counter() - started
+        time.sleep(0.2)
+        sink.stop()
+        print_colored(f"   {label:<30}{stats['sent'] / elapsed:>10.0f}{stats['datagrams']:>8}{received[0]:>10}"
+                      f"{stats['rejected']:>10}{stats['errors']:>8}", Colors.WHITE)
+    print_colored("   msg/s = messages handed to the kernel per second; rejected = send() calls refused "
+                  "at the in-flight limit (the worker backs off and retries)", Colors.GREEN)
+
+BENCHMARKS = [
+    ("WebSocket engines (threaded vs event loop)", benchmark_websocket_engines),
+    ("Broadcast fan-out (encode-once)", benchmark_broadcast_fanout),
+    ("permessage-deflate compression", benchmark_compression),
+    ("Heartbeat reaping (timer wheel)", benchmark_heartbeat_reaping),
+    ("Multi-core sharding (SO_REUSEPORT)", benchmark_sharding),
+    ("Connection registry (list vs registry)", benchmark_connection_registry),
+    ("Reconnect storm (admission control)", benchmark_reconnect_storm),
+    ("Per-client rate limiting (flood fan-out)", benchmark_rate_limit),
+    ("Broadcast coalescing (sendmsg batches)", benchmark_coalescing),
+    ("Task 3 chat encoding (JSON vs binary)", benchmark_chat_codec),
+    ("Task 3 room fan-out (scan vs room index)", benchmark_room_fanout),
+    ("Task 3 presence (full lists vs deltas)", benchmark_presence_deltas),
+    ("Message history (memory and replay)", benchmark_message_history),
+    ("Segmented message log (fsync policy, mmap reads)", benchmark_message_log),
+    ("Chat search (inverted index vs scan)", benchmark_search_index),
+    ("Page server (HTTP/1.0 vs keep-alive worker pool)", benchmark_http_servers),
+    ("Page cache (render vs cached vs 304)", benchmark_page_cache),
+    ("Page compression (identity vs deflate vs gzip)", benchmark_page_compression),
+    ("Page assets (inline vs content-hashed files)", benchmark_page_assets),
+    ("Static files (memory vs sendfile vs mmap)", benchmark_static_files),
+    ("Task 1 batch ingest (per-message vs array vs NDJSON)", benchmark_batch_ingest),
+    ("Task 1 UDP listener (buffer size, batch draining)", benchmark_udp_listener),
+    ("Task 1 UDP relay (socket reuse, batching, in-flight limit)", benchmark_udp_relay),
+]
+
+def benchmark_menu():
+    """Run one or all of the performance benchmarks"""
+    clear_screen()
+    print_colored("📊 PERFORMANCE BENCHMARKS", Colors.BOLD)
+    for index, (title, _) in enumerate(BENCHMARKS, 1):
+        print(f"{index}. {title}")
+    print(f"{len(BENCHMARKS) + 1}. Run all")
+
+    choice = input(f"\n{Colors.BOLD}Benchmark choice: {Colors.ENDC}").strip()
+    try:
+        index = int(choice)
+    except ValueError:
+        return
+    if index == len(BENCHMARKS) + 1:
+        selected = BENCHMARKS
+    elif 1 <= index <= len(BENCHMARKS):
+        selected = [BENCHMARKS[index - 1]]
+    else:
+        return
+    for _, benchmark in selected:
+        benchmark()
+    input("\nPress Enter to continue...")
+
 # ==================== MENU FUNCTIONS ====================
 
 def show_network_info():
@@ -1557,18 +6483,33 @@ def ubuntu_main_menu():
         print("5. 📡 Show Network Information")
         print("6. 🌐 Open Browser (Local Test)")
         print("7. 📋 Show Windows PC Instructions")
-        print("8. 🚪 Exit")
+        print("8. 📊 Run Performance Benchmarks")
+        print("9. 🚪 Exit")
         
-        choice = input(f"\n{Colors.BOLD}🐧 Ubuntu choice (1-8): {Colors.ENDC}").strip()
+        choice = input(f"\n{Colors.BOLD}🐧 Ubuntu choice (1-9): {Colors.ENDC}").strip()
         
         if choice == '1':
             server = MainWebServer(server_ip, 8000)
             server.start()
         elif choice == '2':
-            server = Task1Server(server_ip, 8001)
+            sink = input("Forward messages to a UDP sink (host:port, Enter for none): ").strip()
+            try:
+                relay_to = parse_host_port(sink) if sink else None
+            except ValueError:
+                print_colored("❌ Invalid host:port, not forwarding", Colors.FAIL)
+                relay_to = None
+            server = Task1Server(server_ip, 8001, relay_to=relay_to)
             server.start()
         elif choice == '3':
-            server = Task2Server(server_ip, 8002)
+            workers = ''
+            if ShardedWebSocketServer.supported():
+                workers = input("WebSocket worker processes (Enter for 1): ").strip()
+            try:
+                ws_workers = max(1, int(workers)) if workers else 1
+            except ValueError:
+                print_colored("❌ Not a number, using 1 worker", Colors.FAIL)
+                ws_workers = 1
+            server = Task2Server(server_ip, 8002, ws_workers=ws_workers)
             server.start()
         elif choice == '4':
             server = Task3Server(server_ip, 8003)
@@ -1586,6 +6527,8 @@ def ubuntu_main_menu():
         elif choice == '7':
             show_windows_instructions(server_ip)
         elif choice == '8':
+            benchmark_menu()
+        elif choice == '9':
             print_colored("\n👋 Thanks for using the networking toolkit!", Colors.CYAN)
             break
         else: